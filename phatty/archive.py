@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset archive"""
+
+from phatty import batch
+from phatty import formats
+from phatty import preset
+from collections import OrderedDict, namedtuple
+from threading import Lock
+import logging
+import numpy
+import os
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = ['.' + preset.FILE_EXTENSION, '.' + preset.FILE_EXTENSION_EX]
+CACHE_SIZE = 64
+COLUMNS = dict([(a[preset.ACCESSOR_NAME], i)
+                for i, a in enumerate(preset.ACCESSORS)])
+
+Entry = namedtuple('Entry', ['filename', 'position'])
+
+
+def find_files(directory):
+    filenames = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for f in sorted(files):
+            if os.path.splitext(f)[1].lower() in EXTENSIONS:
+                filenames.append(os.path.join(root, f))
+    return filenames
+
+
+def parse_query(query):
+    """Split a query like 'bass arp_mode=2' into the name text and the parameter values."""
+    words = []
+    parameters = {}
+    for word in query.split():
+        name, sep, value = word.partition('=')
+        if sep and name in COLUMNS and value.isdigit():
+            parameters[name] = int(value)
+        else:
+            words.append(word)
+    return ' '.join(words), parameters
+
+
+class Archive(object):
+    """Preset collection on disk with an index of names and parameters.
+
+    Only the index, names included, is kept in memory. Presets are read
+    back from disk when needed, keeping the last files read in a small
+    cache."""
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self.lock = Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries = []
+        self.names = numpy.array([], dtype=str)
+        self.display_names = numpy.array([], dtype=str)
+        self.parameters = numpy.empty((0, len(COLUMNS)), dtype=numpy.uint16)
+        with self.lock:
+            self.cache = OrderedDict()
+
+    def load(self, directory, running=None):
+        """Index every preset found in the directory. Pass a running function to stop early."""
+        logger.debug('Indexing {:s}...'.format(directory))
+        entries = []
+        names = []
+        display_names = []
+        rows = []
+        for filename in find_files(directory):
+            if running and not running():
+                break
+            try:
+                messages = batch.read_messages(filename)
+            except IOError as e:
+                logger.error('Error while reading {:s}: {:s}'.format(filename, str(e)))
+                continue
+            for position, data in enumerate(messages):
+                kind = formats.get_kind(data)
+                if kind != formats.PRESET and kind != formats.PANEL:
+                    continue
+                entries.append(Entry(filename, position))
+                name = preset.get_name(data).strip()
+                display_names.append(name)
+                names.append(name.lower())
+                rows.append([a[preset.ACCESSOR_GETTER](data)
+                             for a in preset.ACCESSORS])
+        self.clear()
+        self.entries = entries
+        self.names = numpy.array(names, dtype=str)
+        self.display_names = numpy.array(display_names, dtype=str)
+        if rows:
+            self.parameters = numpy.array(rows, dtype=numpy.uint16)
+        logger.debug('{:d} presets indexed'.format(len(entries)))
+
+    def get_data(self, i):
+        filename, position = self.entries[i]
+        with self.lock:
+            messages = self.cache.get(filename)
+            if messages != None:
+                self.cache.move_to_end(filename)
+        if messages == None:
+            messages = batch.read_messages(filename)
+            with self.lock:
+                self.cache[filename] = messages
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return messages[position]
+
+    def get_name(self, i):
+        """Return the name from the index without reading the disk."""
+        return str(self.display_names[i])
+
+    def filter(self, text='', parameters=None):
+        """Return the indices of the presets whose name contains the text and whose parameters have the given values."""
+        mask = numpy.ones(len(self.entries), dtype=bool)
+        text = text.strip().lower()
+        if text and len(self.entries):
+            mask &= numpy.char.find(self.names, text) >= 0
+        if parameters:
+            for name, value in parameters.items():
+                mask &= self.parameters[:, COLUMNS[name]] == value
+        return numpy.nonzero(mask)[0]
+
+    def search(self, query):
+        return self.filter(*parse_query(query))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty batch extraction
+
+Presets found in sysex files are extracted into a file each and can be
+merged into preset libraries, files with up to MAX_PRESETS preset
+messages. Banks and bulks are copied as they are, sorted by kind and
+variant. They are neither split, assembled nor converted between their
+reduced and full forms."""
+
+from phatty import connector
+from phatty import formats
+from phatty import preset
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import namedtuple
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+SYSEX = re.compile(b'\xf0([\x00-\x7f]*)\xf7')
+INVALID_CHARS = re.compile('[^A-Za-z0-9 _!#$%&()@-]')
+DEFAULT_NAME = 'preset'
+LIBRARY_NAME = 'library'
+EXTENSION = '.' + preset.FILE_EXTENSION
+# Tasks queued per worker process
+PENDING_PER_WORKER = 4
+
+Result = namedtuple('Result', ['filename', 'outputs', 'unknown'])
+
+
+def read_messages(filename):
+    """Return the sysex payloads in a file. Files with a raw payload and no framing are also accepted."""
+    with open(filename, 'rb') as input_file:
+        data = input_file.read()
+    if data[0:1] != b'\xf0':
+        return [bytearray(data)]
+    return [bytearray(m.group(1)) for m in SYSEX.finditer(data)]
+
+
+def write_message(output_file, data):
+    output_file.write(b'\xf0')
+    output_file.write(bytes(data))
+    output_file.write(b'\xf7')
+
+
+def get_safe_name(name):
+    name = INVALID_CHARS.sub('_', name.strip())
+    return name if name else DEFAULT_NAME
+
+
+def create_file(directory, name):
+    """Create and return a new file that never overwrites another one, even from concurrent processes."""
+    os.makedirs(directory, exist_ok=True)
+    i = 0
+    while True:
+        suffix = '' if i == 0 else '-{:d}'.format(i)
+        path = os.path.join(directory, name + suffix + EXTENSION)
+        try:
+            return open(path, 'xb')
+        except FileExistsError:
+            i += 1
+
+
+def extract_file(filename, output_dir, number=None):
+    """Write every preset found in a file into its own file named after the preset.
+
+    Banks and bulks are copied into a directory per kind and variant."""
+    outputs = []
+    unknown = 0
+    for data in read_messages(filename):
+        sysex = formats.identify(data)
+        if sysex == None:
+            unknown += 1
+            continue
+        if sysex.kind == formats.PRESET or sysex.kind == formats.PANEL:
+            if number != None:
+                preset.set_number(data, number)
+            directory = output_dir
+            name = get_safe_name(sysex.name)
+        else:
+            directory = os.path.join(output_dir, sysex.kind, sysex.variant or '')
+            name = os.path.splitext(os.path.basename(filename))[0]
+        with create_file(directory, name) as output_file:
+            write_message(output_file, data)
+            outputs.append(output_file.name)
+    return Result(filename, outputs, unknown)
+
+
+def extract(filenames, output_dir, number=None, workers=None):
+    """Extract the files in parallel yielding a Result per file as soon as it is ready.
+
+    Only a few tasks per process are in flight at any time so memory stays
+    bounded regardless of the amount of files."""
+    if workers == None:
+        workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        max_pending = workers * PENDING_PER_WORKER
+        pending = set()
+        for filename in filenames:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(
+                extract_file, filename, output_dir, number))
+        for future in pending:
+            yield future.result()
+
+
+def merge_presets(filenames, output_dir, name=LIBRARY_NAME):
+    """Write the presets in the files into libraries of up to MAX_PRESETS presets numbered from 0.
+
+    A library is a sequence of preset messages, not a bank. Presets are
+    read and written one file at a time."""
+    outputs = []
+    output_file = None
+    number = 0
+    try:
+        for filename in filenames:
+            for data in read_messages(filename):
+                if formats.get_kind(data) not in [formats.PRESET, formats.PANEL]:
+                    continue
+                if output_file == None:
+                    output_file = create_file(output_dir, name)
+                    outputs.append(output_file.name)
+                preset.set_number(data, number)
+                write_message(output_file, data)
+                number += 1
+                if number == connector.MAX_PRESETS:
+                    output_file.close()
+                    output_file = None
+                    number = 0
+    finally:
+        if output_file:
+            output_file.close()
+    return outputs
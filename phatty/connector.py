@@ -19,11 +19,17 @@
 
 """Phatty connector"""
 
+from phatty import formats
+from phatty import recorder
+from phatty import trace
+from phatty import transport
+from phatty.progress import ProgressTimer
 import mido
 from mido import Message
 import logging
 import time
 import math
+from threading import RLock
 
 logger = logging.getLogger(__name__)
 
@@ -33,18 +39,18 @@ REQUEST_PANEL = [4, 5, 6, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 REQUEST_PATCH = [4, 5, 6, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 REQUEST_BANK = [4, 5, 6, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 REQUEST_BULK = [4, 5, 6, 2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-BANK_START = [4, 5, 1, 3]
+BANK_START = formats.BANK_START
 BANK_START_I = [4, 5, 1, 3, 0]
 BANK_START_II = [4, 5, 1, 3, 1]
 BANK_START_WHITE = [4, 5, 1, 3, 2]
-BULK_START = [4, 5, 3, 1]
+BULK_START = formats.BULK_START
 BULK_START_II = [4, 5, 3, 1, 1]
 REQ_PATCH_BYTE = 4
 MAX_PRESETS = 100
-RED_BANK_SIZE = 17142
-BANK_SIZE = RED_BANK_SIZE + 202
-RED_BULK_SIZE = RED_BANK_SIZE + 133
-BULK_SIZE = RED_BULK_SIZE + 202
+RED_BANK_SIZE = formats.RED_BANK_SIZE
+BANK_SIZE = formats.BANK_SIZE
+RED_BULK_SIZE = formats.RED_BULK_SIZE
+BULK_SIZE = formats.BULK_SIZE
 INVALID_BANK_FILE = 'Invalid bank file'
 INVALID_BULK_FILE = 'Invalid bulk file'
 HANDSHAKE_MSG = 'Handshake ok. Version {:s}.'
@@ -53,6 +59,12 @@ RECEIVE_RETRIES = 150
 RETRY_SLEEP_TIME = 0.1
 MSG_LEN = 2
 SLEEP_TIME = 0.0005
+STALL_TIMEOUT = 1
+PROGRESS_INTERVAL = 0.1
+# mido ports can only be polled so they are checked this often
+POLL_INTERVAL = 0.005
+# Estimated progress never reaches the end until the data is there
+MAX_ESTIMATED_FRACTION = 0.95
 FILTER_POLES_VALUES = [32 * i for i in range(0, 4)]
 MOD_SRC_5_VALUES = [0, 64]
 MOD_SRC_6_VALUES = [0, 64]
@@ -75,6 +87,34 @@ ARP_GATE_VALUES = [32 * i for i in range(0, 4)]
 ARP_CLOCK_SOURCE_VALUES = [0, 43, 86]
 ARP_CLOCK_DIVISION_VALUES = [i * 6 for i in range(0, 22)]
 ARP_CLOCK_DIVISION_VALUES.extend([127])
+PANEL_CONTROLLERS = {
+    'filter_poles': (109, FILTER_POLES_VALUES),
+    'vel_to_filter': (110, VEL_TO_FILTER_VALUES),
+    'vel_to_amp': (92, VEL_TO_AMP_VALUES),
+    'release': (88, RELEASE_VALUES),
+    'scale': (113, SCALE_VALUES),
+    'pw_up_amount': (107, PW_VALUES),
+    'pw_down_amount': (108, PW_VALUES),
+    'legato': (112, LEGATO_VALUES),
+    'keyboard_priority': (111, KEYBOARD_PRIORITY_VALUES),
+    'glide_on_legato': (94, GLIDE_ON_LEGATO_VALUES),
+    'mod_source_5': (104, MOD_SRC_5_VALUES),
+    'mod_source_6': (105, MOD_SRC_6_VALUES),
+    'mod_dest_2': (106, MOD_DEST_2_VALUES),
+    'lfo_key_retrigger': (93, LFO_RETRIGGER_VALUES),
+    'arp_pattern': (117, ARP_PATTERN_VALUES),
+    'arp_mode': (118, ARP_MODE_VALUES),
+    'arp_octaves': (116, ARP_OCTAVES_VALUES),
+    'arp_gate': (95, ARP_GATE_VALUES),
+    'arp_clock_source': (114, ARP_CLOCK_SOURCE_VALUES),
+    'arp_clock_division': (115, ARP_CLOCK_DIVISION_VALUES),
+}
+# 14-bit controllers with the LSB 32 controllers above the MSB
+CONTINUOUS_CONTROLLERS = {
+    'filter_cutoff': 19,
+    'filter_attack': 23,
+}
+LSB_CONTROLLER_OFFSET = 32
 
 mido.set_backend('mido.backends.rtmidi')
 logger.debug('Mido backend: {:s}'.format(str(mido.backend)))
@@ -84,6 +124,19 @@ def create_controller(control, value):
     return Message('control_change', channel=0, control=control, value=value)
 
 
+def get_panel_controller(name, value):
+    control, values = PANEL_CONTROLLERS[name]
+    return create_controller(control, values[value])
+
+
+def get_continuous_controllers(name, value):
+    """Return the MSB and LSB messages for a 12-bit value."""
+    control = CONTINUOUS_CONTROLLERS[name]
+    value = value << 2
+    return [create_controller(control, value >> 7),
+            create_controller(control + LSB_CONTROLLER_OFFSET, value & 0x7F)]
+
+
 def get_ports():
     filtered = []
     for p in mido.get_ioport_names():
@@ -98,6 +151,31 @@ class Connector(object):
     def __init__(self):
         logger.debug('Initializing...')
         self.port = None
+        self.transport = None
+        self.progress_timer = ProgressTimer()
+        self.recorder = None
+        # Serializes request and response pairs across threads
+        self.lock = RLock()
+
+    def start_recording(self, filename):
+        """Record every sysex message and every message passed to the callback."""
+        self.stop_recording()
+        self.recorder = recorder.Recorder(filename)
+        self.recorder.start()
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.stop()
+            self.recorder = None
+
+    def record(self, direction, data):
+        if self.recorder:
+            self.recorder.record(direction, data)
+
+    def send(self, msg):
+        """Send a non sysex message recording it."""
+        self.record(recorder.TX, msg.bytes())
+        self.port.send(msg)
 
     def connected(self):
         return self.port != None
@@ -107,20 +185,25 @@ class Connector(object):
         if self.port:
             logger.debug('Disconnecting...')
             try:
+                if self.transport:
+                    self.transport.close()
                 self.port.close()
             except IOError:
                 logger.error('IOError while disconnecting')
             self.port = None
+            self.transport = None
 
     def connect(self, device, callback):
         """Connect to the Phatty."""
         logger.debug('Connecting to {:s}...'.format(device))
         try:
             self.port = mido.open_ioport(device)
+            self.transport = transport.get_transport(self.port)
             self.callback = callback
             logger.debug('Handshaking...')
-            self.tx_message(INIT_MSG)
-            response = self.rx_message()
+            with self.lock, trace.span('handshake', trace.MIDI):
+                self.tx_message(INIT_MSG)
+                response = self.rx_message()
             if response[0:9] == PHATTY_MSG_WO_VERSION:
                 self.sw_version = '.'.join([str(i) for i in response[9:13]])
                 logger.debug(HANDSHAKE_MSG.format(self.sw_version))
@@ -138,36 +221,61 @@ class Connector(object):
         return msg
 
     def get_panel(self):
-        self.tx_message(REQUEST_PANEL)
-        m = self.rx_message()
+        with self.lock, trace.span('get_panel', trace.MIDI):
+            self.tx_message(REQUEST_PANEL)
+            m = self.rx_message()
         return m
 
     def get_preset(self, num):
         msg = []
         msg.extend(REQUEST_PATCH)
         msg[REQ_PATCH_BYTE] = num
-        self.tx_message(msg)
-        m = self.rx_message()
+        with self.lock, trace.span('get_preset', trace.MIDI, num=num):
+            self.tx_message(msg)
+            m = self.rx_message()
         return m
 
     def set_preset(self, id):
         msg = Message('program_change', channel=0, program=id)
         logger.debug('Sending program change {:d}...'.format(id))
-        self.port.send(msg)
+        self.send(msg)
 
+    @trace.traced(trace.MIDI)
     def tx_message(self, data):
-        msg = Message('sysex', data=data)
         logger.debug('Sending message {:s}...'.format(self.get_hex_data(data)))
+        self.record(recorder.TX, recorder.frame_sysex(data))
+        try:
+            if self.transport:
+                self.transport.send(data)
+            else:
+                self.port.send(Message('sysex', data=data))
+        except IOError:
+            self.disconnect()
+            raise ConnectorError()
+
+    @trace.traced(trace.MIDI)
+    def tx_large_message(self, data, progress=None):
+        """Send a large sysex message reporting its estimated progress."""
+        if not self.transport:
+            self.tx_message(data)
+            return
+        logger.debug('Sending message {:s}...'.format(self.get_hex_data(data)))
+        self.record(recorder.TX, recorder.frame_sysex(data))
         try:
-            self.port.send(msg)
+            self.progress_timer.send(transport.frame(data),
+                                     self.transport.output.send_message, progress)
         except IOError:
             self.disconnect()
             raise ConnectorError()
 
+    @trace.traced(trace.MIDI)
     def rx_message(self):
+        if self.transport:
+            return self.rx_raw_message()
         try:
             for i in range(0, RECEIVE_RETRIES):
                 for msg in self.port.iter_pending():
+                    self.record(recorder.RX, msg.bytes())
                     if msg.type == 'sysex':
                         logger.debug('Receiving message {:s}...'.format(
                             self.get_hex_data(msg.data)))
@@ -183,6 +291,75 @@ class Connector(object):
         self.disconnect()
         raise ConnectorError()
 
+    def rx_raw_message(self):
+        deadline = time.monotonic() + RECEIVE_RETRIES * RETRY_SLEEP_TIME
+        try:
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                data = self.transport.receive(timeout)
+                if data == None:
+                    break
+                self.record(recorder.RX, data)
+                if data[0] == transport.SYSEX_START:
+                    data = transport.unframe(data)
+                    if data != None:
+                        logger.debug('Receiving message {:s}...'.format(
+                            self.get_hex_data(data)))
+                        return data
+                    logger.debug('Discarding incomplete sysex message...')
+                else:
+                    try:
+                        msg = Message.from_bytes(data)
+                    except ValueError:
+                        logger.debug('Discarding invalid message...')
+                        continue
+                    self.callback(msg)
+        except (IOError, ValueError):
+            self.disconnect()
+            raise ConnectorError()
+        self.disconnect()
+        raise ConnectorError()
+
+    def poll(self, timeout=0):
+        """Pass the messages received while idle to the callback waiting up to timeout for them.
+
+        Sysex messages are discarded."""
+        deadline = time.monotonic() + timeout
+        try:
+            with self.lock:
+                if not self.transport:
+                    while True:
+                        received = False
+                        for msg in self.port.iter_pending():
+                            received = True
+                            self.record(recorder.RX, msg.bytes())
+                            if msg.type != 'sysex':
+                                self.callback(msg)
+                        remaining = deadline - time.monotonic()
+                        if received or remaining <= 0:
+                            return
+                        time.sleep(min(remaining, POLL_INTERVAL))
+                while True:
+                    data = self.transport.receive(
+                        max(0, deadline - time.monotonic()))
+                    if data == None:
+                        return
+                    self.record(recorder.RX, data)
+                    if data[0] == transport.SYSEX_START:
+                        logger.debug('Discarding unexpected sysex message...')
+                        continue
+                    try:
+                        msg = Message.from_bytes(data)
+                    except ValueError:
+                        logger.debug('Discarding invalid message...')
+                        continue
+                    self.callback(msg)
+        except IOError:
+            self.disconnect()
+            raise ConnectorError()
+
     def get_hex_data(self, data):
         if len(data) > MAX_DATA:
             data = data[0:MAX_DATA]
@@ -191,39 +368,102 @@ class Connector(object):
             s += '[...]'
         return s
 
-    def get_bank(self):
-        self.tx_message(REQUEST_BANK)
-        return self.rx_message()
+    @trace.traced(trace.MIDI)
+    def rx_stream(self, expected, progress=None):
+        """Receive a large sysex message reporting the received and expected bytes to progress.
+
+        The transfer fails as soon as the stream stalls. Backends that
+        deliver sysex only once complete give no bytes until the end so the
+        progress is estimated from the link rate until then."""
+        assembler = transport.SysexAssembler()
+        start = time.monotonic()
+        last = start
+        first_timeout = expected / transport.MIDI_RATE + STALL_TIMEOUT
+        try:
+            while True:
+                now = time.monotonic()
+                if len(assembler) > 0:
+                    remaining = last + STALL_TIMEOUT - now
+                else:
+                    remaining = start + first_timeout - now
+                if remaining <= 0:
+                    logger.debug('Stream stalled after {:d}B'.format(
+                        len(assembler)))
+                    break
+                data = self.transport.receive(min(remaining, PROGRESS_INTERVAL))
+                if data == None:
+                    if progress and len(assembler) == 0:
+                        estimated = (now - start) * transport.MIDI_RATE
+                        progress(int(min(estimated, expected * MAX_ESTIMATED_FRACTION)),
+                                 expected)
+                    continue
+                self.record(recorder.RX, data)
+                if not assembler.add(data):
+                    try:
+                        msg = Message.from_bytes(data)
+                    except ValueError:
+                        logger.debug('Discarding invalid message...')
+                        continue
+                    self.callback(msg)
+                    continue
+                last = time.monotonic()
+                if progress:
+                    progress(min(len(assembler), expected), expected)
+                if assembler.complete:
+                    data = assembler.get_data()
+                    if data == None:
+                        break
+                    logger.debug('Receiving message {:s}...'.format(
+                        self.get_hex_data(data)))
+                    return list(data)
+        except (IOError, ValueError):
+            pass
+        self.disconnect()
+        raise ConnectorError()
 
-    def get_bulk(self):
-        self.tx_message(REQUEST_BULK)
+    def rx_large_message(self, expected, progress):
+        if self.transport:
+            return self.rx_stream(expected, progress)
         return self.rx_message()
 
-    def set_bank(self, data):
+    def get_bank(self, progress=None):
+        with self.lock:
+            self.tx_message(REQUEST_BANK)
+            return self.rx_large_message(BANK_SIZE, progress)
+
+    def get_bulk(self, progress=None):
+        with self.lock:
+            self.tx_message(REQUEST_BULK)
+            return self.rx_large_message(BULK_SIZE, progress)
+
+    def set_bank(self, data, progress=None):
         logger.debug('Sending bank...')
-        if (len(data) == RED_BANK_SIZE or len(data) == BANK_SIZE) and data[0:4] == BANK_START:
-            self.tx_message(data)
+        if formats.get_kind(data) == formats.BANK:
+            self.tx_large_message(data, progress)
         else:
             raise ValueError(INVALID_BANK_FILE)
 
-    def set_bulk(self, data):
+    def set_bulk(self, data, progress=None):
         logger.debug('Sending bulk ...')
-        if (len(data) == RED_BULK_SIZE or len(data) == BULK_SIZE) and data[0:4] == BULK_START:
-            self.tx_message(data)
+        if formats.get_kind(data) == formats.BULK:
+            self.tx_large_message(data, progress)
         else:
             raise ValueError(INVALID_BULK_FILE)
 
-    def set_bank_from_file(self, filename):
+    def set_bank_from_file(self, filename, progress=None):
          data = self.read_data_from_file(filename)
-         try:
-             self.set_bank(data)
-         except ValueError as e:
-             self.set_bulk(data)
+         kind = formats.get_kind(data)
+         if kind == formats.BULK:
+             self.set_bulk(data, progress)
+         else:
+             self.set_bank(data, progress)
 
+    @trace.traced(trace.IO)
     def write_data_to_file(self, filename, data):
         messages = [Message('sysex', data=data)]
         mido.write_syx_file(filename, messages)
 
+    @trace.traced(trace.IO)
     def read_data_from_file(self, filename):
         messages = mido.read_syx_file(filename)
         data = messages[0].bytes()
@@ -231,6 +471,14 @@ class Connector(object):
             len(data), self.get_hex_data(data)))
         return data[1:len(data) - 1]
 
+    def send_messages(self, messages):
+        try:
+            for message in messages:
+                self.send(message)
+        except IOError:
+            self.disconnect()
+            raise ConnectorError()
+
     def set_panel_name(self, name):
         logger.debug('Setting preset name to {:s}...'.format(name))
         messages = []
@@ -248,96 +496,96 @@ class Connector(object):
             messages.append(
                 Message('control_change', channel=0, control=66, value=ord(c)))
         for message in messages:
-            self.port.send(message)
+            self.send(message)
 
     # Global
     def set_lfo_midi_sync(self, value):
         msg = create_controller(102, LFO_MIDI_SYNC_VALUES[value])
-        self.port.send(msg)
+        self.send(msg)
 
     # Filter and amp
     def set_panel_filter_poles(self, value):
-        msg = create_controller(109, FILTER_POLES_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('filter_poles', value)
+        self.send(msg)
 
     def set_panel_vel_to_filter(self, value):
-        msg = create_controller(110, VEL_TO_FILTER_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('vel_to_filter', value)
+        self.send(msg)
 
     def set_panel_vel_to_amp(self, value):
-        msg = create_controller(92, VEL_TO_AMP_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('vel_to_amp', value)
+        self.send(msg)
 
     def set_panel_release(self, value):
-        msg = create_controller(88, RELEASE_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('release', value)
+        self.send(msg)
 
     # Keyboard and controls
     def set_panel_scale(self, value):
-        msg = create_controller(113, SCALE_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('scale', value)
+        self.send(msg)
 
     def set_panel_pw_up_amount(self, value):
-        msg = create_controller(107, PW_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('pw_up_amount', value)
+        self.send(msg)
 
     def set_panel_pw_down_amount(self, value):
-        msg = create_controller(108, PW_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('pw_down_amount', value)
+        self.send(msg)
 
     def set_panel_legato(self, value):
-        msg = create_controller(112, LEGATO_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('legato', value)
+        self.send(msg)
 
     def set_panel_keyboard_priority(self, value):
-        msg = create_controller(111, KEYBOARD_PRIORITY_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('keyboard_priority', value)
+        self.send(msg)
 
     def set_panel_glide_on_legato(self, value):
-        msg = create_controller(94, GLIDE_ON_LEGATO_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('glide_on_legato', value)
+        self.send(msg)
 
     # Modulation
     def set_panel_mod_source_5(self, value):
-        msg = create_controller(104, MOD_SRC_5_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('mod_source_5', value)
+        self.send(msg)
 
     def set_panel_mod_source_6(self, value):
-        msg = create_controller(105, MOD_SRC_6_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('mod_source_6', value)
+        self.send(msg)
 
     def set_panel_mod_dest_2(self, value):
-        msg = create_controller(106, MOD_DEST_2_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('mod_dest_2', value)
+        self.send(msg)
 
     def set_panel_lfo_key_retrigger(self, value):
-        msg = create_controller(93, LFO_RETRIGGER_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('lfo_key_retrigger', value)
+        self.send(msg)
 
     # Arpeggiator
     def set_panel_arp_pattern(self, value):
-        msg = create_controller(117, ARP_PATTERN_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('arp_pattern', value)
+        self.send(msg)
 
     def set_panel_arp_mode(self, value):
-        msg = create_controller(118, ARP_MODE_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('arp_mode', value)
+        self.send(msg)
 
     def set_panel_arp_octaves(self, value):
-        msg = create_controller(116, ARP_OCTAVES_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('arp_octaves', value)
+        self.send(msg)
 
     def set_panel_arp_gate(self, value):
-        msg = create_controller(95, ARP_GATE_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('arp_gate', value)
+        self.send(msg)
 
     def set_panel_arp_clock_source(self, value):
-        msg = create_controller(114, ARP_CLOCK_SOURCE_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('arp_clock_source', value)
+        self.send(msg)
 
     def set_panel_arp_clock_division(self, value):
-        msg = create_controller(115, ARP_CLOCK_DIVISION_VALUES[value])
-        self.port.send(msg)
+        msg = get_panel_controller('arp_clock_division', value)
+        self.send(msg)
 
 
 class ConnectorError(IOError):
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty daemon
+
+Owns the MIDI port and serves several clients through a Unix domain
+socket. Every frame is a header followed by a JSON body and the raw bytes
+of any preset data."""
+
+from phatty import connector
+from phatty import formats
+from phatty import preset
+from phatty import utils
+from phatty.worker import Worker, PRIORITY_LOW
+from concurrent.futures import Future
+from threading import Thread, Lock
+import getopt
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+SOCKET_NAME = 'phattyd.sock'
+# Kind, id, body length and data length
+HEADER = struct.Struct('<BIII')
+REQUEST = 0
+RESPONSE = 1
+ERROR = 2
+EVENT = 3
+EVENT_TYPES = ['program_change', 'control_change']
+POLL_TIMEOUT = 0.02
+NOT_CONNECTED = 'Not connected'
+UNKNOWN_METHOD = 'Unknown method {:s}'
+UNKNOWN_PARAMETER = 'Unknown parameter {:s}'
+NOT_A_PRESET = 'Not a preset'
+MALFORMED_REQUEST = 'Malformed request: {:s}'
+ALREADY_RUNNING = 'A daemon is already listening on {:s}'
+MAX_PRESETS = connector.MAX_PRESETS
+
+
+class DaemonError(Exception):
+    """Raise when the daemon answers a request with an error"""
+
+
+def get_socket_path():
+    directory = os.environ.get('XDG_RUNTIME_DIR', tempfile.gettempdir())
+    return os.path.join(directory, SOCKET_NAME)
+
+
+def read_exactly(input_file, length):
+    data = input_file.read(length)
+    if len(data) < length:
+        raise EOFError()
+    return data
+
+
+def write_frame(output_file, kind, id, body=None, data=[]):
+    """Write a frame. data is a list of payloads whose sizes are sent in the body."""
+    body = dict(body or {})
+    if data:
+        body['sizes'] = [len(d) for d in data]
+    encoded = json.dumps(body, separators=(',', ':')).encode()
+    payload = b''.join([bytes(d) for d in data])
+    output_file.write(HEADER.pack(kind, id, len(encoded), len(payload)))
+    output_file.write(encoded)
+    output_file.write(payload)
+    output_file.flush()
+
+
+def read_frame(input_file):
+    """Return the kind, id, body and list of payloads of the next frame."""
+    kind, id, body_length, data_length = HEADER.unpack(
+        read_exactly(input_file, HEADER.size))
+    body = json.loads(read_exactly(input_file, body_length).decode())
+    payload = read_exactly(input_file, data_length)
+    data = []
+    start = 0
+    for size in body.pop('sizes', []):
+        data.append(bytearray(payload[start:start + size]))
+        start += size
+    return kind, id, body, data
+
+
+class Session(object):
+    """Connection of a single client"""
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.input = sock.makefile('rb')
+        self.output = sock.makefile('wb')
+        self.lock = Lock()
+        self.subscribed = False
+
+    def send(self, kind, id, body=None, data=[]):
+        try:
+            with self.lock:
+                write_frame(self.output, kind, id, body, data)
+        except (IOError, ValueError):
+            logger.debug('Client gone while sending')
+
+    def respond(self, id, result):
+        if isinstance(result, (bytes, bytearray)):
+            self.send(RESPONSE, id, data=[result])
+        elif isinstance(result, list) and result and isinstance(result[0], (bytes, bytearray)):
+            self.send(RESPONSE, id, {'list': True}, result)
+        else:
+            self.send(RESPONSE, id, {'result': result})
+
+    def fail(self, id, e):
+        self.send(ERROR, id, {'error': str(e)})
+
+    def run(self):
+        try:
+            while True:
+                kind, id, body, data = read_frame(self.input)
+                if kind == REQUEST:
+                    try:
+                        self.server.handle(self, id, body.get('method'),
+                                           body.get('args', []) + data)
+                    except (AttributeError, TypeError, KeyError) as e:
+                        self.fail(id, MALFORMED_REQUEST.format(str(e)))
+        except (EOFError, IOError, ValueError):
+            pass
+        finally:
+            self.server.remove(self)
+            self.sock.close()
+
+
+class Server(object):
+    """Serializes the device access of every client through a single worker.
+
+    Clients may send several requests without waiting for the responses.
+    Presets are cached so they are only read from the device once."""
+
+    def __init__(self, connector, path=None):
+        self.connector = connector
+        self.path = path or get_socket_path()
+        self.worker = Worker(lambda drain: drain())
+        self.sessions = []
+        self.lock = Lock()
+        self.library = [None] * MAX_PRESETS
+        self.device = None
+        self.sock = None
+        self.running = False
+        self.methods = {
+            'version': self.get_version,
+            'get_panel': self.get_panel,
+            'get_preset': self.get_preset,
+            'set_preset_data': self.set_preset_data,
+            'program_change': self.program_change,
+            'set_panel_parameter': self.set_panel_parameter,
+        }
+
+    def start(self, device=None):
+        self.remove_stale_socket()
+        self.device = device
+        if device:
+            self.connect()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.sock.listen()
+        self.running = True
+        self.worker.start()
+        self.schedule_poll()
+        self.thread = Thread(target=self.accept, daemon=True)
+        self.thread.start()
+        logger.debug('Listening on {:s}...'.format(self.path))
+
+    def remove_stale_socket(self):
+        """Remove a socket left by a daemon that is gone. Raise DaemonError if it is still running."""
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            logger.debug('Removing stale socket {:s}...'.format(self.path))
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise DaemonError(ALREADY_RUNNING.format(self.path))
+
+    def connect(self):
+        self.connector.connect(self.device, self.receive_message)
+        # The device may have been changed while it was unreachable
+        self.invalidate()
+        if not self.connector.connected():
+            logger.error('Could not connect to {:s}'.format(self.device))
+
+    def stop(self):
+        logger.debug('Stopping daemon...')
+        self.running = False
+        self.worker.stop(True, self.connector.disconnect)
+        self.sock.close()
+        with self.lock:
+            sessions = list(self.sessions)
+        for session in sessions:
+            try:
+                session.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def accept(self):
+        while self.running:
+            try:
+                sock, address = self.sock.accept()
+            except OSError:
+                return
+            session = Session(self, sock)
+            with self.lock:
+                self.sessions.append(session)
+            Thread(target=session.run, daemon=True).start()
+
+    def remove(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def handle(self, session, id, method, args):
+        if method == 'subscribe':
+            session.subscribed = True
+            session.respond(id, True)
+            return
+        if method == 'get_library':
+            self.get_library(session, id, *args)
+            return
+        function = self.methods.get(method)
+        if function == None:
+            session.fail(id, UNKNOWN_METHOD.format(str(method)))
+            return
+        # Cached presets are served without waiting for the device
+        if method == 'get_preset' and len(args) == 1:
+            data = self.get_cached_preset(args[0])
+            if data != None:
+                session.respond(id, data)
+                return
+        self.worker.submit(function, *args,
+                           callback=lambda result: session.respond(id, result),
+                           error_callback=lambda e: session.fail(id, e))
+
+    def schedule_poll(self):
+        if self.running:
+            self.worker.submit(self.poll, callback=lambda result: self.schedule_poll(),
+                               error_callback=lambda e: self.schedule_poll(),
+                               priority=PRIORITY_LOW)
+
+    def poll(self):
+        if self.connector.connected():
+            self.connector.poll(POLL_TIMEOUT)
+        else:
+            # Nothing to wait for but the next poll must not come at once
+            time.sleep(POLL_TIMEOUT)
+
+    def receive_message(self, msg):
+        if msg.type in EVENT_TYPES:
+            self.publish(msg.dict())
+
+    def publish(self, event):
+        with self.lock:
+            sessions = [s for s in self.sessions if s.subscribed]
+        for session in sessions:
+            session.send(EVENT, 0, event)
+
+    def check_connection(self):
+        """Reconnect if the connector was disconnected, e.g. after a timeout."""
+        if not self.connector.connected() and self.device:
+            logger.debug('Reconnecting...')
+            self.connect()
+        if not self.connector.connected():
+            raise DaemonError(NOT_CONNECTED)
+
+    def invalidate(self, num=None):
+        with self.lock:
+            if num == None:
+                self.library = [None] * MAX_PRESETS
+            elif 0 <= num < MAX_PRESETS:
+                self.library[num] = None
+
+    def get_cached_preset(self, num):
+        with self.lock:
+            return self.library[num] if 0 <= num < MAX_PRESETS else None
+
+    def get_version(self):
+        self.check_connection()
+        return self.connector.sw_version
+
+    def get_panel(self):
+        self.check_connection()
+        return self.connector.get_panel()
+
+    def get_preset(self, num, refresh=False):
+        if not refresh:
+            data = self.get_cached_preset(num)
+            if data != None:
+                return data
+        self.check_connection()
+        data = bytearray(self.connector.get_preset(num))
+        with self.lock:
+            self.library[num] = data
+        return data
+
+    def get_library(self, session, id, refresh=False):
+        """Read the presets one job at a time so other requests are served in between."""
+        presets = []
+
+        def read_next(data=None):
+            if data != None:
+                presets.append(data)
+            if len(presets) == MAX_PRESETS:
+                session.respond(id, presets)
+            else:
+                self.worker.submit(self.get_preset, len(presets), refresh,
+                                   callback=read_next,
+                                   error_callback=lambda e: session.fail(id, e))
+
+        read_next()
+
+    def set_preset_data(self, data):
+        self.check_connection()
+        kind = formats.get_kind(data)
+        if kind != formats.PRESET and kind != formats.PANEL:
+            raise DaemonError(NOT_A_PRESET)
+        self.connector.tx_message(data)
+        if kind == formats.PRESET:
+            # The stored preset is read back from the device when requested
+            self.invalidate(preset.get_number(data))
+        return True
+
+    def program_change(self, num):
+        self.check_connection()
+        self.connector.set_preset(num)
+        return True
+
+    def set_panel_parameter(self, name, value):
+        self.check_connection()
+        if name not in connector.PANEL_CONTROLLERS:
+            raise DaemonError(UNKNOWN_PARAMETER.format(name))
+        self.connector.send_messages(
+            [connector.get_panel_controller(name, value)])
+        return True
+
+
+class Client(object):
+    """Daemon client. Requests can be pipelined through submit."""
+
+    def __init__(self, path=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path or get_socket_path())
+        self.input = self.sock.makefile('rb')
+        self.output = self.sock.makefile('wb')
+        self.lock = Lock()
+        self.pending = {}
+        self.next_id = 1
+        self.callback = None
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def submit(self, method, *args):
+        """Send a request and return a Future with its result. bytes arguments are sent as raw data."""
+        future = Future()
+        data = [a for a in args if isinstance(a, (bytes, bytearray))]
+        args = [a for a in args if not isinstance(a, (bytes, bytearray))]
+        with self.lock:
+            id = self.next_id
+            self.next_id += 1
+            self.pending[id] = future
+            write_frame(self.output, REQUEST, id,
+                        {'method': method, 'args': args}, data)
+        return future
+
+    def call(self, method, *args, timeout=None):
+        return self.submit(method, *args).result(timeout)
+
+    def subscribe(self, callback):
+        """Receive the program change and control change messages of the device as dictionaries."""
+        self.callback = callback
+        return self.call('subscribe')
+
+    def run(self):
+        try:
+            while True:
+                kind, id, body, data = read_frame(self.input)
+                if kind == EVENT:
+                    if self.callback:
+                        self.callback(body)
+                    continue
+                with self.lock:
+                    future = self.pending.pop(id, None)
+                if future == None:
+                    continue
+                if kind == ERROR:
+                    future.set_exception(DaemonError(body.get('error')))
+                elif body.get('list'):
+                    future.set_result(data)
+                elif data:
+                    future.set_result(data[0])
+                else:
+                    future.set_result(body.get('result'))
+        except (EOFError, IOError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                pending = list(self.pending.values())
+                self.pending.clear()
+            for future in pending:
+                future.set_exception(DaemonError(NOT_CONNECTED))
+
+
+def print_help():
+    print('Usage: {:s}d [-v] [-s socket] [device]'.format(utils.APP_NAME))
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hvs:')
+    except getopt.GetoptError:
+        print_help()
+        sys.exit(1)
+    log_level = logging.ERROR
+    path = None
+    for opt, arg in opts:
+        if opt == '-h':
+            print_help()
+            sys.exit()
+        elif opt == '-v':
+            log_level = logging.DEBUG
+        elif opt == '-s':
+            path = arg
+    logging.basicConfig(level=log_level)
+    if args:
+        device = args[0]
+    else:
+        ports = connector.get_ports()
+        device = ports[0] if ports else utils.read_config()[utils.DEVICE]
+    server = Server(connector.Connector(), path)
+    try:
+        server.start(device)
+    except DaemonError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset diff"""
+
+from phatty import preset
+from collections import namedtuple
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+NAME = 'name'
+NON_ZERO = re.compile(b'[^\\x00]')
+
+ParameterDiff = namedtuple('ParameterDiff', ['name', 'old', 'new'])
+PresetDiff = namedtuple(
+    'PresetDiff', ['number', 'parameters', 'unknown_bytes'])
+
+
+def get_byte_accessors():
+    accessors = {}
+    for i in range(preset.NAME_START_BYTE, preset.NAME_END_BYTE):
+        accessors[i] = [None]
+    for accessor in preset.ACCESSORS:
+        for i in accessor[preset.ACCESSOR_BYTES]:
+            accessors.setdefault(i, []).append(accessor)
+    return accessors
+
+
+BYTE_ACCESSORS = get_byte_accessors()
+
+
+def get_changed_bytes(a, b, start=preset.DATA_START_BYTE):
+    """Return the offsets of the bytes from start that differ between two presets."""
+    a = bytes(a[start:])
+    b = bytes(b[start:])
+    length = max(len(a), len(b))
+    # Padding keeps the offsets aligned if one of them is truncated
+    x = int.from_bytes(a.ljust(length, b'\0'), 'big') ^ int.from_bytes(
+        b.ljust(length, b'\0'), 'big')
+    if x == 0 and len(a) == len(b):
+        return []
+    diff = x.to_bytes(length, 'big')
+    changed = set([m.start() for m in NON_ZERO.finditer(diff)])
+    changed.update(range(min(len(a), len(b)), length))
+    return [i + start for i in sorted(changed)]
+
+
+def diff_presets(a, b, number=None):
+    """Return a PresetDiff with the decoded parameters that differ or None if both presets are equal."""
+    changed = get_changed_bytes(a, b)
+    if not changed:
+        return None
+    parameters = []
+    unknown = []
+    seen = set()
+    limit = min(len(a), len(b))
+    for i in changed:
+        accessors = BYTE_ACCESSORS.get(i)
+        if not accessors or i >= limit:
+            unknown.append(i)
+            continue
+        for accessor in accessors:
+            key = NAME if accessor == None else accessor[preset.ACCESSOR_NAME]
+            if key in seen:
+                continue
+            seen.add(key)
+            if accessor != None and max(accessor[preset.ACCESSOR_BYTES]) >= limit:
+                continue
+            if accessor == None:
+                old = preset.get_name(a)
+                new = preset.get_name(b)
+            else:
+                getter = accessor[preset.ACCESSOR_GETTER]
+                old = getter(a)
+                new = getter(b)
+            if old != new:
+                parameters.append(ParameterDiff(key, old, new))
+    if number == None:
+        number = preset.get_number(a)
+    return PresetDiff(number, parameters, unknown)
+
+
+def diff_libraries(a, b):
+    """Return the PresetDiff list for every slot that differs between two preset lists."""
+    diffs = []
+    for i in range(min(len(a), len(b))):
+        d = diff_presets(a[i], b[i], i)
+        if d:
+            diffs.append(d)
+    if len(a) != len(b):
+        logger.debug('Libraries have different sizes: {:d} and {:d}'.format(
+            len(a), len(b)))
+    return diffs
+
+
+def diff_device(connector, library):
+    """Return the PresetDiff list between a preset list and the presets stored in the device."""
+    diffs = []
+    for i in range(len(library)):
+        d = diff_presets(library[i], connector.get_preset(i), i)
+        if d:
+            diffs.append(d)
+    return diffs
@@ -21,15 +21,26 @@
 
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GObject
+from gi.repository import Gtk, Gdk, GObject
 from gi.repository import GLib
-from threading import Thread, Lock
+from threading import Lock, Thread, current_thread, main_thread
 import logging
 import pkg_resources
+from phatty import archive
 from phatty import connector
 from phatty.connector import ConnectorError
+from phatty import formats
+from phatty import history
+from phatty import mirror
 from phatty import preset
+from phatty import profiler
+from phatty import store
+from phatty import trace
+from phatty.transfer import TransferChannel
 from phatty import utils
+from phatty import verifier
+from phatty.prefetcher import Prefetcher
+from phatty.worker import Worker
 import sys
 import getopt
 import mido
@@ -40,6 +51,21 @@ CONN_MSG = 'Connected (firmware version {:s})'
 ERROR_IN_BANK_TRANSFER = 'Error in bank transfer {:s}'
 ERROR_WHILE_SAVING_DATA = 'Error while saving data to {:s}'
 ERROR_WHILE_READING_DATA = 'Error while reading data from {:s}'
+UNKNOWN_FORMAT = 'Unknown sysex format'
+NOT_A_PRESET = 'The file does not contain a preset'
+UNVERIFIED_PRESETS = 'Presets not verified'
+UNVERIFIED_PRESETS_DESC = 'These presets could not be written: {:s}'
+WRITE_PRESETS = 'Write changed presets?'
+WRITE_PRESETS_DESC = 'These presets will be overwritten in the device: {:s}'
+RECEIVING_MSG = 'Received {:d} of {:d} bytes...'
+SENDING_MSG = 'Sent {:d} of {:d} bytes...'
+ARCHIVE_TITLE = 'Archive'
+ARCHIVE_MSG = '{:d} of {:d} presets'
+ARCHIVE_INDEXING_MSG = 'Indexing {:s}...'
+SELECTION_DELAY = 150
+SET_PANEL_PREFIX = 'set_panel_'
+PARAMETER_SETTERS = dict([(a[preset.ACCESSOR_NAME], a[preset.ACCESSOR_SETTER])
+                          for a in preset.ACCESSORS])
 
 glade_file = pkg_resources.resource_filename(__name__, 'resources/gui.glade')
 init_preset_file = pkg_resources.resource_filename(
@@ -48,11 +74,15 @@ version = pkg_resources.get_distribution(utils.APP_NAME).version
 
 
 def print_help():
-    print('Usage: {:s} [-v]'.format(utils.APP_NAME))
+    print('Usage: {:s} [-v] [-p] [-r record_file] [-t trace_file]'.format(utils.APP_NAME))
+    print('Profiling is also enabled with {:s}=1'.format(profiler.ENV_VAR))
 
 log_level = logging.ERROR
+record_file = None
+trace_file = None
+profile = profiler.is_enabled()
 try:
-    opts, args = getopt.getopt(sys.argv[1:], "hv")
+    opts, args = getopt.getopt(sys.argv[1:], "hvpr:t:", ['profile'])
 except getopt.GetoptError:
     print_help()
     sys.exit(1)
@@ -62,6 +92,12 @@ for opt, arg in opts:
         sys.exit()
     elif opt == '-v':
         log_level = logging.DEBUG
+    elif opt == '-r':
+        record_file = arg
+    elif opt in ('-p', '--profile'):
+        profile = True
+    elif opt == '-t':
+        trace_file = arg
 
 logging.basicConfig(level=log_level)
 logger = logging.getLogger(__name__)
@@ -94,15 +130,13 @@ class TransferDialog(object):
         self.button.show()
         self.show(title)
 
-    def show_pulse(self, title):
+    def show_progress(self, title):
         self.label.set_text('')
         self.button.hide()
-        self.pulsating = True
         self.show(title)
 
     def cancel(self):
         self.running = False
-        self.pulsating = False
 
     def hide(self):
         self.dialog.hide()
@@ -111,13 +145,6 @@ class TransferDialog(object):
         self.label.set_text(msg)
         self.progressbar.set_fraction(fraction)
 
-    def pulse_progressbar(self):
-        self.progressbar.pulse()
-        if self.running:
-            return self.pulsating
-        else:
-            return False
-
 
 class SettingsDialog(object):
 
@@ -128,6 +155,8 @@ class SettingsDialog(object):
         self.cancel = builder.get_object('settings_cancel_button')
         self.bulk_switch = builder.get_object('bulk_switch')
         self.auto_switch = builder.get_object('auto_switch')
+        self.prefetch_switch = builder.get_object('prefetch_switch')
+        self.verify_switch = builder.get_object('verify_switch')
         self.dialog.set_transient_for(phatty.main_window)
         self.dialog.connect('delete-event', lambda widget,
                             event: widget.hide() or True)
@@ -137,22 +166,152 @@ class SettingsDialog(object):
     def show(self):
         self.bulk_switch.set_active(self.phatty.config[utils.BULK_ON])
         self.auto_switch.set_active(self.phatty.config[utils.DOWNLOAD_AUTO])
+        self.prefetch_switch.set_active(self.phatty.config[utils.PREFETCH_ON])
+        self.verify_switch.set_active(self.phatty.config[utils.VERIFY_ON])
         self.dialog.show()
 
     def save(self):
         self.phatty.config[utils.BULK_ON] = self.bulk_switch.get_active()
         self.phatty.config[utils.DOWNLOAD_AUTO] = self.auto_switch.get_active()
+        self.phatty.config[utils.PREFETCH_ON] = self.prefetch_switch.get_active()
+        self.phatty.config[utils.VERIFY_ON] = self.verify_switch.get_active()
+        self.phatty.set_prefetcher()
         self.dialog.hide()
 
+
+class ArchiveBrowser(object):
+    """Browses the presets of a directory tree.
+
+    The model only holds archive indices. Names come from the archive index
+    as rows are drawn and the disk is only read to load a preset."""
+
+    def __init__(self, phatty):
+        self.phatty = phatty
+        self.archive = archive.Archive()
+        self.indexing = False
+        self.window = Gtk.Window(title=ARCHIVE_TITLE)
+        self.window.set_transient_for(phatty.main_window)
+        self.window.set_default_size(400, 600)
+        self.window.connect('delete-event', lambda widget,
+                            event: widget.hide() or True)
+        header = Gtk.HeaderBar(title=ARCHIVE_TITLE, show_close_button=True)
+        self.folder_button = Gtk.Button(label='Open folder')
+        self.folder_button.connect('clicked', lambda widget: self.open_folder())
+        header.pack_start(self.folder_button)
+        self.load_button = Gtk.Button(label='Load')
+        self.load_button.connect('clicked', lambda widget: self.load_selected())
+        header.pack_end(self.load_button)
+        self.window.set_titlebar(header)
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_tooltip_text(
+            'Filter by name and parameter values, e.g. "bass filter_poles=3"')
+        self.search_entry.connect('search-changed', lambda widget: self.refilter())
+        box.pack_start(self.search_entry, False, True, 0)
+        self.store = Gtk.ListStore(int)
+        self.view = Gtk.TreeView(model=self.store, headers_visible=False)
+        renderer = Gtk.CellRendererText()
+        column = Gtk.TreeViewColumn('Name', renderer)
+        column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        column.set_cell_data_func(renderer, self.render_name)
+        self.view.append_column(column)
+        # Rows are never measured so only the visible ones are decoded
+        self.view.set_fixed_height_mode(True)
+        self.view.connect('row-activated', lambda widget,
+                          path, column: self.load_selected())
+        scrolled_window = Gtk.ScrolledWindow()
+        scrolled_window.add(self.view)
+        box.pack_start(scrolled_window, True, True, 0)
+        self.statusbar = Gtk.Statusbar()
+        self.context_id = self.statusbar.get_context_id(ARCHIVE_TITLE)
+        box.pack_start(self.statusbar, False, True, 0)
+        self.window.add(box)
+
+    def show(self):
+        self.window.show_all()
+        self.window.present()
+
+    def render_name(self, column, cell, model, iter, data):
+        try:
+            name = self.archive.get_name(model[iter][0])
+        except IndexError:
+            # The row may outlive the archive it was built from
+            name = ''
+        cell.set_property('text', name)
+
+    def open_folder(self):
+        dialog = Gtk.FileChooserDialog('Open folder', self.window,
+                                       Gtk.FileChooserAction.SELECT_FOLDER,
+                                       (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                                        Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
+        response = dialog.run()
+        directory = dialog.get_filename()
+        dialog.destroy()
+        if response == Gtk.ResponseType.OK and not self.indexing:
+            self.indexing = True
+            self.folder_button.set_sensitive(False)
+            self.set_status_msg(ARCHIVE_INDEXING_MSG.format(directory))
+            # Disk reads must not delay the connector jobs
+            Thread(target=self.index, args=(directory,), daemon=True).start()
+
+    def index(self, directory):
+        # The archive being shown is only replaced in the main thread
+        new_archive = archive.Archive()
+        try:
+            new_archive.load(directory)
+        finally:
+            GLib.idle_add(self.end_index, new_archive)
+
+    def end_index(self, new_archive):
+        self.archive = new_archive
+        self.indexing = False
+        self.folder_button.set_sensitive(True)
+        self.refilter()
+
+    def refilter(self):
+        if self.indexing:
+            return
+        indices = self.archive.search(self.search_entry.get_text())
+        # Detaching the model avoids a view update per row
+        self.view.set_model(None)
+        self.store.clear()
+        for i in indices:
+            self.store.append([int(i)])
+        self.view.set_model(self.store)
+        self.set_status_msg(ARCHIVE_MSG.format(len(indices), len(self.archive)))
+
+    def set_status_msg(self, msg):
+        self.statusbar.pop(self.context_id)
+        self.statusbar.push(self.context_id, msg)
+
+    def load_selected(self):
+        model, iter = self.view.get_selection().get_selected()
+        if not iter or not self.phatty.preset_selection.get_selected()[1]:
+            return
+        data = self.archive.get_data(model[iter][0])
+        self.phatty.set_current_preset_data(bytearray(data))
+
+
 class Editor(object):
     """Phatty user interface"""
 
     def __init__(self):
         self.connector = connector.Connector()
         self.main_window = None
-        self.sysex_presets = []
+        self.sysex_presets = store.PresetStore()
+        self.modified_presets = set()
         self.config = utils.read_config()
         self.transferring = Lock()
+        self.history = history.History()
+        self.mirror = mirror.PanelMirror()
+        self.profiler = None
+        self.setting_attributes = False
+        self.selection_source = None
+        self.selection_jobs = []
+        self.settling = False
+        self.worker = Worker(GLib.idle_add)
+        self.prefetcher = Prefetcher(
+            self.connector, self.worker, self.update_prefetched_preset)
 
     def load_devices(self, select):
         self.device_liststore.clear()
@@ -184,6 +343,11 @@ class Editor(object):
         self.main_window.connect(
             'delete-event', lambda widget, event: self.quit())
         self.main_window.set_position(Gtk.WindowPosition.CENTER)
+        self.main_window.drag_dest_set(
+            Gtk.DestDefaults.ALL, [], Gdk.DragAction.COPY)
+        self.main_window.drag_dest_add_uri_targets()
+        self.main_window.connect('drag-data-received', self.drag_data_received)
+        self.main_window.connect('key-press-event', self.key_pressed)
         self.main_container = builder.get_object('main_container')
         self.about_dialog = builder.get_object('about_dialog')
         self.about_dialog.set_version(version)
@@ -206,6 +370,9 @@ class Editor(object):
         self.upload_button.connect(
             'clicked', lambda widget: self.upload_presets())
         self.upload_button.set_sensitive(False)
+        self.write_button = builder.get_object('write_button')
+        self.write_button.connect(
+            'clicked', lambda widget: self.write_presets())
         self.about_button = builder.get_object('about_button')
         self.about_button.connect('clicked', lambda widget: self.show_about())
         self.preferences_button = builder.get_object('preferences_button')
@@ -217,10 +384,14 @@ class Editor(object):
         self.save_button = builder.get_object('save_button')
         self.save_button.connect(
             'clicked', lambda widget: self.save_bank_to_file())
+        self.archive_button = builder.get_object('archive_button')
+        self.archive_button.connect(
+            'clicked', lambda widget: self.archive_browser.show())
         self.statusbar = builder.get_object('statusbar')
         self.context_id = self.statusbar.get_context_id(utils.APP_NAME)
         self.preset_list = builder.get_object('preset_list')
         self.presets = builder.get_object('preset_liststore')
+        self.sysex_presets.subscribe(self.preset_changed)
         self.preset_selection = builder.get_object('preset_selection')
         self.presets.connect('row-deleted', self.row_deleted)
         self.preset_selection.connect('changed', self.selection_changed)
@@ -228,7 +399,11 @@ class Editor(object):
             'preset_name_renderer')
         self.preset_name_renderer.connect('edited', self.set_preset_name)
         self.transfer_dialog = TransferDialog(self.main_window)
+        self.transfer_channel = TransferChannel(
+            self.transfer_dialog.set_status, self.add_presets,
+            GLib.idle_add, GLib.timeout_add, GLib.source_remove)
         self.settings_dialog = SettingsDialog(self)
+        self.archive_browser = ArchiveBrowser(self)
 
         # Filter and envelopes
         self.filter_poles = builder.get_object('filter_poles')
@@ -348,35 +523,56 @@ class Editor(object):
     def get_panel(self):
         model, iter = self.preset_selection.get_selected()
         active_preset = model[iter][0]
-        try:
-            panel = self.connector.get_panel_as_preset(active_preset)
-            self.sysex_presets[active_preset] = panel
-            self.presets[active_preset][1] = preset.get_name(panel)
-            self.set_preset_attributes(active_preset)
-        except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
+        self.submit(self.read_panel, active_preset,
+                    callback=lambda panel: self.update_preset(active_preset, panel, True))
+
+    def read_panel(self, id):
+        """Return the panel from the mirror if it is current or from a panel dump otherwise."""
+        # Controllers received since the last request may invalidate the mirror
+        self.connector.poll()
+        panel = self.mirror.get_panel_as_preset(id)
+        if panel == None:
+            self.mirror.seed(self.connector.get_panel())
+            panel = self.mirror.get_panel_as_preset(id)
+        return panel
 
     def get_preset(self):
         model, iter = self.preset_selection.get_selected()
         active_preset = model[iter][0]
-        try:
-            p = self.connector.get_preset(active_preset)
-            self.sysex_presets[active_preset] = p
-            self.presets[active_preset][1] = preset.get_name(p)
-            self.set_preset_attributes(active_preset)
-        except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
+        self.submit(self.connector.get_preset, active_preset,
+                    callback=lambda p: self.update_preset(active_preset, p, False))
+
+    def update_preset(self, id, data, modified):
+        if modified:
+            self.history.record(history.OVERRIDE, id, self.sysex_presets[id], data)
+        else:
+            # The device copy is the new baseline of the preset
+            self.history.forget(id)
+        self.sysex_presets[id] = data
+        if modified:
+            self.modified_presets.add(id)
+        else:
+            self.modified_presets.discard(id)
+        model, iter = self.preset_selection.get_selected()
+        if iter and model[iter][0] == id:
+            self.set_preset_attributes(id)
 
     def set_preset(self):
         model, iter = self.preset_selection.get_selected()
         active_preset = model[iter][0]
-        try:
-            self.connector.tx_message(self.sysex_presets[active_preset])
-        except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
+        self.submit(verifier.upload, self.connector, self.sysex_presets,
+                    [active_preset], self.config[utils.VERIFY_ON],
+                    callback=lambda failed: self.end_set_preset(active_preset, failed))
+
+    def end_set_preset(self, id, failed):
+        if failed:
+            self.show_unverified_presets(failed)
+        else:
+            self.modified_presets.discard(id)
+
+    def show_unverified_presets(self, failed):
+        desc = UNVERIFIED_PRESETS_DESC.format(', '.join([str(i) for i in failed]))
+        self.show_error_dialog(UNVERIFIED_PRESETS, desc)
 
     def save_current_preset(self):
         model, iter = self.preset_selection.get_selected()
@@ -415,26 +611,70 @@ class Editor(object):
         if response == Gtk.ResponseType.OK:
             self.override_preset(filename)
 
-    def override_preset(self, filename):
-        logger.debug('Overriding selected preset with file {:s}'.format(filename))
+    def read_file(self, filename):
+        """Return the typed sysex in the given file or None if it can not be used."""
         try:
             data = self.connector.read_data_from_file(filename)
-            model, iter = self.preset_selection.get_selected()
-            active_preset = model[iter][0]
-            preset.set_number(data, active_preset)
-            self.sysex_presets[active_preset] = data
-            model[iter][1] = preset.get_name(data)
-            self.set_preset_attributes(active_preset)
-            self.connector.tx_message(data)
-        except (IOError, ConnectorError) as e:
+        except IOError as e:
             msg = ERROR_WHILE_READING_DATA.format(filename)
-            desc = str(e)
-            GLib.idle_add(self.show_error_dialog, msg, desc)
+            GLib.idle_add(self.show_error_dialog, msg, str(e))
+            return None
+        sysex = formats.identify(data)
+        if sysex == None:
+            msg = ERROR_WHILE_READING_DATA.format(filename)
+            GLib.idle_add(self.show_error_dialog, msg, UNKNOWN_FORMAT)
+        return sysex
+
+    def open_file(self, filename):
+        """Open a file into the selected preset or send it to the Phatty depending on its format."""
+        sysex = self.read_file(filename)
+        if sysex == None:
+            return
+        logger.debug('Opening {:s} {:s}...'.format(sysex.kind, filename))
+        if sysex.kind == formats.BANK or sysex.kind == formats.BULK:
+            self.send_bank_file(filename)
+        elif self.preset_selection.get_selected()[1]:
+            self.set_current_preset_data(sysex.data)
+
+    def drag_data_received(self, widget, context, x, y, data, info, time):
+        for uri in data.get_uris():
+            filename, hostname = GLib.filename_from_uri(uri)
+            self.open_file(filename)
+
+    def override_preset(self, filename):
+        logger.debug('Overriding selected preset with file {:s}'.format(filename))
+        sysex = self.read_file(filename)
+        if sysex == None:
+            return
+        if sysex.kind != formats.PRESET and sysex.kind != formats.PANEL:
+            msg = ERROR_WHILE_READING_DATA.format(filename)
+            GLib.idle_add(self.show_error_dialog, msg, NOT_A_PRESET)
+            return
+        self.set_current_preset_data(sysex.data)
+
+    def set_current_preset_data(self, data):
+        model, iter = self.preset_selection.get_selected()
+        active_preset = model[iter][0]
+        preset.set_number(data, active_preset)
+        self.history.record(history.OVERRIDE, active_preset,
+                            self.sysex_presets[active_preset], data)
+        self.mirror.invalidate()
+        self.sysex_presets[active_preset] = data
+        self.set_preset_attributes(active_preset)
+        self.submit(self.connector.tx_message, data)
 
     def reset_current_preset(self):
         self.override_preset(init_preset_file)
 
     def set_preset_attributes(self, id):
+        # Widgets still send their CCs but these are not edits to record
+        self.setting_attributes = True
+        try:
+            self.load_preset_attributes(id)
+        finally:
+            self.setting_attributes = False
+
+    def load_preset_attributes(self, id):
         active_preset = self.sysex_presets[id]
         # Filter and amp
         filter_poles = preset.get_filter_poles(active_preset)
@@ -483,51 +723,90 @@ class Editor(object):
         self.arp_clock_division.set_active(arp_clock_division)
 
     def selection_changed(self, selection):
+        """Wait for the selection to settle before changing the preset in the device."""
+        self.cancel_selection()
         model, iter = selection.get_selected()
         if iter:
             id = model[iter][0]
+            self.selection_source = GLib.timeout_add(
+                SELECTION_DELAY, self.settle_selection, id)
+
+    def cancel_selection(self):
+        if self.selection_source:
+            GLib.source_remove(self.selection_source)
+            self.selection_source = None
+        # Whatever an unsettled selection sent and is still queued is superseded
+        for job in self.selection_jobs:
+            job.cancel()
+        self.selection_jobs = []
+
+    def settle_selection(self, id):
+        self.selection_source = None
+        model, iter = self.preset_selection.get_selected()
+        if iter and model[iter][0] == id:
             logger.debug('Preset {:d} selected'.format(id))
+            self.selection_jobs.append(
+                self.submit(self.connector.set_preset, id))
+            # Only a panel dump tells what the device loaded
+            self.mirror.invalidate()
+            self.settling = True
             try:
-                self.connector.set_preset(id)
                 self.set_preset_attributes(id)
-            except ConnectorError as e:
-                GLib.idle_add(self.show_error_dialog, str(e), None)
-                self.ui_reconnect()
+            finally:
+                self.settling = False
+            if self.prefetcher.running and not self.transferring.locked():
+                self.prefetcher.select(id)
+        return False
 
     def row_deleted(self, tree_model, path):
         if not self.transferring.locked():
             logger.debug('Reordering...')
-            new_sysex_presets = []
+            order = [self.presets[i][0] for i in range(connector.MAX_PRESETS)]
+            history.reorder(self.sysex_presets, order)
+            self.history.record_order(order)
             for i in range(connector.MAX_PRESETS):
-                sysex_preset = self.sysex_presets[self.presets[i][0]]
-                preset.set_number(sysex_preset, i)
-                new_sysex_presets.append(sysex_preset)
                 self.presets[i][0] = i
-            self.sysex_presets = new_sysex_presets
+            # Nothing is sent until the changes are written
+            self.modified_presets.update(history.get_moved(order))
 
     def set_preset_name(self, widget, row, name):
         logger.debug('Changing preset name...')
         active_preset = int(row)
         normalized_name = preset.normalize_name(name)
-        self.presets[active_preset][1] = normalized_name
-        preset.set_name(self.sysex_presets[active_preset], normalized_name)
-        try:
-            self.connector.set_panel_name(normalized_name)
-        except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
+        old, new = self.sysex_presets.modify(
+            active_preset, preset.set_name, normalized_name)
+        self.history.record(history.NAME, active_preset, old, new)
+        self.modified_presets.add(active_preset)
+        self.mirror.set_name(normalized_name)
+        self.submit(self.connector.set_panel_name, normalized_name)
+
+    def submit(self, function, *args, callback=None, error_callback=None):
+        if not error_callback:
+            error_callback = self.connector_error
+        return self.worker.submit(function, *args, callback=callback,
+                                  error_callback=error_callback)
+
+    def connector_error(self, e):
+        if isinstance(e, ConnectorError):
+            self.show_error_dialog(str(e), None)
             self.ui_reconnect()
+        else:
+            logger.error('Unexpected connector error: {:s}'.format(str(e)))
 
-    def connect(self):
+    def ui_reconnect(self):
         device = self.config[utils.DEVICE]
-        self.connector.connect(device, self.connect_callback)
+        self.prefetcher.stop()
+        self.mirror.invalidate()
+        self.submit(self.connector.connect, device, self.connect_callback,
+                    callback=lambda r: self.end_connect())
+
+    def end_connect(self):
         if self.connector.connected():
             conn_msg = CONN_MSG.format(self.connector.sw_version)
             self.set_status_msg(conn_msg)
         else:
             self.set_status_msg('Not connected')
-
-    def ui_reconnect(self):
-        self.connect()
+        self.set_prefetcher()
         self.set_ui()
 
     def set_ui(self):
@@ -539,20 +818,24 @@ class Editor(object):
     def set_sensitivities(self):
         for c in [self.open_button, self.save_button, self.download_button, self.lfo_midi_sync]:
             c.set_sensitive(self.connector.connected())
-        for c in [self.main_container, self.upload_button, self.download_panel, self.download_preset, self.upload_preset, self.save_preset, self.open_preset, self.reset_preset]:
+        for c in [self.main_container, self.upload_button, self.write_button, self.download_panel, self.download_preset, self.upload_preset, self.save_preset, self.open_preset, self.reset_preset]:
             c.set_sensitive(self.connector.connected()
                             and len(self.sysex_presets) > 0)
 
     def download_presets(self):
-        logger.debug('Starting download thread...')
+        logger.debug('Starting download...')
         self.preset_selection.unselect_all()
         self.transfer_dialog.show_fraction('Downloading presets')
         self.transferring.acquire()
         self.presets.clear()
         self.sysex_presets.clear()
-        self.thread = Thread(target=self.do_download)
-        self.thread.start()
+        self.modified_presets.clear()
+        self.history.clear()
+        self.prefetcher.invalidate()
+        self.transfer_channel.start()
+        self.submit(self.do_download, callback=self.end_download)
 
+    @trace.traced(trace.TRANSFER)
     def do_download(self):
         try:
             for i in range(connector.MAX_PRESETS):
@@ -562,59 +845,102 @@ class Editor(object):
                 msg = 'Downloading preset {:d}...'.format(i)
                 logger.debug(msg)
                 fraction = (i + 1) / connector.MAX_PRESETS
-                GLib.idle_add(self.transfer_dialog.set_status, msg, fraction)
+                self.transfer_channel.set_status(msg, fraction)
                 p = self.connector.get_preset(i)
                 preset_name = preset.get_name(p)
-                GLib.idle_add(self.add_preset, i, preset_name)
+                self.transfer_channel.add_preset(i, preset_name)
                 self.sysex_presets.append(p)
         except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
-        GLib.idle_add(self.end_download)
-
-    def add_preset(self, number, name):
-        self.presets.append([number, name])
-
-    def end_download(self):
-        if not self.transfer_dialog.running:
+            return e
+
+    def add_presets(self, rows):
+        # Appending while detached avoids a relayout per inserted row
+        self.preset_list.set_model(None)
+        for row in rows:
+            self.presets.append(row)
+        self.preset_list.set_model(self.presets)
+
+    def end_download(self, error):
+        if self.transfer_dialog.running:
+            self.transfer_channel.stop()
+        else:
+            self.transfer_channel.cancel()
             self.presets.clear()
             self.sysex_presets.clear()
-        self.thread.join()
-        logger.debug('Thread finished')
+        logger.debug('Download finished')
         self.upload_button.set_sensitive(len(self.sysex_presets) > 0)
         self.transferring.release()
         self.transfer_dialog.hide()
         self.preset_list.set_cursor(0)
         self.set_sensitivities()
-
-    def upload_presets(self):
-        logger.debug('Starting upload thread...')
+        if error:
+            self.connector_error(error)
+
+    def upload_presets(self, slots=None):
+        if self.transferring.locked():
+            return
+        if slots == None:
+            slots = range(connector.MAX_PRESETS)
+        logger.debug('Starting upload...')
         self.transfer_dialog.show_fraction("Uploading presets")
         self.transferring.acquire()
-        self.thread = Thread(target=self.do_upload)
-        self.thread.start()
-
-    def do_upload(self):
+        self.transfer_channel.start()
+        self.submit(self.do_upload, slots, callback=self.end_upload)
+
+    @trace.traced(trace.TRANSFER)
+    def do_upload(self, slots):
+        """Return the written, failed and edited slots and the error if any."""
+        versions = self.sysex_presets.get_versions()
+        written = []
+        failed = []
+        error = None
         try:
-            for i in range(connector.MAX_PRESETS):
-                if not self.transfer_dialog.running:
-                    logger.debug('Cancelling upload...')
-                    break
-                msg = 'Uploading preset {:d}...'.format(i)
-                logger.debug(msg)
-                fraction = (i + 1) / connector.MAX_PRESETS
-                GLib.idle_add(self.transfer_dialog.set_status, msg, fraction)
-                self.connector.tx_message(self.sysex_presets[i])
+            failed = verifier.upload(self.connector, self.sysex_presets, slots,
+                                     self.config[utils.VERIFY_ON],
+                                     progress=self.set_uploading_status,
+                                     running=lambda: self.transfer_dialog.running,
+                                     written=written)
         except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
-        GLib.idle_add(self.end_upload)
-
-    def end_upload(self):
-        self.thread.join()
-        logger.debug('Thread finished')
+            error = e
+        # Slots edited while the upload was running still differ from the device
+        edited = [s for s in written if self.sysex_presets.get_version(s) != versions[s]]
+        return written, failed, edited, error
+
+    def write_presets(self):
+        """Write the changed presets, reordered ones included, in one transfer."""
+        if self.transferring.locked() or not self.modified_presets:
+            return
+        slots = sorted(self.modified_presets)
+        dialog = Gtk.MessageDialog(self.main_window,
+                                   flags=Gtk.DialogFlags.MODAL,
+                                   type=Gtk.MessageType.QUESTION,
+                                   buttons=Gtk.ButtonsType.OK_CANCEL,
+                                   message_format=WRITE_PRESETS)
+        dialog.format_secondary_text(
+            WRITE_PRESETS_DESC.format(', '.join([str(i) for i in slots])))
+        response = dialog.run()
+        dialog.destroy()
+        if response == Gtk.ResponseType.OK:
+            self.upload_presets(slots)
+
+    def set_uploading_status(self, id, i, total):
+        msg = 'Uploading preset {:d}...'.format(id)
+        logger.debug(msg)
+        self.transfer_channel.set_status(msg, (i + 1) / total)
+
+    def end_upload(self, result):
+        written, failed, edited, error = result
+        self.transfer_channel.stop()
+        logger.debug('Upload finished')
+        self.modified_presets.difference_update(written)
+        self.modified_presets.update(failed)
+        self.modified_presets.update(edited)
         self.transferring.release()
         self.transfer_dialog.hide()
+        if error:
+            self.connector_error(error)
+        elif failed:
+            self.show_unverified_presets(failed)
 
     def set_status_msg(self, msg):
         logger.info(msg)
@@ -633,49 +959,61 @@ class Editor(object):
         filename = dialog.get_filename()
         dialog.destroy()
         if response == Gtk.ResponseType.OK:
-            self.transfer_dialog.show_pulse('Sending bank')
-            GLib.timeout_add(50, self.transfer_dialog.pulse_progressbar)
-            self.thread = Thread(
-                target=self.set_bank_from_file, args=(filename,))
-            self.thread.start()
-
-    def set_bank_from_file(self, filename):
-        try:
-            self.connector.set_bank_from_file(filename)
-            self.cancel_and_hide_transfer()
-            GLib.idle_add(self.download_presets)
-        except (ValueError) as e:
-            self.cancel_and_hide_transfer()
+            self.send_bank_file(filename)
+
+    def send_bank_file(self, filename):
+        if self.transferring.locked() or not self.connector.connected():
+            return
+        self.transfer_dialog.show_progress('Sending bank')
+        self.transfer_channel.start()
+        self.submit(self.connector.set_bank_from_file, filename,
+                    self.set_sending_status,
+                    callback=lambda r: self.end_set_bank(filename, None),
+                    error_callback=lambda e: self.end_set_bank(filename, e))
+
+    def set_sending_status(self, sent, total):
+        msg = SENDING_MSG.format(sent, total)
+        self.transfer_channel.set_status(msg, sent / total)
+
+    def end_set_bank(self, filename, error):
+        self.transfer_channel.stop()
+        self.cancel_and_hide_transfer()
+        if not error:
+            self.download_presets()
+        elif isinstance(error, ConnectorError):
+            self.connector_error(error)
+        else:
             msg = ERROR_IN_BANK_TRANSFER.format(filename)
-            desc = str(e)
+            desc = str(error)
             GLib.idle_add(self.show_error_dialog, msg, desc)
-        except ConnectorError as e:
-            self.cancel_and_hide_transfer()
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
 
     def save_bank_to_file(self):
         type = 'bulk' if self.config[utils.BULK_ON] else 'bank'
         title = 'Receiving {:s}'.format(type)
-        self.transfer_dialog.show_pulse(title)
-        GLib.timeout_add(50, self.transfer_dialog.pulse_progressbar)
-        self.thread = Thread(target=self.get_bank_and_save)
-        self.thread.start()
-
-    def get_bank_and_save(self):
-        try:
-            if self.config[utils.BULK_ON]:
-                data = self.connector.get_bulk()
-                def_filename = 'bulk.' + preset.FILE_EXTENSION
-            else:
-                data = self.connector.get_bank()
-                def_filename = 'bank.' + preset.FILE_EXTENSION
-            self.cancel_and_hide_transfer()
-            GLib.idle_add(self.ask_filename_and_save, def_filename, data)
-        except ConnectorError as e:
-            self.cancel_and_hide_transfer()
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
+        self.transfer_dialog.show_progress(title)
+        self.transfer_channel.start()
+        if self.config[utils.BULK_ON]:
+            function = self.connector.get_bulk
+        else:
+            function = self.connector.get_bank
+        def_filename = type + '.' + preset.FILE_EXTENSION
+        self.submit(function, self.set_receiving_status,
+                    callback=lambda data: self.end_get_bank(def_filename, data),
+                    error_callback=self.end_get_bank_error)
+
+    def set_receiving_status(self, received, expected):
+        msg = RECEIVING_MSG.format(received, expected)
+        self.transfer_channel.set_status(msg, received / expected)
+
+    def end_get_bank(self, def_filename, data):
+        self.transfer_channel.stop()
+        self.cancel_and_hide_transfer()
+        self.ask_filename_and_save(def_filename, data)
+
+    def end_get_bank_error(self, error):
+        self.transfer_channel.stop()
+        self.cancel_and_hide_transfer()
+        self.connector_error(error)
 
     def ask_filename_and_save(self, def_filename, data):
         dialog = Gtk.FileChooserDialog('Save as', self.main_window,
@@ -699,8 +1037,7 @@ class Editor(object):
 
     def cancel_and_hide_transfer(self):
         self.transfer_dialog.cancel()
-        GLib.idle_add(self.transfer_dialog.hide)
-        GLib.idle_add(self.thread.join)
+        self.transfer_dialog.hide()
 
     def show_error_dialog(self, msg, desc):
         dialog = Gtk.MessageDialog(self.main_window,
@@ -717,11 +1054,75 @@ class Editor(object):
 
     def call_connector(self, method, *args):
         logger.debug('Calling connector {:s}...'.format(str(method)))
-        try:
-            method(*args)
-        except ConnectorError as e:
-            GLib.idle_add(self.show_error_dialog, str(e), None)
-            self.ui_reconnect()
+        if not self.setting_attributes:
+            self.edit_parameter(method.__name__, *args)
+        name = method.__name__[len(SET_PANEL_PREFIX):]
+        if method.__name__.startswith(SET_PANEL_PREFIX) and name in mirror.SETTERS:
+            self.mirror.set(name, *args)
+        job = self.submit(method, *args)
+        if self.settling:
+            self.selection_jobs.append(job)
+
+    def edit_parameter(self, method_name, value):
+        """Apply a panel parameter change to the selected preset recording it in the history."""
+        setter = PARAMETER_SETTERS.get(method_name[len(SET_PANEL_PREFIX):])
+        model, iter = self.preset_selection.get_selected()
+        if not setter or not iter or self.transferring.locked():
+            return
+        id = model[iter][0]
+        old, new = self.sysex_presets.modify(id, setter, value)
+        if self.history.record(history.PARAMETER, id, old, new, method_name):
+            self.modified_presets.add(id)
+
+    def key_pressed(self, widget, event):
+        if not event.state & Gdk.ModifierType.CONTROL_MASK:
+            return False
+        if isinstance(self.main_window.get_focus(), Gtk.Entry):
+            return False
+        key = Gdk.keyval_to_lower(event.keyval)
+        if key == Gdk.KEY_z and event.state & Gdk.ModifierType.SHIFT_MASK:
+            self.redo()
+        elif key == Gdk.KEY_z:
+            self.undo()
+        elif key == Gdk.KEY_y:
+            self.redo()
+        else:
+            return False
+        return True
+
+    def undo(self):
+        if not self.transferring.locked():
+            self.apply_step(self.history.undo(self.sysex_presets))
+
+    def redo(self):
+        if not self.transferring.locked():
+            self.apply_step(self.history.redo(self.sysex_presets))
+
+    def apply_step(self, step):
+        """Refresh the UI after an undo or redo resending only what the step changed."""
+        if step == None:
+            return
+        model, iter = self.preset_selection.get_selected()
+        selected = model[iter][0] if iter else None
+        if step.kind == history.REORDER:
+            self.modified_presets.update(history.get_moved(step.order))
+            if selected != None:
+                self.set_preset_attributes(selected)
+            return
+        id = step.slot
+        sysex_preset = self.sysex_presets[id]
+        self.modified_presets.add(id)
+        if id != selected:
+            return
+        # Widgets only emit their signals and send their CCs when their values change
+        self.set_preset_attributes(id)
+        if step.kind == history.NAME:
+            self.mirror.set_name(preset.get_name(sysex_preset))
+            self.submit(self.connector.set_panel_name,
+                        preset.get_name(sysex_preset))
+        elif step.kind == history.OVERRIDE:
+            self.mirror.invalidate()
+            self.submit(self.connector.tx_message, sysex_preset)
 
     def show_about(self):
         self.about_dialog.run()
@@ -736,7 +1137,40 @@ class Editor(object):
         self.config[utils.DEVICE] = device
         self.ui_reconnect()
 
+    def set_prefetcher(self):
+        enabled = self.config[utils.PREFETCH_ON] and self.connector.connected()
+        if enabled and not self.prefetcher.running:
+            self.prefetcher.start()
+        elif not enabled and self.prefetcher.running:
+            self.prefetcher.stop()
+
+    def update_prefetched_preset(self, id, data):
+        # Local edits not yet uploaded take precedence over the device data
+        if self.transferring.locked() or id in self.modified_presets or id >= len(self.sysex_presets):
+            return
+        if self.sysex_presets[id] != bytes(data):
+            logger.debug('Preset {:d} changed in the device'.format(id))
+            self.history.forget(id)
+            self.sysex_presets[id] = data
+            model, iter = self.preset_selection.get_selected()
+            if iter and model[iter][0] == id:
+                self.set_preset_attributes(id)
+
+    def preset_changed(self, slot):
+        # Presets written by transfers reach the list through the transfer channel
+        if current_thread() != main_thread():
+            return
+        slots = range(len(self.presets)) if slot == None else [slot]
+        for i in slots:
+            if i < len(self.presets) and i < len(self.sysex_presets):
+                self.presets[i][1] = preset.get_name(self.sysex_presets[i])
+
     def connect_callback(self, message):
+        # Called from the worker thread while receiving
+        self.mirror.update(message)
+        self.worker.deliver(self.process_message, message)
+
+    def process_message(self, message):
         self.call_connector(self.connector.set_lfo_midi_sync, 1 if self.config[utils.LFO_MIDI_SYNC] else 0)
         if message.type == 'program_change':
             program = message.program
@@ -755,11 +1189,30 @@ class Editor(object):
 
     def quit(self):
         logger.debug('Quitting...')
-        self.connector.disconnect()
+        self.prefetcher.stop()
+        # Pending calls run and the port is closed from the worker thread
+        self.worker.stop(True, self.connector.disconnect)
+        self.connector.stop_recording()
+        if trace_file:
+            trace.stop(trace_file)
+        if self.profiler:
+            filename = self.profiler.stop(utils.CONFIG_DIR)
+            logger.info('Profile summary written to {:s}'.format(filename))
         self.main_window.hide()
         Gtk.main_quit()
 
     def main(self):
+        if record_file:
+            self.connector.start_recording(record_file)
+        if trace_file:
+            trace.start()
+        if profile:
+            self.profiler = profiler.Profiler()
+            # Handlers look the methods up when called so they get the timed ones
+            self.profiler.instrument(self.connector, 'connector')
+            self.profiler.instrument(self, 'editor')
+            self.profiler.start()
+        self.worker.start()
         self.init_ui()
         self.set_ui_config()
         Gtk.main()
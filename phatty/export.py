@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty columnar export"""
+
+from phatty import archive
+from phatty import batch
+from phatty import formats
+from phatty import preset
+import csv
+import logging
+import numpy
+import os
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4096
+CSV = 'csv'
+PARQUET = 'parquet'
+ARROW = 'arrow'
+FORMATS = {'.csv': CSV, '.parquet': PARQUET,
+           '.arrow': ARROW, '.feather': ARROW}
+FILE = 'file'
+POSITION = 'position'
+NAME = 'name'
+PARAMETERS = [a[preset.ACCESSOR_NAME] for a in preset.ACCESSORS]
+COLUMNS = [FILE, POSITION, NAME] + PARAMETERS
+
+
+class Chunk(object):
+    """Column buffers for up to size presets"""
+
+    def __init__(self, size=CHUNK_SIZE):
+        self.files = []
+        self.positions = numpy.empty(size, dtype=numpy.uint32)
+        self.names = []
+        self.parameters = numpy.empty(
+            (size, len(PARAMETERS)), dtype=numpy.uint16)
+
+    def __len__(self):
+        return len(self.names)
+
+    def is_full(self):
+        return len(self) == len(self.positions)
+
+    def append(self, filename, position, data):
+        i = len(self)
+        self.files.append(filename)
+        self.positions[i] = position
+        self.names.append(preset.get_name(data).strip())
+        for j, accessor in enumerate(preset.ACCESSORS):
+            self.parameters[i, j] = accessor[preset.ACCESSOR_GETTER](data)
+
+    def get_columns(self):
+        """Return the column arrays in COLUMNS order."""
+        n = len(self)
+        columns = [self.files, self.positions[:n], self.names]
+        columns.extend(self.parameters[:n].T)
+        return columns
+
+
+def get_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in archive.find_files(path):
+                yield filename
+        else:
+            yield path
+
+
+def get_presets(paths):
+    """Yield the (filename, position, data) of every preset in the files and directories, one file at a time."""
+    for filename in get_files(paths):
+        for position, data in enumerate(batch.read_messages(filename)):
+            kind = formats.get_kind(data)
+            if kind == formats.PRESET or kind == formats.PANEL:
+                yield filename, position, data
+            elif kind != None:
+                logger.debug('Skipping packed {:s} in {:s}...'.format(
+                    kind, filename))
+
+
+def get_chunks(presets, size=CHUNK_SIZE):
+    """Group the presets into chunks. Only one chunk is alive at any time."""
+    chunk = Chunk(size)
+    for filename, position, data in presets:
+        chunk.append(filename, position, data)
+        if chunk.is_full():
+            yield chunk
+            chunk = Chunk(size)
+    if len(chunk):
+        yield chunk
+
+
+def get_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError('Unknown export format {:s}'.format(extension))
+    return FORMATS[extension]
+
+
+def write_csv(chunks, filename):
+    with open(filename, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(COLUMNS)
+        rows = 0
+        for chunk in chunks:
+            writer.writerows(zip(*chunk.get_columns()))
+            rows += len(chunk)
+    return rows
+
+
+def get_schema():
+    fields = [pyarrow.field(FILE, pyarrow.string()),
+              pyarrow.field(POSITION, pyarrow.uint32()),
+              pyarrow.field(NAME, pyarrow.string())]
+    fields.extend([pyarrow.field(p, pyarrow.uint16()) for p in PARAMETERS])
+    return pyarrow.schema(fields)
+
+
+def write_arrow(chunks, filename, format):
+    if pyarrow == None:
+        raise ValueError('pyarrow is required to export to {:s}'.format(format))
+    schema = get_schema()
+    if format == PARQUET:
+        writer = pyarrow.parquet.ParquetWriter(filename, schema)
+    else:
+        writer = pyarrow.ipc.new_file(filename, schema)
+    rows = 0
+    try:
+        for chunk in chunks:
+            arrays = [pyarrow.array(c, type=f.type)
+                      for c, f in zip(chunk.get_columns(), schema)]
+            record_batch = pyarrow.RecordBatch.from_arrays(
+                arrays, schema=schema)
+            if format == PARQUET:
+                writer.write_table(pyarrow.Table.from_batches([record_batch]))
+            else:
+                writer.write_batch(record_batch)
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+def export(paths, filename, format=None, chunk_size=CHUNK_SIZE):
+    """Write the decoded parameters of every preset in the files and directories to a columnar file.
+
+    The format is taken from the extension unless given. Return the amount of presets written."""
+    if format == None:
+        format = get_format(filename)
+    logger.debug('Exporting to {:s} {:s}...'.format(format, filename))
+    chunks = get_chunks(get_presets(paths), chunk_size)
+    if format == CSV:
+        return write_csv(chunks, filename)
+    return write_arrow(chunks, filename, format)
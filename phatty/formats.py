@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty sysex formats"""
+
+from phatty import preset
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRESET = 'preset'
+PANEL = 'panel'
+BANK = 'bank'
+BULK = 'bulk'
+PANEL_DUMP = [4, 5, 4, 3]
+PRESET_DUMP = [4, 5, 4, 4]
+PANEL_STORE = [4, 5, 5, 3]
+PRESET_STORE = [4, 5, 5, 4]
+BANK_START = [4, 5, 1, 3]
+BULK_START = [4, 5, 3, 1]
+HEADER_LEN = len(BANK_START)
+VARIANT_BYTE = 4
+PRESET_SIZE = 191
+RED_BANK_SIZE = 17142
+BANK_SIZE = RED_BANK_SIZE + 202
+RED_BULK_SIZE = RED_BANK_SIZE + 133
+BULK_SIZE = RED_BULK_SIZE + 202
+BANK_VARIANTS = {0: 'I', 1: 'II', 2: 'White'}
+BULK_VARIANTS = {1: 'II'}
+
+
+class Sysex(object):
+    """Phatty sysex message"""
+
+    kind = None
+    variants = {}
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def variant(self):
+        return self.variants.get(self.data[VARIANT_BYTE])
+
+
+class Preset(Sysex):
+    """Phatty preset"""
+
+    kind = PRESET
+
+    @property
+    def variant(self):
+        return None
+
+    @property
+    def name(self):
+        return preset.get_name(self.data)
+
+    @property
+    def number(self):
+        return preset.get_number(self.data)
+
+
+class Panel(Preset):
+    """Phatty panel"""
+
+    kind = PANEL
+
+
+class Bank(Sysex):
+    """Phatty bank"""
+
+    kind = BANK
+    variants = BANK_VARIANTS
+
+
+class Bulk(Sysex):
+    """Phatty bulk"""
+
+    kind = BULK
+    variants = BULK_VARIANTS
+
+
+REGISTRY = {}
+
+
+def register(header, sizes, cls):
+    for size in sizes:
+        REGISTRY[(tuple(header), size)] = cls
+
+
+register(PANEL_DUMP, [PRESET_SIZE], Panel)
+register(PANEL_STORE, [PRESET_SIZE], Preset)
+register(PRESET_DUMP, [PRESET_SIZE], Preset)
+register(PRESET_STORE, [PRESET_SIZE], Preset)
+register(BANK_START, [RED_BANK_SIZE, BANK_SIZE], Bank)
+register(BULK_START, [RED_BULK_SIZE, BULK_SIZE], Bulk)
+
+
+def identify(data):
+    """Return the typed object for the given sysex payload or None if the format is unknown."""
+    cls = REGISTRY.get((tuple(data[0:HEADER_LEN]), len(data)))
+    if cls == None:
+        logger.debug('Unknown format of {:d}B'.format(len(data)))
+        return None
+    return cls(data)
+
+
+def get_kind(data):
+    sysex = identify(data)
+    return sysex.kind if sysex else None
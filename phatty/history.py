@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty edit history"""
+
+from phatty import diff
+from phatty import preset
+from collections import deque
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PARAMETER = 'parameter'
+NAME = 'name'
+OVERRIDE = 'override'
+REORDER = 'reorder'
+MAX_STEPS = 1000
+# Consecutive edits of a parameter closer than this are merged, like a slider drag
+MERGE_TIME = 1
+
+
+class Change(object):
+    """Bytes changed in a preset. Offsets and values take a byte each."""
+
+    __slots__ = ('slot', 'offsets', 'old', 'new')
+
+    def __init__(self, slot, offsets, old, new):
+        self.slot = slot
+        self.offsets = offsets
+        self.old = old
+        self.new = new
+
+    def apply(self, presets, values):
+        # Presets are replaced rather than modified as they may be shared
+        p = bytearray(presets[self.slot])
+        for offset, value in zip(self.offsets, values):
+            p[offset] = value
+        presets[self.slot] = p
+
+
+class Step(object):
+    """Undoable operation"""
+
+    __slots__ = ('kind', 'change', 'order', 'parameter', 'timestamp')
+
+    def __init__(self, kind, change=None, order=None, parameter=None):
+        self.kind = kind
+        self.change = change
+        self.order = order
+        self.parameter = parameter
+        self.timestamp = time.monotonic()
+
+    @property
+    def slot(self):
+        return self.change.slot if self.change else None
+
+
+def get_change(slot, old, new):
+    """Return the Change between two versions of a preset or None if they are equal."""
+    length = min(len(old), len(new))
+    offsets = [i for i in diff.get_changed_bytes(old, new, 0) if i < length]
+    if not offsets:
+        return None
+    return Change(slot, bytes(offsets), bytes([old[i] for i in offsets]),
+                  bytes([new[i] for i in offsets]))
+
+
+def merge(first, second):
+    """Return a Change equivalent to applying first and then second."""
+    old = dict(zip(second.offsets, second.old))
+    old.update(zip(first.offsets, first.old))
+    new = dict(zip(first.offsets, first.new))
+    new.update(zip(second.offsets, second.new))
+    offsets = sorted(old)
+    return Change(first.slot, bytes(offsets), bytes([old[i] for i in offsets]),
+                  bytes([new[i] for i in offsets]))
+
+
+def reorder(presets, order):
+    """Move the preset at order[i] to slot i renumbering every preset."""
+    reordered = []
+    for i, j in enumerate(order):
+        p = bytearray(presets[j])
+        preset.set_number(p, i)
+        reordered.append(p)
+    presets[:] = reordered
+
+
+def get_moved(order):
+    """Return the slots whose preset changes with a reordering."""
+    return [i for i, j in enumerate(order) if i != j]
+
+
+def get_inverse(order):
+    inverse = bytearray(len(order))
+    for i, j in enumerate(order):
+        inverse[j] = i
+    return bytes(inverse)
+
+
+class History(object):
+    """Undo and redo journal for preset edits storing only the changed bytes"""
+
+    def __init__(self, max_steps=MAX_STEPS):
+        self.undo_steps = deque(maxlen=max_steps)
+        self.redo_steps = []
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps = []
+
+    def can_undo(self):
+        return len(self.undo_steps) > 0
+
+    def can_redo(self):
+        return len(self.redo_steps) > 0
+
+    def record(self, kind, slot, old, new, parameter=None):
+        """Record the change of a preset from old to new. old is usually a copy taken before editing."""
+        change = get_change(slot, old, new)
+        if change == None:
+            return None
+        self.redo_steps = []
+        last = self.undo_steps[-1] if self.undo_steps else None
+        if kind == PARAMETER and parameter != None and last and last.kind == PARAMETER \
+                and last.slot == slot and last.parameter == parameter \
+                and time.monotonic() - last.timestamp < MERGE_TIME:
+            last.change = merge(last.change, change)
+            last.timestamp = time.monotonic()
+            return last
+        step = Step(kind, change=change, parameter=parameter)
+        self.undo_steps.append(step)
+        return step
+
+    def forget(self, slot):
+        """Drop the steps of a preset whose content was replaced, e.g. by the device copy."""
+        self.redo_steps = []
+        steps = []
+        for step in reversed(self.undo_steps):
+            if step.order:
+                # Before the reordering the preset was in another slot
+                slot = step.order[slot]
+            elif step.slot == slot:
+                continue
+            steps.append(step)
+        self.undo_steps = deque(reversed(steps), maxlen=self.undo_steps.maxlen)
+
+    def record_order(self, order):
+        """Record a reordering where the preset at order[i] moved to slot i."""
+        if list(order) == list(range(len(order))):
+            return None
+        self.redo_steps = []
+        step = Step(REORDER, order=bytes(order))
+        self.undo_steps.append(step)
+        return step
+
+    def undo(self, presets):
+        """Revert the last step on the given presets and return it or None if there is nothing to undo."""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        if step.order:
+            reorder(presets, get_inverse(step.order))
+        else:
+            step.change.apply(presets, step.change.old)
+        self.redo_steps.append(step)
+        logger.debug('Undoing {:s}...'.format(step.kind))
+        return step
+
+    def redo(self, presets):
+        """Apply again the last undone step and return it or None if there is nothing to redo."""
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        if step.order:
+            reorder(presets, step.order)
+        else:
+            step.change.apply(presets, step.change.new)
+        self.undo_steps.append(step)
+        logger.debug('Redoing {:s}...'.format(step.kind))
+        return step
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset matrix
+
+Edits many presets at once as the rows of a NumPy byte matrix."""
+
+from phatty import formats
+from phatty import preset
+import numpy
+
+BITFIELD_PARAMETERS = {
+    'filter_poles': [preset.FILTER_POLES_PARAMETERS],
+    'vel_to_filter': [preset.VEL_TO_FILTER_PARAMETERS_1, preset.VEL_TO_FILTER_PARAMETERS_2],
+    'vel_to_amp': [preset.VEL_TO_AMP_PARAMETERS_1, preset.VEL_TO_AMP_PARAMETERS_2],
+    'release': [preset.RELEASE_PARAMETERS],
+    'scale': [preset.SCALE_PARAMETERS_1, preset.SCALE_PARAMETERS_2],
+    'pw_up_amount': [preset.PW_UP_PARAMETERS],
+    'pw_down_amount': [preset.PW_DOWN_PARAMETERS],
+    'legato': [preset.LEGATO_PARAMETERS_1, preset.LEGATO_PARAMETERS_2],
+    'keyboard_priority': [preset.KEYBOARD_PRIORITY_PARAMETERS],
+    'glide_on_legato': [preset.GLIDE_ON_LEGATO_PARAMETERS],
+    'mod_source_5': [preset.MOD_SOURCE_5_PARAMETERS],
+    'mod_source_6': [preset.MOD_SOURCE_6_PARAMETERS],
+    'mod_dest_2': [preset.MOD_DEST_2_PARAMETERS],
+    'lfo_key_retrigger': [preset.LFO_RETRIGGER_PARAMETERS],
+    'arp_pattern': [preset.ARP_PATTERN_PARAMETERS_1, preset.ARP_PATTERN_PARAMETERS_2],
+    'arp_mode': [preset.ARP_MODE_PARAMETERS],
+    'arp_octaves': [preset.ARP_OCTAVES_PARAMETERS],
+    'arp_gate': [preset.ARP_GATE_PARAMETERS],
+    'arp_clock_source': [preset.ARP_CLOCK_SOURCE_PARAMETERS],
+    'arp_clock_division': [preset.ARP_CLOCK_DIVISION_PARAMETERS],
+}
+TWELVE_BIT_PARAMETERS = {
+    'filter_cutoff': preset.FILTER_CUTOFF_START_BYTE,
+    'filter_attack': preset.FILTER_ATTACK_START_BYTE,
+}
+# Masks of the three bytes holding a 12-bit value and the shifts that place each part
+TWELVE_BIT_MASKS = [(0x3, 10), (0x3f, 4), (0xf, 0)]
+
+
+def get_tables():
+    tables = {}
+    for parameters in BITFIELD_PARAMETERS.values():
+        for p in parameters:
+            tables[id(p)] = numpy.array(
+                p[preset.PARAMETER_VALUES], dtype=numpy.uint8)
+    return tables
+
+
+TABLES = get_tables()
+
+
+def get_matrix(presets):
+    """Return a writable matrix with a row per preset."""
+    if not presets:
+        return numpy.empty((0, formats.PRESET_SIZE), dtype=numpy.uint8)
+    data = b''.join([bytes(p) for p in presets])
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(len(presets), -1).copy()
+
+
+def get_presets(matrix):
+    """Return the rows as presets ready to be written or uploaded."""
+    return [bytearray(row.tobytes()) for row in matrix]
+
+
+def set_bitfield(matrix, rows, parameters, values):
+    encoded = TABLES[id(parameters)][values]
+    databyte = parameters[preset.PARAMETER_DATABYTE]
+    bitmask = parameters[preset.PARAMETER_BITMASK]
+    bitshift = parameters[preset.PARAMETER_BITSHIFT]
+    column = matrix[rows, databyte]
+    matrix[rows, databyte] = (column & numpy.uint8(~bitmask & 0xff)) | (
+        (encoded << bitshift) & bitmask)
+
+
+def set_12b_value(matrix, rows, start, values):
+    v = ~(numpy.asarray(values, dtype=numpy.int32) & 0xfff)
+    for i, (mask, shift) in enumerate(TWELVE_BIT_MASKS):
+        column = matrix[rows, start + i]
+        matrix[rows, start + i] = (column & numpy.uint8(~mask & 0xff)) | (
+            (v >> shift) & mask).astype(numpy.uint8)
+
+
+def set_values(matrix, name, values, rows=None):
+    """Set a parameter in every row, or in the given rows, to a single value or to one value per row.
+
+    The result is the same as calling the preset setter on every row."""
+    if rows is None:
+        rows = slice(None)
+    values = numpy.asarray(values, dtype=numpy.intp)
+    if name in TWELVE_BIT_PARAMETERS:
+        set_12b_value(matrix, rows, TWELVE_BIT_PARAMETERS[name], values)
+        return
+    for parameters in BITFIELD_PARAMETERS[name]:
+        set_bitfield(matrix, rows, parameters, values)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty panel mirror"""
+
+from phatty import connector
+from phatty import preset
+from bisect import bisect_right
+from threading import Lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+SETTERS = dict([(a[preset.ACCESSOR_NAME], a[preset.ACCESSOR_SETTER])
+                for a in preset.ACCESSORS])
+
+
+def get_inverse_controllers():
+    controllers = {}
+    for name, (control, values) in connector.PANEL_CONTROLLERS.items():
+        controllers[control] = (name, values)
+    return controllers
+
+
+INVERSE_CONTROLLERS = get_inverse_controllers()
+INVERSE_CONTINUOUS_CONTROLLERS = dict(
+    [(c, n) for n, c in connector.CONTINUOUS_CONTROLLERS.items()])
+
+
+def get_index(values, value):
+    """Return the index of the controller value table entry that covers the value."""
+    # Tables are sorted and a knob may send any value between two entries
+    return max(0, bisect_right(values, value) - 1)
+
+
+class PanelMirror(object):
+    """Copy of the panel kept up to date with the controllers sent and received.
+
+    It is seeded with a panel dump and discarded whenever the panel may have
+    changed in a way it does not model."""
+
+    def __init__(self):
+        self.panel = None
+        self.msb = {}
+        self.lock = Lock()
+
+    def is_valid(self):
+        return self.panel != None
+
+    def seed(self, panel):
+        with self.lock:
+            self.panel = bytearray(panel)
+            self.msb.clear()
+
+    def invalidate(self):
+        with self.lock:
+            self.panel = None
+            self.msb.clear()
+
+    def get_panel_as_preset(self, num):
+        """Return the panel as a preset to store in num or None if there is no valid panel."""
+        with self.lock:
+            if self.panel == None:
+                return None
+            data = bytearray(self.panel)
+        data[2] = 0x5
+        data[4] = num
+        return data
+
+    def set(self, name, value):
+        with self.lock:
+            if self.panel != None:
+                SETTERS[name](self.panel, value)
+
+    def set_name(self, name):
+        with self.lock:
+            if self.panel != None:
+                preset.set_name(self.panel, name)
+
+    def update(self, message):
+        """Apply a message received from the Phatty."""
+        if message.type == 'program_change':
+            logger.debug('Panel changed by program change')
+            self.invalidate()
+        elif message.type == 'control_change':
+            self.update_controller(message.control, message.value)
+
+    def update_controller(self, control, value):
+        if control in INVERSE_CONTROLLERS:
+            name, values = INVERSE_CONTROLLERS[control]
+            self.set(name, get_index(values, value))
+        elif control in INVERSE_CONTINUOUS_CONTROLLERS:
+            name = INVERSE_CONTINUOUS_CONTROLLERS[control]
+            with self.lock:
+                self.msb[control] = value
+            self.set(name, value << 5)
+        elif control - connector.LSB_CONTROLLER_OFFSET in INVERSE_CONTINUOUS_CONTROLLERS:
+            control -= connector.LSB_CONTROLLER_OFFSET
+            name = INVERSE_CONTINUOUS_CONTROLLERS[control]
+            with self.lock:
+                msb = self.msb.get(control)
+            if msb != None:
+                self.set(name, ((msb << 7) | value) >> 2)
+        else:
+            logger.debug('Panel changed by unknown controller {:d}'.format(control))
+            self.invalidate()
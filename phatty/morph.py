@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset morphing"""
+
+from phatty import connector
+from phatty import preset
+from collections import namedtuple
+from threading import Thread, Lock
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+RATE = 100
+# Sleeping is not precise enough for the last part of the wait
+SPIN_TIME = 0.002
+
+Stats = namedtuple('Stats', ['frames', 'dropped', 'mean_jitter', 'max_jitter'])
+
+
+def get_parameters(a, b):
+    """Return the (name, getter, a value, b value) tuples of the parameters that differ between two presets."""
+    parameters = []
+    for accessor in preset.ACCESSORS:
+        name = accessor[preset.ACCESSOR_NAME]
+        if name not in connector.PANEL_CONTROLLERS and name not in connector.CONTINUOUS_CONTROLLERS:
+            continue
+        getter = accessor[preset.ACCESSOR_GETTER]
+        start = getter(a)
+        end = getter(b)
+        if start != end:
+            parameters.append((name, start, end))
+    return parameters
+
+
+def get_messages(name, value):
+    if name in connector.CONTINUOUS_CONTROLLERS:
+        return connector.get_continuous_controllers(name, value)
+    return [connector.get_panel_controller(name, value)]
+
+
+class Morph(object):
+    """Interpolation between the parameters of two presets"""
+
+    def __init__(self, a, b):
+        self.parameters = get_parameters(a, b)
+        self.last = {}
+
+    def get_values(self, t):
+        values = {}
+        for name, start, end in self.parameters:
+            values[name] = int(round(start + (end - start) * t))
+        return values
+
+    def get_frame(self, t):
+        """Return the messages for the parameters that changed since the previous frame."""
+        messages = []
+        for name, value in self.get_values(t).items():
+            if self.last.get(name) != value:
+                self.last[name] = value
+                messages.extend(get_messages(name, value))
+        return messages
+
+
+def call(function, *args):
+    return function(*args)
+
+
+class Morpher(object):
+    """Streams a morph as CCs at a steady rate.
+
+    Frames are computed for the time they are sent so the ones that could
+    not be sent on time are dropped instead of being sent late. The timing
+    thread never sends by itself. Every frame is handed to submit, usually
+    the worker that owns the connector, and while a frame is still queued
+    the next ones only move its time forward."""
+
+    def __init__(self, send, rate=RATE, clock=time.perf_counter, sleep=time.sleep,
+                 submit=call):
+        self.send = send
+        self.submit = submit
+        self.period = 1 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.running = False
+        self.thread = None
+        self.lock = Lock()
+        self.position = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.dropped = 0
+        self.ticks = 0
+        self.jitter_sum = 0
+        self.jitter_max = 0
+
+    def get_stats(self):
+        mean = self.jitter_sum / self.ticks if self.ticks else 0
+        return Stats(self.frames, self.dropped, mean, self.jitter_max)
+
+    def start(self, a, b, duration):
+        self.stop()
+        self.running = True
+        self.thread = Thread(target=self.run, args=(Morph(a, b), duration),
+                             daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def wait(self, deadline):
+        while True:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return
+            if remaining > SPIN_TIME:
+                self.sleep(remaining - SPIN_TIME)
+            else:
+                self.sleep(0)
+
+    def run(self, morph, duration):
+        self.reset_stats()
+        with self.lock:
+            self.position = None
+        frames = max(1, int(math.ceil(duration / self.period)))
+        start = self.clock()
+        i = 0
+        while self.running and i <= frames:
+            deadline = start + i * self.period
+            self.wait(deadline)
+            now = self.clock()
+            late = now - deadline
+            if late >= self.period and i < frames:
+                skipped = min(int(late / self.period), frames - i)
+                logger.debug('Dropping {:d} frames...'.format(skipped))
+                self.dropped += skipped
+                i += skipped
+                continue
+            with self.lock:
+                pending = self.position != None
+                self.position = i / frames
+            if pending:
+                logger.debug('Previous frame still queued. Replacing it...')
+                self.dropped += 1
+            else:
+                self.submit(self.step, morph)
+            self.ticks += 1
+            self.jitter_sum += late
+            self.jitter_max = max(self.jitter_max, late)
+            i += 1
+        stats = self.get_stats()
+        logger.debug('Morph finished. {:d} frames sent, {:d} dropped, {:.3f} ms mean jitter'.format(
+            stats.frames, stats.dropped, stats.mean_jitter * 1000))
+        self.running = False
+
+    def step(self, morph):
+        """Send the frame for the latest position."""
+        with self.lock:
+            t = self.position
+            self.position = None
+        # A step left queued by a previous morph has nothing to send
+        if t == None:
+            return
+        try:
+            self.send(morph.get_frame(t))
+        except IOError as e:
+            logger.error('Error while morphing: {:s}'.format(str(e)))
+            self.running = False
+            return
+        self.frames += 1
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset pack
+
+Archive container that stores sysex payloads with 8 data bits per byte.
+Payloads are grouped in blocks that are compressed independently, so any
+payload can be read by decompressing only its block. The index with the
+names and the location of every payload is at the end of the file.
+
+    header | block ... | index
+"""
+
+from phatty import formats
+from phatty import preset
+from phatty import transport
+from collections import namedtuple
+import logging
+import numpy
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PHTYPACK'
+VERSION = 1
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+BLOCK_SIZE = 64
+# Magic, version, compression, entries, blocks and index offset
+HEADER = struct.Struct('<8sBBIIQ')
+# Name, payload length, block and offset in the uncompressed block
+ENTRY = struct.Struct('<{:d}sHII'.format(preset.NAME_LEN))
+# Offset and length of a compressed block
+BLOCK = struct.Struct('<QI')
+INVALID_PACK = 'Not a preset pack'
+UNSUPPORTED_COMPRESSION = 'Unsupported compression {:d}'
+
+Entry = namedtuple('Entry', ['name', 'length', 'block', 'offset'])
+
+
+def pack_7bit(data):
+    """Return the 7-bit bytes in data packed into 8-bit bytes."""
+    transport.check_data(data)
+    array = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(-1, 1)
+    bits = numpy.unpackbits(array, axis=1)[:, 1:]
+    return numpy.packbits(bits.reshape(-1)).tobytes()
+
+
+def unpack_7bit(data, length):
+    bits = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))
+    bits = bits[:length * 7].reshape(length, 7)
+    high = numpy.zeros((length, 1), dtype=numpy.uint8)
+    return bytearray(numpy.packbits(numpy.hstack((high, bits)), axis=1).tobytes())
+
+
+def get_packed_length(length):
+    return (length * 7 + 7) // 8
+
+
+def compress(data, compression):
+    if compression == ZLIB:
+        return zlib.compress(data)
+    if compression == ZSTD and zstandard:
+        return zstandard.ZstdCompressor().compress(data)
+    if compression == NONE:
+        return data
+    raise ValueError(UNSUPPORTED_COMPRESSION.format(compression))
+
+
+def decompress(data, compression):
+    if compression == ZLIB:
+        return zlib.decompress(data)
+    if compression == ZSTD and zstandard:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == NONE:
+        return data
+    raise ValueError(UNSUPPORTED_COMPRESSION.format(compression))
+
+
+def get_name(data):
+    kind = formats.get_kind(data)
+    if kind == formats.PRESET or kind == formats.PANEL:
+        return preset.get_name(data)
+    return ''
+
+
+def write(filename, payloads, compression=ZLIB, block_size=BLOCK_SIZE):
+    """Write the sysex payloads into a pack and return how many were written.
+
+    Payloads are consumed one block at a time."""
+    # Fail before creating the file if the compression is not available
+    compress(b'', compression)
+    entries = []
+    blocks = []
+    with open(filename, 'wb') as output_file:
+        output_file.write(HEADER.pack(MAGIC, VERSION, compression, 0, 0, 0))
+        block = bytearray()
+        count = 0
+
+        def flush():
+            data = compress(bytes(block), compression)
+            blocks.append((output_file.tell(), len(data)))
+            output_file.write(data)
+            block.clear()
+
+        for data in payloads:
+            if count == block_size:
+                flush()
+                count = 0
+            entries.append(Entry(get_name(data), len(data),
+                                 len(blocks), len(block)))
+            block.extend(pack_7bit(data))
+            count += 1
+        if count:
+            flush()
+        index_offset = output_file.tell()
+        for e in entries:
+            output_file.write(ENTRY.pack(e.name.encode(), e.length,
+                                         e.block, e.offset))
+        for b in blocks:
+            output_file.write(BLOCK.pack(*b))
+        output_file.seek(0)
+        output_file.write(HEADER.pack(MAGIC, VERSION, compression,
+                                      len(entries), len(blocks), index_offset))
+    logger.debug('{:d} payloads written to {:s}'.format(len(entries), filename))
+    return len(entries)
+
+
+class PackReader(object):
+    """Random access to the payloads of a pack.
+
+    Only the index is read when opening. The last block decompressed is
+    kept as consecutive payloads usually share it."""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        try:
+            self.read_index()
+        except (ValueError, struct.error):
+            self.file.close()
+            raise ValueError(INVALID_PACK)
+        self.block = None
+        self.block_data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for i in range(len(self.entries)):
+            yield self.get(i)
+
+    def close(self):
+        self.file.close()
+
+    def read_index(self):
+        magic, version, self.compression, entries, blocks, index_offset = HEADER.unpack(
+            self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(INVALID_PACK)
+        self.file.seek(index_offset)
+        data = self.file.read(entries * ENTRY.size + blocks * BLOCK.size)
+        self.entries = []
+        for name, length, block, offset in ENTRY.iter_unpack(data[:entries * ENTRY.size]):
+            self.entries.append(
+                Entry(name.rstrip(b'\0').decode(), length, block, offset))
+        self.blocks = list(BLOCK.iter_unpack(data[entries * ENTRY.size:]))
+
+    def get_names(self):
+        return [e.name for e in self.entries]
+
+    def read_block(self, block):
+        if block != self.block:
+            offset, length = self.blocks[block]
+            self.file.seek(offset)
+            self.block_data = decompress(self.file.read(length), self.compression)
+            self.block = block
+        return self.block_data
+
+    def get(self, i):
+        entry = self.entries[i]
+        data = self.read_block(entry.block)
+        start = entry.offset
+        end = start + get_packed_length(entry.length)
+        return unpack_7bit(data[start:end], entry.length)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset prefetcher"""
+
+from phatty import connector
+from phatty.worker import PRIORITY_LOW
+from collections import OrderedDict
+from threading import Lock
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+NEIGHBOURS = 2
+MAX_ENTRIES = 32
+MAX_AGE = 30
+
+
+class Prefetcher(object):
+    """Refreshes the selected preset and its neighbours in the background"""
+
+    def __init__(self, connector, worker, callback, neighbours=NEIGHBOURS,
+                 max_entries=MAX_ENTRIES, max_age=MAX_AGE):
+        self.connector = connector
+        self.worker = worker
+        self.callback = callback
+        self.neighbours = neighbours
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.freshness = OrderedDict()
+        self.jobs = []
+        self.lock = Lock()
+        self.running = False
+
+    def start(self):
+        logger.debug('Starting prefetcher...')
+        self.running = True
+
+    def stop(self):
+        logger.debug('Stopping prefetcher...')
+        self.running = False
+        self.cancel()
+
+    def cancel(self):
+        for job in self.jobs:
+            job.cancel()
+        self.jobs = []
+
+    def get_targets(self, id):
+        targets = [id]
+        for i in range(1, self.neighbours + 1):
+            targets.extend([id + i, id - i])
+        return [t for t in targets if t >= 0 and t < connector.MAX_PRESETS]
+
+    def select(self, id):
+        """Schedule a refresh around the given preset. Any previous selection still pending is dropped."""
+        self.cancel()
+        with self.lock:
+            targets = [t for t in self.get_targets(id) if not self.is_fresh(t)]
+        for t in targets:
+            job = self.worker.submit(self.fetch, t,
+                                     callback=lambda data, t=t: self.fetched(
+                                         t, data),
+                                     error_callback=self.error,
+                                     priority=PRIORITY_LOW)
+            self.jobs.append(job)
+
+    def is_fresh(self, id):
+        timestamp = self.freshness.get(id)
+        return timestamp != None and time.monotonic() - timestamp < self.max_age
+
+    def touch(self, id):
+        self.freshness[id] = time.monotonic()
+        self.freshness.move_to_end(id)
+        while len(self.freshness) > self.max_entries:
+            self.freshness.popitem(last=False)
+
+    def invalidate(self, id=None):
+        with self.lock:
+            if id == None:
+                self.freshness.clear()
+            else:
+                self.freshness.pop(id, None)
+
+    def fetch(self, id):
+        with self.lock:
+            if self.is_fresh(id):
+                return None
+        if not self.connector.connected():
+            return None
+        logger.debug('Prefetching preset {:d}...'.format(id))
+        data = self.connector.get_preset(id)
+        with self.lock:
+            self.touch(id)
+        return data
+
+    def fetched(self, id, data):
+        if data != None and self.running:
+            self.callback(id, data)
+
+    def error(self, e):
+        logger.error('Error while prefetching: {:s}'.format(str(e)))
+        self.cancel()
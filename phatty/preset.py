@@ -21,7 +21,10 @@
 
 ALPHABET = ' ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789abcdefghijklmnopqrstuvwxyz!#$%&()*?@'
 NAME_LEN = 13
+NAME_START_BYTE = 22
+NAME_END_BYTE = NAME_START_BYTE + 3 * int(NAME_LEN / 2) + 2
 PRESET_NUMBER_BYTE = 4
+DATA_START_BYTE = 5
 FILE_EXTENSION = 'syx'
 FILE_EXTENSION_EX = 'sysex'
 PARAMETER_VALUES = 0
@@ -59,7 +62,7 @@ FILTER_ATTACK_START_BYTE = 61
 
 
 def get_char(preset, position):
-    k = (3 * int(position / 2)) + 22
+    k = (3 * int(position / 2)) + NAME_START_BYTE
     if position % 2 == 0:
         index = ((preset[k] & 0x1) << 6) | (preset[k + 1] & 0x3f)
     else:
@@ -76,7 +79,7 @@ def set_char(preset, c, position):
         raise ValueError()
     # Code adapted from
     # https://gitlab.com/jp-ma/phatty-editor/blob/master/libphatty/phatty-fmt.x
-    k = (3 * int(position / 2)) + 22
+    k = (3 * int(position / 2)) + NAME_START_BYTE
     if position % 2 == 0:
         preset[k] &= ~0x1
         preset[k] |= (index >> 6) & 0x01
@@ -320,3 +323,88 @@ def get_12b_bytes(v):
 def get_12b_value(bytes):
     v = (((bytes[0] & 0x3) << 10) | ((bytes[1] & 0x3f) << 4) | (bytes[2] & 0xf))
     return (~v) & 0xfff
+
+
+def set_12b_value(preset, start, value):
+    bytes = get_12b_bytes(value)
+    preset[start] = (preset[start] & ~0x3) | bytes[0]
+    preset[start + 1] = (preset[start + 1] & ~0x3f) | bytes[1]
+    preset[start + 2] = (preset[start + 2] & ~0xf) | bytes[2]
+
+
+def set_filter_cutoff(preset, value):
+    set_12b_value(preset, FILTER_CUTOFF_START_BYTE, value)
+
+
+def get_filter_cutoff(preset):
+    return get_12b_value(preset[FILTER_CUTOFF_START_BYTE:FILTER_CUTOFF_START_BYTE + 3])
+
+
+def set_filter_attack(preset, value):
+    set_12b_value(preset, FILTER_ATTACK_START_BYTE, value)
+
+
+def get_filter_attack(preset):
+    return get_12b_value(preset[FILTER_ATTACK_START_BYTE:FILTER_ATTACK_START_BYTE + 3])
+
+
+def get_bitfield_bytes(*parameters):
+    return [p[PARAMETER_DATABYTE] for p in parameters]
+
+
+def get_12b_value_bytes(start):
+    return [start, start + 1, start + 2]
+
+
+# Decoded parameters as [name, getter, setter, databytes, number of values]
+ACCESSOR_NAME = 0
+ACCESSOR_GETTER = 1
+ACCESSOR_SETTER = 2
+ACCESSOR_BYTES = 3
+ACCESSOR_VALUES = 4
+ACCESSORS = [
+    ['filter_poles', get_filter_poles, set_filter_poles,
+     get_bitfield_bytes(FILTER_POLES_PARAMETERS), 4],
+    ['vel_to_filter', get_vel_to_filter, set_vel_to_filter,
+     get_bitfield_bytes(VEL_TO_FILTER_PARAMETERS_1, VEL_TO_FILTER_PARAMETERS_2), 17],
+    ['vel_to_amp', get_vel_to_amp, set_vel_to_amp,
+     get_bitfield_bytes(VEL_TO_AMP_PARAMETERS_1, VEL_TO_AMP_PARAMETERS_2), 16],
+    ['release', get_release, set_release,
+     get_bitfield_bytes(RELEASE_PARAMETERS), 2],
+    ['scale', get_scale, set_scale,
+     get_bitfield_bytes(SCALE_PARAMETERS_1, SCALE_PARAMETERS_2), 33],
+    ['pw_up_amount', get_pw_up_amount, set_pw_up_amount,
+     get_bitfield_bytes(PW_UP_PARAMETERS), 7],
+    ['pw_down_amount', get_pw_down_amount, set_pw_down_amount,
+     get_bitfield_bytes(PW_DOWN_PARAMETERS), 7],
+    ['legato', get_legato, set_legato,
+     get_bitfield_bytes(LEGATO_PARAMETERS_1, LEGATO_PARAMETERS_2), 3],
+    ['keyboard_priority', get_keyboard_priority, set_keyboard_priority,
+     get_bitfield_bytes(KEYBOARD_PRIORITY_PARAMETERS), 4],
+    ['glide_on_legato', get_glide_on_legato, set_glide_on_legato,
+     get_bitfield_bytes(GLIDE_ON_LEGATO_PARAMETERS), 2],
+    ['mod_source_5', get_mod_source_5, set_mod_source_5,
+     get_bitfield_bytes(MOD_SOURCE_5_PARAMETERS), 2],
+    ['mod_source_6', get_mod_source_6, set_mod_source_6,
+     get_bitfield_bytes(MOD_SOURCE_6_PARAMETERS), 2],
+    ['mod_dest_2', get_mod_dest_2, set_mod_dest_2,
+     get_bitfield_bytes(MOD_DEST_2_PARAMETERS), 5],
+    ['lfo_key_retrigger', get_lfo_key_retrigger, set_lfo_key_retrigger,
+     get_bitfield_bytes(LFO_RETRIGGER_PARAMETERS), 3],
+    ['arp_pattern', get_arp_pattern, set_arp_pattern,
+     get_bitfield_bytes(ARP_PATTERN_PARAMETERS_1, ARP_PATTERN_PARAMETERS_2), 3],
+    ['arp_mode', get_arp_mode, set_arp_mode,
+     get_bitfield_bytes(ARP_MODE_PARAMETERS), 3],
+    ['arp_octaves', get_arp_octaves, set_arp_octaves,
+     get_bitfield_bytes(ARP_OCTAVES_PARAMETERS), 7],
+    ['arp_gate', get_arp_gate, set_arp_gate,
+     get_bitfield_bytes(ARP_GATE_PARAMETERS), 4],
+    ['arp_clock_source', get_arp_clock_source, set_arp_clock_source,
+     get_bitfield_bytes(ARP_CLOCK_SOURCE_PARAMETERS), 3],
+    ['arp_clock_division', get_arp_clock_division, set_arp_clock_division,
+     get_bitfield_bytes(ARP_CLOCK_DIVISION_PARAMETERS), 23],
+    ['filter_cutoff', get_filter_cutoff, set_filter_cutoff,
+     get_12b_value_bytes(FILTER_CUTOFF_START_BYTE), 4096],
+    ['filter_attack', get_filter_attack, set_filter_attack,
+     get_12b_value_bytes(FILTER_ATTACK_START_BYTE), 4096],
+]
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty profiler"""
+
+from threading import Lock
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+ENV_VAR = 'PHATTY_PROFILE'
+PROFILE_FILE = 'profile.prof'
+SUMMARY_FILE = 'profile.txt'
+TOP = 25
+TRACEBACK_FRAMES = 5
+
+
+def is_enabled():
+    return os.environ.get(ENV_VAR, '') not in ['', '0']
+
+
+def get_public_methods(obj):
+    names = []
+    for name in dir(type(obj)):
+        if not name.startswith('_') and callable(getattr(type(obj), name)):
+            names.append(name)
+    return names
+
+
+class Profiler(object):
+    """Profiles the main thread and measures the calls of instrumented objects in any thread.
+
+    cProfile only sees the thread that enabled it, so the calls made from the
+    worker thread are measured by the instrumented methods instead."""
+
+    def __init__(self, top=TOP):
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.timings = {}
+        self.lock = Lock()
+        self.running = False
+
+    def start(self):
+        logger.debug('Starting profiler...')
+        tracemalloc.start(TRACEBACK_FRAMES)
+        self.profile.enable()
+        self.running = True
+
+    def stop(self, directory):
+        """Stop profiling and write the profile and the summary into the directory. Return the summary filename."""
+        if not self.running:
+            return None
+        self.running = False
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        os.makedirs(directory, exist_ok=True)
+        self.profile.dump_stats(os.path.join(directory, PROFILE_FILE))
+        filename = os.path.join(directory, SUMMARY_FILE)
+        with open(filename, 'w') as output_file:
+            output_file.write(self.get_summary(snapshot, peak))
+        logger.debug('Profile written to {:s}'.format(directory))
+        return filename
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_timing(name, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, obj, prefix, names=None):
+        """Replace the public methods of an object with timed ones. This must happen before they are connected to any signal."""
+        if names == None:
+            names = get_public_methods(obj)
+        for name in names:
+            setattr(obj, name, self.wrap(
+                '{:s}.{:s}'.format(prefix, name), getattr(obj, name)))
+
+    def add_timing(self, name, elapsed):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing == None:
+                self.timings[name] = [1, elapsed, elapsed]
+            else:
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+
+    def get_timings(self):
+        """Return (name, calls, total, max) tuples sorted by decreasing total time."""
+        with self.lock:
+            timings = [(name, t[0], t[1], t[2]) for name, t in self.timings.items()]
+        return sorted(timings, key=lambda t: t[2], reverse=True)
+
+    def get_summary(self, snapshot, peak):
+        output = io.StringIO()
+        output.write('Calls\n\n')
+        output.write('{:>8s} {:>10s} {:>10s}  {:s}\n'.format(
+            'count', 'total ms', 'max ms', 'name'))
+        for name, count, total, maximum in self.get_timings()[:self.top]:
+            output.write('{:8d} {:10.1f} {:10.1f}  {:s}\n'.format(
+                count, total * 1000, maximum * 1000, name))
+        output.write('\nMain thread\n\n')
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        output.write('Memory (peak {:d} KiB)\n\n'.format(peak // 1024))
+        for stat in snapshot.statistics('lineno')[:self.top]:
+            output.write('{:s}\n'.format(str(stat)))
+        return output.getvalue()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty transfer progress estimate"""
+
+from phatty import transport
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 0.05
+
+
+class ProgressTimer(object):
+    """Reports the estimated progress of a message written at once.
+
+    rtmidi only takes whole sysex messages so a bank leaves in a single
+    write and nothing tells how much of it the link has carried. The
+    progress is estimated from the link rate instead. The caller only
+    waits for the estimate when a progress function is given."""
+
+    def __init__(self, rate=transport.MIDI_RATE, sleep=time.sleep,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.sleep = sleep
+        self.clock = clock
+
+    def send(self, message, write, progress=None):
+        """Write the message and report the estimated sent and total bytes to progress."""
+        write(message)
+        if not progress:
+            return
+        total = len(message)
+        start = self.clock()
+        end = start + total / self.rate
+        while True:
+            now = self.clock()
+            if now >= end:
+                break
+            progress(min(total, int((now - start) * self.rate)), total)
+            self.sleep(min(end - now, PROGRESS_INTERVAL))
+        progress(total, total)
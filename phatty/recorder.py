@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty MIDI traffic recorder"""
+
+from mido import Message
+from queue import Queue
+from threading import Thread
+import logging
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PHTYMIDI'
+TX = 0
+RX = 1
+# Monotonic timestamp in ns, direction and length
+HEADER = struct.Struct('<QBI')
+BUFFER_SIZE = 1 << 16
+
+
+def frame_sysex(data):
+    return b'\xf0' + bytes(data) + b'\xf7'
+
+
+def read_log(filename):
+    """Yield the (timestamp, direction, bytes) entries of a log."""
+    with open(filename, 'rb') as input_file:
+        if input_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Invalid MIDI log file')
+        while True:
+            header = input_file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            timestamp, direction, length = HEADER.unpack(header)
+            data = input_file.read(length)
+            if len(data) < length:
+                logger.warning('Truncated entry at the end of {:s}'.format(filename))
+                return
+            yield timestamp, direction, data
+
+
+class Recorder(object):
+    """Appends timestamped raw messages to a binary log.
+
+    The calling thread only takes the timestamp and queues the message.
+    Writing happens in a buffered writer thread."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.queue = Queue()
+        self.thread = None
+
+    def start(self):
+        logger.debug('Recording MIDI traffic to {:s}...'.format(self.filename))
+        self.output_file = open(self.filename, 'wb', buffering=BUFFER_SIZE)
+        self.output_file.write(MAGIC)
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            logger.debug('Stopping recording...')
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def record(self, direction, data):
+        self.queue.put((time.monotonic_ns(), direction, bytes(data)))
+
+    def run(self):
+        with self.output_file:
+            while True:
+                entry = self.queue.get()
+                if entry == None:
+                    return
+                timestamp, direction, data = entry
+                self.output_file.write(HEADER.pack(timestamp, direction, len(data)))
+                self.output_file.write(data)
+
+
+class ReplayPort(object):
+    """Fake mido port that delivers the received messages of a log at their original pace.
+
+    Sent messages are collected to compare them with the recorded ones.
+    Received messages that cannot be parsed are skipped and counted."""
+
+    def __init__(self, filename, speed=1, sleep=time.sleep):
+        self.entries = list(read_log(filename))
+        self.speed = speed
+        self.sleep = sleep
+        self.pending = Queue()
+        self.sent = []
+        self.invalid = 0
+        self.closed = False
+        self.thread = None
+
+    def get_sent(self):
+        return list(self.sent)
+
+    def get_recorded(self):
+        return [e[2] for e in self.entries if e[1] == TX]
+
+    def start(self):
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        if not self.entries:
+            return
+        first = self.entries[0][0]
+        start = time.monotonic_ns()
+        for timestamp, direction, data in self.entries:
+            if self.closed:
+                return
+            if direction != RX:
+                continue
+            delay = ((timestamp - first) / self.speed -
+                     (time.monotonic_ns() - start)) / 1e9
+            if delay > 0:
+                self.sleep(delay)
+            try:
+                msg = Message.from_bytes(data)
+            except ValueError as e:
+                logger.error('Skipping invalid message in log: {:s}'.format(str(e)))
+                self.invalid += 1
+                continue
+            self.pending.put(msg)
+
+    def send(self, msg):
+        self.sent.append(bytes(msg.bytes()))
+
+    def iter_pending(self):
+        while not self.pending.empty():
+            yield self.pending.get()
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset similarity search"""
+
+from phatty import preset
+import numpy
+import logging
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+logger = logging.getLogger(__name__)
+
+# Below the smallest step of a 12-bit value
+DUPLICATE_DISTANCE = 1e-4
+BLOCK_SIZE = 1024
+FEATURES = len(preset.ACCESSORS)
+
+
+def get_features(p):
+    """Return the decoded parameters of a preset scaled to [0, 1]."""
+    features = []
+    for accessor in preset.ACCESSORS:
+        value = accessor[preset.ACCESSOR_GETTER](p)
+        features.append(value / (accessor[preset.ACCESSOR_VALUES] - 1))
+    return features
+
+
+def get_feature_matrix(presets):
+    matrix = numpy.empty((len(presets), FEATURES), dtype=numpy.float32)
+    for i, p in enumerate(presets):
+        matrix[i] = get_features(p)
+    return matrix
+
+
+class Index(object):
+    """Nearest neighbour index over preset feature vectors.
+
+    Queries are brute force over a NumPy matrix unless a KD-tree has
+    been built, which requires SciPy."""
+
+    def __init__(self, weights=None):
+        self.features = numpy.empty((0, FEATURES), dtype=numpy.float32)
+        self.keys = []
+        if weights is None:
+            self.weights = numpy.ones(FEATURES, dtype=numpy.float32)
+        else:
+            self.weights = numpy.asarray(weights, dtype=numpy.float32)
+        self.tree = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, presets, keys=None):
+        if keys is None:
+            keys = range(len(self.keys), len(self.keys) + len(presets))
+        matrix = get_feature_matrix(presets) * self.weights
+        self.features = numpy.concatenate((self.features, matrix))
+        self.keys.extend(keys)
+        self.tree = None
+
+    def build_tree(self):
+        if cKDTree == None:
+            logger.debug('SciPy not available. Using brute force search...')
+            return False
+        self.tree = cKDTree(self.features)
+        return True
+
+    def query(self, p, k=5):
+        """Return up to k (key, distance) pairs sorted by increasing distance to the given preset."""
+        k = min(k, len(self.keys))
+        if k == 0:
+            return []
+        q = numpy.asarray(get_features(p), dtype=numpy.float32) * self.weights
+        if self.tree:
+            distances, indices = self.tree.query(q, k)
+            distances = numpy.atleast_1d(distances)
+            indices = numpy.atleast_1d(indices)
+        else:
+            d = self.features - q
+            distances = numpy.sqrt(numpy.einsum('ij,ij->i', d, d))
+            indices = numpy.argpartition(distances, k - 1)[:k]
+            indices = indices[numpy.argsort(distances[indices], kind='stable')]
+            distances = distances[indices]
+        return [(self.keys[i], float(distance)) for i, distance in zip(indices, distances)]
+
+    def get_close_pairs(self, threshold):
+        if self.tree:
+            return self.tree.query_pairs(threshold, output_type='ndarray')
+        pairs = []
+        features = self.features.astype(numpy.float64)
+        norms = numpy.einsum('ij,ij->i', features, features)
+        for start in range(0, len(self.keys), BLOCK_SIZE):
+            block = features[start:start + BLOCK_SIZE]
+            # Squared distances from the block to every later vector
+            d = norms[start:start + BLOCK_SIZE, None] + \
+                norms[None, start:] - 2 * block @ features[start:].T
+            i, j = numpy.nonzero(d <= threshold * threshold)
+            i += start
+            j += start
+            later = i < j
+            pairs.append(numpy.stack((i[later], j[later]), axis=1))
+        if not pairs:
+            return numpy.empty((0, 2), dtype=numpy.intp)
+        return numpy.concatenate(pairs)
+
+    def get_duplicates(self, threshold=DUPLICATE_DISTANCE):
+        """Return the clusters of keys whose presets are within the threshold distance of each other."""
+        parents = list(range(len(self.keys)))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for i, j in self.get_close_pairs(threshold):
+            a = find(int(i))
+            b = find(int(j))
+            if a != b:
+                parents[max(a, b)] = min(a, b)
+        clusters = {}
+        for i in range(len(self.keys)):
+            clusters.setdefault(find(i), []).append(self.keys[i])
+        return [c for c in clusters.values() if len(c) > 1]
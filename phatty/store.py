@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty preset store"""
+
+from threading import Lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PresetStore(object):
+    """Presets shared by the UI and the worker threads.
+
+    Presets are kept as immutable bytes so readers get a consistent copy
+    without locking while writers replace them. Every write increments the
+    version of the slot and notifies the listeners with the slot, or with
+    None when every slot changes."""
+
+    def __init__(self):
+        self.presets = []
+        self.versions = []
+        self.lock = Lock()
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.presets)
+
+    def __getitem__(self, slot):
+        return self.presets[slot]
+
+    def __setitem__(self, slot, data):
+        if isinstance(slot, slice):
+            if slot != slice(None):
+                raise IndexError('Only whole store assignments are supported')
+            self.load(data)
+        else:
+            self.set(slot, data)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, slot):
+        for listener in self.listeners:
+            listener(slot)
+
+    def get_version(self, slot):
+        return self.versions[slot]
+
+    def get_versions(self):
+        with self.lock:
+            return list(self.versions)
+
+    def snapshot(self):
+        """Return a list with the presets as they are now."""
+        with self.lock:
+            return list(self.presets)
+
+    def set(self, slot, data, version=None):
+        """Replace a preset. If a version is given the preset is only replaced if it has not changed since then."""
+        data = bytes(data)
+        with self.lock:
+            if version != None and self.versions[slot] != version:
+                return False
+            if self.presets[slot] == data:
+                return True
+            self.presets[slot] = data
+            self.versions[slot] += 1
+        self.notify(slot)
+        return True
+
+    def modify(self, slot, function, *args):
+        """Apply an in place edit function to a copy of a preset and store it. Return the old and new presets."""
+        with self.lock:
+            old = self.presets[slot]
+            data = bytearray(old)
+            function(data, *args)
+            new = bytes(data)
+            if new == old:
+                return old, new
+            self.presets[slot] = new
+            self.versions[slot] += 1
+        self.notify(slot)
+        return old, new
+
+    def append(self, data):
+        with self.lock:
+            slot = len(self.presets)
+            self.presets.append(bytes(data))
+            self.versions.append(0)
+        self.notify(slot)
+        return slot
+
+    def load(self, presets):
+        """Replace every preset, keeping the versions of the slots that are still there."""
+        presets = [bytes(p) for p in presets]
+        with self.lock:
+            for slot, data in enumerate(presets):
+                if slot >= len(self.presets):
+                    self.versions.append(0)
+                elif self.presets[slot] != data:
+                    self.versions[slot] += 1
+            del self.versions[len(presets):]
+            self.presets = presets
+        self.notify(None)
+
+    def clear(self):
+        self.load([])
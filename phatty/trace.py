@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty span tracer
+
+Records spans in the Chrome trace event format, which trace viewers like
+chrome://tracing or Perfetto open. Nothing is recorded unless started."""
+
+from collections import deque
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_EVENTS = 1000000
+MIDI = 'midi'
+IO = 'io'
+UI = 'ui'
+WORKER = 'worker'
+TRANSFER = 'transfer'
+
+events = deque(maxlen=MAX_EVENTS)
+enabled = False
+
+
+def get_timestamp():
+    # Microseconds as expected by the format
+    return time.perf_counter_ns() / 1000
+
+
+def add_event(event):
+    event['pid'] = os.getpid()
+    event['tid'] = threading.get_ident()
+    events.append(event)
+
+
+class Span(object):
+    """Complete event measured between enter and exit"""
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = get_timestamp()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        event = {'name': self.name, 'cat': self.category, 'ph': 'X',
+                 'ts': self.start, 'dur': get_timestamp() - self.start}
+        if self.args:
+            event['args'] = self.args
+        add_event(event)
+        return False
+
+
+class NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name, category, **args):
+    """Return a context manager that records a span if tracing is enabled."""
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(category, name=None):
+    """Decorate a function to record a span for every call while tracing is enabled."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Span(span_name, category, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instant(name, category, **args):
+    if enabled:
+        add_event({'name': name, 'cat': category, 'ph': 'i', 's': 't',
+                   'ts': get_timestamp(), 'args': args})
+
+
+def flow_start(name, category, id):
+    """Mark where some work handed to another thread starts waiting."""
+    if enabled:
+        add_event({'name': name, 'cat': category, 'ph': 's',
+                   'id': id, 'ts': get_timestamp()})
+
+
+def flow_end(name, category, id):
+    if enabled:
+        add_event({'name': name, 'cat': category, 'ph': 'f', 'bp': 'e',
+                   'id': id, 'ts': get_timestamp()})
+
+
+def start():
+    global enabled
+    logger.debug('Starting tracer...')
+    events.clear()
+    enabled = True
+
+
+def get_thread_names():
+    names = []
+    for thread in threading.enumerate():
+        names.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                      'tid': thread.ident, 'args': {'name': thread.name}})
+    return names
+
+
+def stop(filename):
+    """Stop tracing and write the events recorded to a JSON file."""
+    global enabled
+    if not enabled:
+        return
+    enabled = False
+    logger.debug('Writing {:d} trace events to {:s}...'.format(
+        len(events), filename))
+    with open(filename, 'w') as output_file:
+        json.dump({'traceEvents': get_thread_names() + list(events),
+                   'displayTimeUnit': 'ms'}, output_file)
+    events.clear()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty transfer updates"""
+
+from phatty import trace
+from threading import Lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 16
+FLUSH_BATCH_SIZE = 25
+
+
+class TransferChannel(object):
+    """Coalesces transfer updates from a worker thread into UI flushes.
+
+    The main loop is reached through the given functions, typically
+    GLib.idle_add, GLib.timeout_add and GLib.source_remove."""
+
+    def __init__(self, status_handler, presets_handler, idle_add, timeout_add,
+                 source_remove):
+        self.status_handler = status_handler
+        self.presets_handler = presets_handler
+        self.idle_add = idle_add
+        self.timeout_add = timeout_add
+        self.source_remove = source_remove
+        self.lock = Lock()
+        self.status = None
+        self.presets = []
+        self.source = None
+        self.scheduled = False
+
+    def start(self):
+        self.remove_source()
+        with self.lock:
+            self.status = None
+            self.presets = []
+            self.scheduled = False
+        self.source = self.timeout_add(FLUSH_INTERVAL, self.flush)
+
+    def stop(self):
+        self.remove_source()
+        self.flush()
+
+    def cancel(self):
+        """Stop and discard the updates not flushed yet."""
+        self.remove_source()
+        with self.lock:
+            self.status = None
+            self.presets = []
+
+    def remove_source(self):
+        if self.source:
+            self.source_remove(self.source)
+            self.source = None
+
+    def set_status(self, msg, fraction):
+        with self.lock:
+            self.status = (msg, fraction)
+
+    def add_preset(self, number, name):
+        with self.lock:
+            self.presets.append([number, name])
+            schedule = len(self.presets) >= FLUSH_BATCH_SIZE and not self.scheduled
+            if schedule:
+                self.scheduled = True
+        if schedule:
+            self.idle_add(self.flush_batch)
+
+    def flush_batch(self):
+        self.flush()
+        return False
+
+    @trace.traced(trace.UI)
+    def flush(self):
+        with self.lock:
+            status = self.status
+            presets = self.presets
+            self.status = None
+            self.presets = []
+            self.scheduled = False
+        if status:
+            self.status_handler(*status)
+        if presets:
+            self.presets_handler(presets)
+        return self.source != None
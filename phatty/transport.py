@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty raw sysex transport"""
+
+from queue import Queue, Empty
+import logging
+
+logger = logging.getLogger(__name__)
+
+SYSEX_START = 0xF0
+SYSEX_END = 0xF7
+# Bytes per second of a 31250 baud MIDI link
+MIDI_RATE = 3125
+INVALID_DATA = 'Invalid sysex data'
+
+
+def check_data(data):
+    """Raise ValueError unless every byte is a 7-bit sysex data byte."""
+    # Both bytes() and isascii() walk the buffer in C, which checks every high bit at once
+    try:
+        valid = bytes(data).isascii()
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise ValueError(INVALID_DATA)
+
+
+def frame(data):
+    check_data(data)
+    return b'\xf0' + bytes(data) + b'\xf7'
+
+
+def unframe(data):
+    """Return the payload of a complete sysex message or None."""
+    if len(data) < 2 or data[0] != SYSEX_START or data[-1] != SYSEX_END:
+        return None
+    payload = data[1:-1]
+    check_data(payload)
+    return payload
+
+
+def get_transport(port):
+    """Return a RawTransport for ports backed by rtmidi or None otherwise."""
+    input = getattr(getattr(port, 'input', None), '_rt', None)
+    output = getattr(getattr(port, 'output', None), '_rt', None)
+    if input == None or output == None:
+        logger.debug('Port is not backed by rtmidi. Using mido messages...')
+        return None
+    return RawTransport(input, output)
+
+
+class SysexAssembler(object):
+    """Builds a sysex message from the chunks delivered by the backend.
+
+    Some backends hand over large sysex messages in several pieces while
+    others, like ALSA, only deliver them once they are complete."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.started = False
+        self.complete = False
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, chunk):
+        """Append a chunk and return False if it does not belong to a sysex message."""
+        if chunk[0] == SYSEX_START:
+            self.buffer = bytearray(chunk)
+            self.started = True
+        elif self.started and not self.complete and (chunk[0] < 0x80 or chunk[0] == SYSEX_END):
+            self.buffer.extend(chunk)
+        else:
+            return False
+        self.complete = self.buffer[-1] == SYSEX_END
+        return True
+
+    def get_data(self):
+        return unframe(self.buffer)
+
+
+class RawTransport(object):
+    """Moves framed sysex bytes straight between the connector and rtmidi.
+
+    This skips the per byte validation and copies done by mido messages,
+    which dominate the time spent on banks and bulks."""
+
+    def __init__(self, input, output):
+        self.input = input
+        self.output = output
+        self.queue = Queue()
+        self.input.cancel_callback()
+        self.input.set_callback(self.put)
+
+    def close(self):
+        self.input.cancel_callback()
+
+    def put(self, event, data=None):
+        message, delta = event
+        self.queue.put(message)
+
+    def send(self, data):
+        self.output.send_message(frame(data))
+
+    def receive(self, timeout):
+        """Return the next raw message as a list of bytes or None if none arrives in time."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
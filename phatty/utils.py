@@ -36,8 +36,11 @@ DEVICE = 'device'
 BULK_ON = 'bulk_on'
 DOWNLOAD_AUTO = 'download_auto'
 LFO_MIDI_SYNC = 'lfo_midi_sync'
+PREFETCH_ON = 'prefetch_on'
+VERIFY_ON = 'verify_on'
 DEFAULT_CONFIG = {DEVICE:  '',
-                  BULK_ON: False, DOWNLOAD_AUTO: True, LFO_MIDI_SYNC: False}
+                  BULK_ON: False, DOWNLOAD_AUTO: True, LFO_MIDI_SYNC: False,
+                  PREFETCH_ON: False, VERIFY_ON: False}
 
 CONFIG_DIR = expanduser('~') + '/.' + APP_NAME
 CONFIG_FILE = CONFIG_DIR + '/config'
@@ -74,6 +77,8 @@ def read_config():
             logger.error(READ_ERROR_MSG.format(str(e)))
         else:
             logger.debug('Config file read.')
+            for key, value in DEFAULT_CONFIG.items():
+                config.setdefault(key, value)
         file.close()
         return config
 
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty upload verification"""
+
+from phatty import diff
+from collections import deque
+import logging
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_DEPTH = 2
+MAX_RETRIES = 3
+
+
+def is_written(connector, expected, slot):
+    """Read a preset back and tell if its parameter bytes are the expected ones."""
+    return not diff.get_changed_bytes(expected, connector.get_preset(slot))
+
+
+def upload(connector, presets, slots, verify=False, depth=PIPELINE_DEPTH,
+           retries=MAX_RETRIES, progress=None, running=None, written=None):
+    """Write the presets in the given slots and return the slots that could not be verified.
+
+    Each readback is issued depth writes behind its write, so the Phatty
+    stores a preset while the previous ones are being checked, and
+    mismatches are written again up to retries times. Pass a running
+    function to stop early. Slots are appended to the written list once
+    they are written or, when verifying, once they are verified, so it
+    is also complete if the connector fails partway through."""
+    pending = deque()
+    failed = []
+
+    def check(slot, attempts):
+        if is_written(connector, presets[slot], slot):
+            if written != None:
+                written.append(slot)
+            return
+        if attempts < retries:
+            logger.debug('Preset {:d} mismatch. Writing it again...'.format(slot))
+            connector.tx_message(presets[slot])
+            pending.append((slot, attempts + 1))
+        else:
+            logger.error('Preset {:d} could not be verified'.format(slot))
+            failed.append(slot)
+
+    for i, slot in enumerate(slots):
+        if running and not running():
+            logger.debug('Cancelling upload...')
+            return failed
+        if progress:
+            progress(slot, i, len(slots))
+        connector.tx_message(presets[slot])
+        if not verify:
+            if written != None:
+                written.append(slot)
+        else:
+            pending.append((slot, 0))
+            if len(pending) > depth:
+                check(*pending.popleft())
+    while pending:
+        if running and not running():
+            break
+        check(*pending.popleft())
+    return failed
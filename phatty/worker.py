@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+"""Phatty connector worker"""
+
+from phatty import trace
+from collections import deque
+from itertools import count
+from queue import PriorityQueue
+from threading import Thread, Lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = 1
+# Runs after every other job
+PRIORITY_STOP = 2
+
+
+class Job(object):
+    """Queued worker call"""
+
+    def __init__(self, function, args, callback, error_callback, id=0):
+        self.function = function
+        self.args = args
+        self.callback = callback
+        self.error_callback = error_callback
+        self.cancelled = False
+        self.id = id
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Worker(object):
+    """Runs every connector call on a single thread.
+
+    Results are handed back through one dispatch channel, typically
+    GLib.idle_add, which is scheduled at most once per batch of results."""
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+        self.queue = PriorityQueue()
+        self.sequence = count()
+        self.results = deque()
+        self.lock = Lock()
+        self.scheduled = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        logger.debug('Starting worker...')
+        self.running = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, wait=False, function=None):
+        """Stop after the queued jobs, calling function last on the worker."""
+        logger.debug('Stopping worker...')
+        if function:
+            self.submit(function, priority=PRIORITY_STOP)
+        self.queue.put((PRIORITY_STOP, next(self.sequence), None))
+        if wait and self.thread:
+            self.thread.join()
+
+    def cancel(self):
+        """Cancel every queued job."""
+        with self.queue.mutex:
+            jobs = [job for priority, sequence, job in self.queue.queue if job]
+        for job in jobs:
+            job.cancel()
+
+    def submit(self, function, *args, callback=None, error_callback=None,
+               priority=PRIORITY_NORMAL):
+        sequence = next(self.sequence)
+        job = Job(function, args, callback, error_callback, sequence)
+        trace.flow_start('job', trace.WORKER, sequence)
+        self.queue.put((priority, sequence, job))
+        return job
+
+    def deliver(self, function, *args):
+        with self.lock:
+            self.results.append((function, args))
+            schedule = not self.scheduled
+            self.scheduled = True
+        if schedule:
+            self.dispatch(self.drain)
+
+    @trace.traced(trace.UI)
+    def drain(self):
+        with self.lock:
+            results = self.results
+            self.results = deque()
+            self.scheduled = False
+        for function, args in results:
+            function(*args)
+        return False
+
+    def run(self):
+        while True:
+            priority, sequence, job = self.queue.get()
+            if job == None:
+                break
+            if job.cancelled:
+                continue
+            trace.flow_end('job', trace.WORKER, job.id)
+            try:
+                with trace.span(getattr(job.function, '__name__', 'job'), trace.WORKER):
+                    result = job.function(*job.args)
+            except Exception as e:
+                if job.error_callback:
+                    self.deliver(job.error_callback, e)
+                else:
+                    logger.error('Error in worker call {:s}: {:s}'.format(
+                        str(job.function), str(e)))
+            else:
+                if job.callback and not job.cancelled:
+                    self.deliver(job.callback, result)
+        self.running = False
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+from phatty import archive
+from phatty import batch
+from phatty import preset
+
+RESOURCES = os.path.join(os.path.dirname(__file__), 'resources')
+PRESET_FILE_NAME = os.path.join(RESOURCES, 'preset.syx')
+BANK_FILE_NAME = os.path.join(RESOURCES, 'bank.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+        self.write_library('a.syx', [('Fat Bass', 0), ('Lead', 1)])
+        os.mkdir(os.path.join(self.dir, 'more'))
+        self.write_library(os.path.join('more', 'b.sysex'),
+                           [('Sub Bass', 1)])
+        shutil.copy(BANK_FILE_NAME, os.path.join(self.dir, 'bank.syx'))
+        with open(os.path.join(self.dir, 'notes.txt'), 'w') as f:
+            f.write('Not a preset')
+        self.archive = archive.Archive(cache_size=1)
+        self.archive.load(self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_library(self, name, presets):
+        setter = preset.ACCESSORS[0][preset.ACCESSOR_SETTER]
+        with open(os.path.join(self.dir, name), 'wb') as output_file:
+            for n, value in presets:
+                p = bytearray(self.preset)
+                preset.set_name(p, n)
+                setter(p, value)
+                batch.write_message(output_file, p)
+
+    def test_load(self):
+        self.assertEqual(len(self.archive), 3)
+        self.assertEqual([e.position for e in self.archive.entries], [0, 1, 0])
+        self.assertEqual(self.archive.parameters.shape,
+                         (3, len(preset.ACCESSORS)))
+
+    def test_get_name(self):
+        self.assertEqual(self.archive.get_name(1), 'Lead')
+        self.assertEqual(self.archive.get_name(2), 'Sub Bass')
+        self.assertEqual(self.archive.get_name(0), 'Fat Bass')
+        # Names never touch the disk
+        self.assertEqual(len(self.archive.cache), 0)
+
+    def test_get_data(self):
+        self.assertEqual(preset.get_name(self.archive.get_data(1)).strip(), 'Lead')
+        self.assertEqual(preset.get_name(self.archive.get_data(2)).strip(), 'Sub Bass')
+        self.assertEqual(len(self.archive.cache), 1)
+        self.assertEqual(len(self.archive.get_data(0)), len(self.preset))
+
+    def test_filter(self):
+        name = preset.ACCESSORS[0][preset.ACCESSOR_NAME]
+        self.assertEqual(list(self.archive.filter()), [0, 1, 2])
+        self.assertEqual(list(self.archive.filter('BASS')), [0, 2])
+        self.assertEqual(list(self.archive.filter('bass', {name: 1})), [2])
+        self.assertEqual(list(self.archive.filter('', {name: 1})), [1, 2])
+        self.assertEqual(list(self.archive.filter('pad')), [])
+
+    def test_parse_query(self):
+        name = preset.ACCESSORS[0][preset.ACCESSOR_NAME]
+        self.assertEqual(archive.parse_query(
+            'sub {:s}=1 a=b bass'.format(name)), ('sub a=b bass', {name: 1}))
+        self.assertEqual(list(self.archive.search(
+            '{:s}=0 bass'.format(name))), [0])
+
+    def test_empty(self):
+        a = archive.Archive()
+        a.load(os.path.join(self.dir, 'more', 'missing'))
+        self.assertEqual(len(a), 0)
+        self.assertEqual(list(a.filter('bass')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+from phatty import batch
+from phatty import formats
+from phatty import preset
+
+RESOURCES = os.path.join(os.path.dirname(__file__), 'resources')
+PRESET_FILE_NAME = os.path.join(RESOURCES, 'preset.syx')
+BANK_FILE_NAME = os.path.join(RESOURCES, 'bank.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.dir, 'output')
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_library(self, name, names):
+        filename = os.path.join(self.dir, name)
+        with open(filename, 'wb') as output_file:
+            for n in names:
+                p = bytearray(self.preset)
+                preset.set_name(p, n)
+                batch.write_message(output_file, p)
+        return filename
+
+    def test_read_messages(self):
+        self.assertEqual(batch.read_messages(PRESET_FILE_NAME), [self.preset])
+        messages = batch.read_messages(BANK_FILE_NAME)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(formats.get_kind(messages[0]), formats.BANK)
+
+    def test_get_safe_name(self):
+        self.assertEqual(batch.get_safe_name(' A/B* '), 'A_B_')
+        self.assertEqual(batch.get_safe_name('   '), batch.DEFAULT_NAME)
+
+    def test_extract_file(self):
+        filename = self.write_library('lib.syx', ['BASS', 'LEAD', 'BASS'])
+        result = batch.extract_file(filename, self.output_dir, 7)
+        self.assertEqual(result.unknown, 0)
+        names = sorted([os.path.basename(f) for f in result.outputs])
+        self.assertEqual(names, ['BASS-1.syx', 'BASS.syx', 'LEAD.syx'])
+        data = batch.read_messages(result.outputs[1])[0]
+        self.assertEqual(preset.get_name(data).strip(), 'LEAD')
+        self.assertEqual(preset.get_number(data), 7)
+
+    def test_extract_bank(self):
+        result = batch.extract_file(BANK_FILE_NAME, self.output_dir)
+        self.assertEqual(result.outputs, [os.path.join(
+            self.output_dir, formats.BANK, 'II', 'bank.syx')])
+
+    def test_extract(self):
+        filenames = [self.write_library('lib{:d}.syx'.format(i), ['P{:d}'.format(i)])
+                     for i in range(6)]
+        results = list(batch.extract(filenames, self.output_dir, workers=2))
+        self.assertEqual(sorted([r.filename for r in results]), filenames)
+        self.assertEqual(len(os.listdir(self.output_dir)), 6)
+
+    def test_merge_presets(self):
+        filename = self.write_library('lib.syx', ['A'] * 150)
+        outputs = batch.merge_presets([filename, PRESET_FILE_NAME], self.output_dir)
+        self.assertEqual(len(outputs), 2)
+        first = batch.read_messages(outputs[0])
+        second = batch.read_messages(outputs[1])
+        self.assertEqual(len(first), 100)
+        self.assertEqual(len(second), 51)
+        self.assertEqual([preset.get_number(p) for p in second], list(range(51)))
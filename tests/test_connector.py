@@ -27,6 +27,7 @@ from mock import Mock
 from mock import call
 from phatty.connector import Connector
 from struct import unpack
+import time
 
 BAD_BANK_FILE_NAME = os.path.join(
     os.path.dirname(__file__), 'resources/preset.syx')
@@ -85,6 +86,23 @@ class Test(unittest.TestCase):
         msg = Message('program_change', channel=0, program=37)
         self.connector.port.send.assert_called_once_with(msg)
 
+    def test_poll(self):
+        self.connector.callback = Mock()
+        messages = [Message('sysex', data=[1, 2]),
+                    Message('program_change', program=2)]
+        self.connector.port.iter_pending.return_value = messages
+        self.connector.poll()
+        self.connector.callback.assert_called_once_with(messages[1])
+
+    def test_poll_timeout(self):
+        self.connector.callback = Mock()
+        self.connector.port.iter_pending.return_value = []
+        start = time.monotonic()
+        self.connector.poll(0.05)
+        self.assertTrue(time.monotonic() - start >= 0.05)
+        self.assertTrue(self.connector.port.iter_pending.call_count > 1)
+        self.connector.callback.assert_not_called()
+
     def test_set_bulk(self):
         try:
             data = []
@@ -158,14 +176,14 @@ class Test(unittest.TestCase):
     def test_set_bank_from_bank_file(self):
         self.connector.set_bank = Mock()
         data = self.set_bank_from_file(BANK_FILE_NAME)
-        self.connector.set_bank.assert_called_once_with(data)
+        self.connector.set_bank.assert_called_once_with(data, None)
 
     def test_set_bank_from_bulk_file(self):
-        self.connector.set_bank = Mock(side_effect=ValueError)
+        self.connector.set_bank = Mock()
         self.connector.set_bulk = Mock()
         data = self.set_bank_from_file(BULK_FILE_NAME)
-        self.connector.set_bank.assert_called_once_with(data)
-        self.connector.set_bulk.assert_called_once_with(data)
+        self.connector.set_bank.assert_not_called()
+        self.connector.set_bulk.assert_called_once_with(data, None)
 
     def test_set_bank_from_bank_file_error(self):
         try:
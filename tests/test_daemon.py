@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import io
+import os
+import shutil
+import socket
+import tempfile
+import time
+from queue import Queue
+from threading import Event
+from mido import Message
+from mock import Mock
+from phatty import connector
+from phatty import daemon
+from phatty import preset
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+TIMEOUT = 5
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+        self.dir = tempfile.mkdtemp()
+        self.connector = Mock()
+        self.connector.connected.return_value = True
+        self.connector.sw_version = '1.2.3.4'
+        self.connector.get_preset.side_effect = lambda num: self.get_preset(num)
+        self.server = daemon.Server(self.connector,
+                                    os.path.join(self.dir, 'phattyd.sock'))
+        self.server.start()
+        self.client = daemon.Client(self.server.path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def get_preset(self, num):
+        data = bytearray(self.preset)
+        preset.set_number(data, num)
+        return list(data)
+
+    def test_frame(self):
+        f = io.BytesIO()
+        daemon.write_frame(f, daemon.REQUEST, 7, {'method': 'a'}, [b'\x01\x02', b'\x03'])
+        f.seek(0)
+        self.assertEqual(daemon.read_frame(f), (daemon.REQUEST, 7, {
+                         'method': 'a'}, [bytearray(b'\x01\x02'), bytearray(b'\x03')]))
+        self.assertRaises(EOFError, daemon.read_frame, f)
+
+    def test_version(self):
+        self.assertEqual(self.client.call('version', timeout=TIMEOUT), '1.2.3.4')
+
+    def test_get_preset_cached(self):
+        futures = [self.client.submit('get_preset', i) for i in [3, 4, 3]]
+        results = [f.result(TIMEOUT) for f in futures]
+        self.assertEqual([preset.get_number(r) for r in results], [3, 4, 3])
+        other = daemon.Client(self.server.path)
+        try:
+            self.assertEqual(other.call('get_preset', 4, timeout=TIMEOUT), results[1])
+        finally:
+            other.close()
+        self.assertEqual(self.connector.get_preset.call_count, 2)
+        self.client.call('get_preset', 3, True, timeout=TIMEOUT)
+        self.assertEqual(self.connector.get_preset.call_count, 3)
+
+    def test_get_library(self):
+        library = self.client.call('get_library', timeout=TIMEOUT)
+        self.assertEqual(len(library), connector.MAX_PRESETS)
+        self.assertEqual(preset.get_number(library[99]), 99)
+
+    def test_set_preset_data(self):
+        data = bytearray(self.get_preset(5))
+        data[2] = 5
+        preset.set_name(data, 'New')
+        self.client.call('get_preset', 5, timeout=TIMEOUT)
+        self.assertTrue(self.client.call('set_preset_data', data, timeout=TIMEOUT))
+        self.connector.tx_message.assert_called_once_with(data)
+        # The write invalidates the cached preset
+        self.client.call('get_preset', 5, timeout=TIMEOUT)
+        self.assertEqual(self.connector.get_preset.call_count, 2)
+        self.assertRaises(daemon.DaemonError, self.client.call,
+                          'set_preset_data', b'\x01\x02', timeout=TIMEOUT)
+
+    def test_get_library_interleaved(self):
+        self.connector.get_panel.return_value = self.preset
+        event = Event()
+        self.server.worker.submit(event.wait)
+        library = self.client.submit('get_library')
+        panel = self.client.submit('get_panel')
+        # Both requests are queued while the worker is blocked
+        while self.server.get_panel not in [
+                e[2].function for e in list(self.server.worker.queue.queue) if e[2]]:
+            time.sleep(0.001)
+        event.set()
+        panel.result(TIMEOUT)
+        self.assertEqual(len(library.result(TIMEOUT)), connector.MAX_PRESETS)
+        names = [c[0] for c in self.connector.mock_calls
+                 if c[0] in ['get_panel', 'get_preset']]
+        self.assertEqual(names.index('get_panel'), 1)
+
+    def test_set_panel_parameter(self):
+        self.client.call('set_panel_parameter', 'filter_poles', 2, timeout=TIMEOUT)
+        self.connector.send_messages.assert_called_once_with(
+            [connector.get_panel_controller('filter_poles', 2)])
+
+    def test_errors(self):
+        self.assertRaises(daemon.DaemonError, self.client.call,
+                          'unknown', timeout=TIMEOUT)
+        self.connector.connected.return_value = False
+        self.assertRaises(daemon.DaemonError, self.client.call,
+                          'get_panel', timeout=TIMEOUT)
+
+    def test_malformed_request(self):
+        self.assertRaises(daemon.DaemonError, self.client.call,
+                          'get_preset', 'a', timeout=TIMEOUT)
+        with self.client.lock:
+            daemon.write_frame(self.client.output, daemon.REQUEST, 100,
+                               {'method': 'version', 'args': 1})
+        self.assertEqual(self.client.call('version', timeout=TIMEOUT), '1.2.3.4')
+
+    def test_reconnect(self):
+        self.server.device = 'Phatty'
+        self.connector.connected.return_value = False
+        self.connector.connect.side_effect = lambda device, callback: setattr(
+            self.connector.connected, 'return_value', True)
+        self.assertEqual(self.client.call('version', timeout=TIMEOUT), '1.2.3.4')
+        self.connector.connect.assert_called_once_with(
+            'Phatty', self.server.receive_message)
+
+    def test_poll_disconnected(self):
+        self.connector.connected.return_value = False
+        # Lets a poll started while connected finish
+        time.sleep(2 * daemon.POLL_TIMEOUT)
+        self.connector.connected.reset_mock()
+        self.connector.poll.reset_mock()
+        time.sleep(0.2)
+        # Each poll waits instead of spinning the worker
+        polls = self.connector.connected.call_count
+        self.assertTrue(polls <= 0.2 / daemon.POLL_TIMEOUT + 2)
+        self.connector.poll.assert_not_called()
+
+    def test_already_running(self):
+        other = daemon.Server(Mock(), self.server.path)
+        self.assertRaises(daemon.DaemonError, other.start)
+        self.assertEqual(self.client.call('version', timeout=TIMEOUT), '1.2.3.4')
+
+    def test_stale_socket(self):
+        path = os.path.join(self.dir, 'stale.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.close()
+        server = daemon.Server(self.connector, path)
+        server.start()
+        try:
+            client = daemon.Client(path)
+            self.assertEqual(client.call('version', timeout=TIMEOUT), '1.2.3.4')
+            client.close()
+        finally:
+            server.stop()
+
+    def test_subscribe(self):
+        events = Queue()
+        self.client.subscribe(events.put)
+        self.server.receive_message(Message('note_on', note=60))
+        self.server.receive_message(Message('program_change', program=3))
+        event = events.get(timeout=TIMEOUT)
+        self.assertEqual(event['type'], 'program_change')
+        self.assertEqual(event['program'], 3)
+        self.assertTrue(events.empty())
+
+    def test_poll(self):
+        # Polls are scheduled again after every run
+        done = Queue()
+        self.connector.poll.side_effect = done.put
+        self.assertEqual(done.get(timeout=TIMEOUT), daemon.POLL_TIMEOUT)
+
+
+if __name__ == '__main__':
+    unittest.main()
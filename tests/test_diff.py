@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+from mock import Mock
+from phatty import diff
+from phatty import preset
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+
+    def test_get_changed_bytes(self):
+        p = bytearray(self.preset)
+        self.assertEqual(diff.get_changed_bytes(self.preset, p), [])
+        p[100] ^= 0x1
+        p[150] ^= 0x2
+        self.assertEqual(diff.get_changed_bytes(self.preset, p), [100, 150])
+
+    def test_get_changed_bytes_ignores_header(self):
+        p = bytearray(self.preset)
+        preset.set_number(p, 99)
+        p[2] = 0x5
+        self.assertEqual(diff.get_changed_bytes(self.preset, p), [])
+
+    def test_get_changed_bytes_different_length(self):
+        p = self.preset[:-2]
+        self.assertEqual(diff.get_changed_bytes(self.preset, p),
+                         [len(self.preset) - 2, len(self.preset) - 1])
+
+    def test_diff_presets_equal(self):
+        self.assertEqual(diff.diff_presets(
+            self.preset, bytearray(self.preset)), None)
+
+    def test_diff_presets(self):
+        p = bytearray(self.preset)
+        preset.set_name(p, 'FOO')
+        preset.set_filter_poles(p, 0)
+        preset.set_scale(p, 3)
+        preset.set_filter_cutoff(p, 1234)
+        p[150] ^= 0x1
+        d = diff.diff_presets(self.preset, p, 7)
+        self.assertEqual(d.number, 7)
+        self.assertEqual(d.parameters, [
+            diff.ParameterDiff('name', 'MOOG STAGE II', 'FOO          '),
+            diff.ParameterDiff('filter_poles', 3, 0),
+            diff.ParameterDiff('filter_cutoff', 52, 1234),
+            diff.ParameterDiff('scale', 32, 3)])
+        self.assertEqual(d.unknown_bytes, [150])
+
+    def test_diff_libraries(self):
+        a = [bytearray(self.preset) for i in range(3)]
+        b = [bytearray(self.preset) for i in range(3)]
+        preset.set_arp_mode(b[1], 2)
+        diffs = diff.diff_libraries(a, b)
+        self.assertEqual(len(diffs), 1)
+        self.assertEqual(diffs[0].number, 1)
+        self.assertEqual(diffs[0].parameters, [
+                         diff.ParameterDiff('arp_mode', 0, 2)])
+
+    def test_diff_device(self):
+        library = [bytearray(self.preset) for i in range(2)]
+        device = [bytearray(self.preset) for i in range(2)]
+        preset.set_release(device[0], 0)
+        connector = Mock()
+        connector.get_preset = Mock(side_effect=lambda i: device[i])
+        diffs = diff.diff_device(connector, library)
+        self.assertEqual(len(diffs), 1)
+        self.assertEqual(diffs[0].parameters, [
+                         diff.ParameterDiff('release', 1, 0)])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import csv
+import os
+import shutil
+import tempfile
+from phatty import batch
+from phatty import export
+from phatty import preset
+
+RESOURCES = os.path.join(os.path.dirname(__file__), 'resources')
+PRESET_FILE_NAME = os.path.join(RESOURCES, 'preset.syx')
+BANK_FILE_NAME = os.path.join(RESOURCES, 'bank.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.dir, 'input')
+        os.mkdir(self.input_dir)
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+        self.library = os.path.join(self.input_dir, 'library.syx')
+        with open(self.library, 'wb') as output_file:
+            for i in range(5):
+                p = bytearray(self.preset)
+                preset.set_name(p, 'Preset {:d}'.format(i))
+                batch.write_message(output_file, p)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get_chunks(self):
+        presets = export.get_presets([self.library])
+        lengths = [len(c) for c in export.get_chunks(presets, 2)]
+        self.assertEqual(lengths, [2, 2, 1])
+
+    def test_get_presets(self):
+        presets = list(export.get_presets(
+            [self.input_dir, BANK_FILE_NAME, PRESET_FILE_NAME]))
+        self.assertEqual(len(presets), 6)
+        self.assertEqual([p[1] for p in presets], [0, 1, 2, 3, 4, 0])
+        self.assertEqual(presets[5][0], PRESET_FILE_NAME)
+
+    def test_get_format(self):
+        self.assertEqual(export.get_format('a.CSV'), export.CSV)
+        self.assertEqual(export.get_format('a.feather'), export.ARROW)
+        self.assertRaises(ValueError, export.get_format, 'a.txt')
+
+    def test_export_csv(self):
+        filename = os.path.join(self.dir, 'out.csv')
+        self.assertEqual(export.export(
+            [self.input_dir, PRESET_FILE_NAME], filename, chunk_size=4), 6)
+        with open(filename, newline='') as input_file:
+            rows = list(csv.reader(input_file))
+        self.assertEqual(rows[0], export.COLUMNS)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[1][:3], [self.library, '0', 'Preset 0'])
+        self.assertEqual(rows[5][2], 'Preset 4')
+        for j, accessor in enumerate(preset.ACCESSORS):
+            self.assertEqual(int(rows[6][j + 3]),
+                             accessor[preset.ACCESSOR_GETTER](self.preset))
+
+    @unittest.skipIf(export.pyarrow == None, 'pyarrow not available')
+    def test_export_parquet(self):
+        filename = os.path.join(self.dir, 'out.parquet')
+        self.assertEqual(export.export([self.input_dir], filename, chunk_size=2), 5)
+        table = export.pyarrow.parquet.read_table(filename)
+        self.assertEqual(table.column_names, export.COLUMNS)
+        self.assertEqual(table.num_rows, 5)
+
+    @unittest.skipIf(export.pyarrow != None, 'pyarrow available')
+    def test_export_without_pyarrow(self):
+        filename = os.path.join(self.dir, 'out.arrow')
+        self.assertRaises(ValueError, export.export, [self.input_dir], filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import mido
+from phatty import formats
+
+RESOURCES = os.path.join(os.path.dirname(__file__), 'resources')
+
+
+def read_file(filename):
+    data = mido.read_syx_file(filename)[0].bytes()
+    return data[1:len(data) - 1]
+
+
+class Test(unittest.TestCase):
+
+    def test_identify_bank(self):
+        sysex = formats.identify(read_file(os.path.join(RESOURCES, 'bank.syx')))
+        self.assertTrue(isinstance(sysex, formats.Bank))
+        self.assertEqual(sysex.kind, formats.BANK)
+        self.assertEqual(sysex.variant, 'II')
+
+    def test_identify_bulk(self):
+        sysex = formats.identify(read_file(os.path.join(RESOURCES, 'bulk.syx')))
+        self.assertTrue(isinstance(sysex, formats.Bulk))
+        self.assertEqual(sysex.variant, 'II')
+
+    def test_identify_panel(self):
+        with open(os.path.join(RESOURCES, 'preset.syx'), 'rb') as input_file:
+            data = bytearray(input_file.read())
+        sysex = formats.identify(data)
+        self.assertEqual(sysex.kind, formats.PANEL)
+        self.assertEqual(sysex.variant, None)
+        data[2] = 5
+        data[4] = 12
+        sysex = formats.identify(data)
+        self.assertEqual(sysex.kind, formats.PRESET)
+        self.assertEqual(sysex.number, 12)
+
+    def test_identify_init_preset(self):
+        filename = os.path.join(os.path.dirname(formats.__file__),
+                                'resources/init_preset.syx')
+        self.assertEqual(formats.get_kind(read_file(filename)), formats.PRESET)
+
+    def test_identify_unknown(self):
+        self.assertEqual(formats.identify([]), None)
+        self.assertEqual(formats.identify([4, 5, 1, 3, 0]), None)
+        data = formats.BANK_START + [0] * (formats.BANK_SIZE - 1)
+        self.assertEqual(formats.get_kind(data), None)
+        data = formats.BANK_START + [0] * (formats.BANK_SIZE - 4)
+        self.assertEqual(formats.get_kind(data), formats.BANK)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import mock
+from phatty import history
+from phatty import preset
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            data = input_file.read()
+        self.presets = []
+        for i in range(4):
+            p = bytearray(data)
+            preset.set_number(p, i)
+            preset.set_name(p, 'P{:d}'.format(i))
+            self.presets.append(p)
+        self.history = history.History()
+
+    def edit(self, kind, id, function, *args):
+        old = bytes(self.presets[id])
+        function(self.presets[id], *args)
+        return self.history.record(kind, id, old, self.presets[id], function.__name__)
+
+    def test_get_change(self):
+        old = bytes(self.presets[0])
+        new = bytearray(old)
+        preset.set_filter_cutoff(new, 1000)
+        change = history.get_change(0, old, new)
+        self.assertTrue(len(change.offsets) <= 2)
+        self.assertEqual(history.get_change(0, old, old), None)
+
+    def test_undo_redo_parameter(self):
+        original = bytes(self.presets[1])
+        self.edit(history.PARAMETER, 1, preset.set_arp_mode, 2)
+        edited = bytes(self.presets[1])
+        step = self.history.undo(self.presets)
+        self.assertEqual(step.kind, history.PARAMETER)
+        self.assertEqual(step.slot, 1)
+        self.assertEqual(bytes(self.presets[1]), original)
+        self.assertTrue(self.history.can_redo())
+        self.history.redo(self.presets)
+        self.assertEqual(bytes(self.presets[1]), edited)
+        self.assertEqual(self.history.redo(self.presets), None)
+
+    def test_merge(self):
+        original = bytes(self.presets[0])
+        self.edit(history.PARAMETER, 0, preset.set_filter_cutoff, 100)
+        self.edit(history.PARAMETER, 0, preset.set_filter_cutoff, 200)
+        self.assertEqual(len(self.history.undo_steps), 1)
+        self.history.undo(self.presets)
+        self.assertEqual(bytes(self.presets[0]), original)
+
+    def test_no_merge_other_parameter(self):
+        self.edit(history.PARAMETER, 0, preset.set_filter_cutoff, 100)
+        self.edit(history.PARAMETER, 0, preset.set_arp_mode, 2)
+        self.edit(history.PARAMETER, 0, preset.set_filter_cutoff, 200)
+        self.assertEqual(len(self.history.undo_steps), 3)
+
+    def test_forget(self):
+        self.edit(history.NAME, 1, preset.set_name, 'BASS')
+        self.edit(history.NAME, 2, preset.set_name, 'LEAD')
+        order = [0, 2, 1, 3]
+        history.reorder(self.presets, order)
+        self.history.record_order(order)
+        self.edit(history.NAME, 2, preset.set_name, 'PAD')
+        self.edit(history.NAME, 0, preset.set_name, 'KEYS')
+        # The preset now in slot 2 was in slot 1 before the reordering
+        self.history.forget(2)
+        self.assertEqual([s.kind for s in self.history.undo_steps],
+                         [history.NAME, history.REORDER, history.NAME])
+        self.assertEqual(self.history.undo_steps[0].slot, 2)
+        self.assertEqual(self.history.undo_steps[2].slot, 0)
+
+    def test_no_merge_after_time(self):
+        self.edit(history.PARAMETER, 0, preset.set_filter_cutoff, 100)
+        with mock.patch('phatty.history.time.monotonic',
+                        return_value=history.time.monotonic() + history.MERGE_TIME):
+            self.edit(history.PARAMETER, 0, preset.set_filter_cutoff, 200)
+        self.assertEqual(len(self.history.undo_steps), 2)
+
+    def test_name(self):
+        self.edit(history.NAME, 2, preset.set_name, 'BASS')
+        self.edit(history.PARAMETER, 2, preset.set_arp_mode, 1)
+        self.history.undo(self.presets)
+        self.history.undo(self.presets)
+        self.assertEqual(preset.get_name(self.presets[2]).strip(), 'P2')
+        self.assertFalse(self.history.can_undo())
+
+    def test_redo_cleared(self):
+        self.edit(history.NAME, 2, preset.set_name, 'BASS')
+        self.history.undo(self.presets)
+        self.edit(history.NAME, 2, preset.set_name, 'LEAD')
+        self.assertFalse(self.history.can_redo())
+
+    def test_reorder(self):
+        original = [bytes(p) for p in self.presets]
+        order = [2, 0, 1, 3]
+        history.reorder(self.presets, order)
+        self.history.record_order(order)
+        self.assertEqual([preset.get_name(p).strip() for p in self.presets],
+                         ['P2', 'P0', 'P1', 'P3'])
+        self.assertEqual([preset.get_number(p) for p in self.presets],
+                         [0, 1, 2, 3])
+        self.history.undo(self.presets)
+        self.assertEqual([bytes(p) for p in self.presets], original)
+        self.history.redo(self.presets)
+        self.assertEqual(preset.get_name(self.presets[0]).strip(), 'P2')
+        self.assertEqual(self.history.record_order([0, 1, 2, 3]), None)
+
+    def test_get_moved(self):
+        self.assertEqual(history.get_moved([0, 2, 1, 3]), [1, 2])
+        self.assertEqual(history.get_moved([1, 2, 3, 0]), [0, 1, 2, 3])
+        self.assertEqual(history.get_moved([0, 1, 2]), [])
+
+    def test_max_steps(self):
+        h = history.History(2)
+        for i in range(3):
+            old = bytes(self.presets[i])
+            preset.set_name(self.presets[i], 'X')
+            h.record(history.NAME, i, old, self.presets[i])
+        self.assertEqual([s.slot for s in h.undo_steps], [1, 2])
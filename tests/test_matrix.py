@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import random
+import numpy
+from phatty import matrix
+from phatty import preset
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            p = bytearray(input_file.read())
+        random.seed(0)
+        self.presets = []
+        for i in range(20):
+            data = bytearray(p)
+            for accessor in preset.ACCESSORS:
+                accessor[preset.ACCESSOR_SETTER](
+                    data, random.randrange(accessor[preset.ACCESSOR_VALUES]))
+            self.presets.append(data)
+
+    def test_get_matrix(self):
+        m = matrix.get_matrix(self.presets)
+        self.assertEqual(m.shape, (20, len(self.presets[0])))
+        self.assertEqual(matrix.get_presets(m), self.presets)
+        m[0, 0] = 0
+        self.assertEqual(matrix.get_matrix([]).shape[0], 0)
+
+    def test_parameters(self):
+        names = list(matrix.BITFIELD_PARAMETERS) + list(matrix.TWELVE_BIT_PARAMETERS)
+        self.assertEqual(sorted(names), sorted(
+            [a[preset.ACCESSOR_NAME] for a in preset.ACCESSORS]))
+
+    def test_set_values(self):
+        for accessor in preset.ACCESSORS:
+            name = accessor[preset.ACCESSOR_NAME]
+            setter = accessor[preset.ACCESSOR_SETTER]
+            count = accessor[preset.ACCESSOR_VALUES]
+            values = [random.randrange(count) for p in self.presets]
+            m = matrix.get_matrix(self.presets)
+            matrix.set_values(m, name, values)
+            expected = [bytearray(p) for p in self.presets]
+            for p, value in zip(expected, values):
+                setter(p, value)
+            self.assertEqual(matrix.get_presets(m), expected, name)
+
+    def test_set_single_value_in_rows(self):
+        m = matrix.get_matrix(self.presets)
+        rows = numpy.arange(0, 20, 2)
+        matrix.set_values(m, 'scale', 32, rows)
+        matrix.set_values(m, 'filter_cutoff', [i * 100 for i in range(10)], rows)
+        result = matrix.get_presets(m)
+        for i, p in enumerate(self.presets):
+            expected = bytearray(p)
+            if i % 2 == 0:
+                preset.set_scale(expected, 32)
+                preset.set_filter_cutoff(expected, i * 50)
+            self.assertEqual(result[i], expected)
+
+    def test_invalid_value(self):
+        m = matrix.get_matrix(self.presets)
+        self.assertRaises(IndexError, matrix.set_values, m, 'filter_poles', 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+from mido import Message
+from phatty import connector
+from phatty import mirror
+from phatty import preset
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.panel = bytearray(input_file.read())
+        self.mirror = mirror.PanelMirror()
+        self.mirror.seed(self.panel)
+
+    def test_get_index(self):
+        values = connector.ARP_OCTAVES_VALUES
+        for i, value in enumerate(values):
+            self.assertEqual(mirror.get_index(values, value), i)
+        self.assertEqual(mirror.get_index(values, values[2] + 1), 2)
+        self.assertEqual(mirror.get_index(values, 127), len(values) - 1)
+
+    def test_get_panel_as_preset(self):
+        data = self.mirror.get_panel_as_preset(7)
+        self.assertEqual(data[2], 5)
+        self.assertEqual(preset.get_number(data), 7)
+        self.assertEqual(data[5:], self.panel[5:])
+        self.assertIsNone(mirror.PanelMirror().get_panel_as_preset(7))
+
+    def test_update(self):
+        for name in connector.PANEL_CONTROLLERS:
+            getter = getattr(preset, 'get_' + name)
+            value = connector.PANEL_CONTROLLERS[name][1][-1]
+            self.mirror.update(connector.get_panel_controller(name, len(
+                connector.PANEL_CONTROLLERS[name][1]) - 1))
+            data = self.mirror.get_panel_as_preset(0)
+            self.assertEqual(connector.PANEL_CONTROLLERS[name][1][getter(data)], value)
+
+    def test_update_continuous(self):
+        for message in connector.get_continuous_controllers('filter_cutoff', 2049):
+            self.mirror.update(message)
+        data = self.mirror.get_panel_as_preset(0)
+        self.assertEqual(preset.get_filter_cutoff(data), 2049)
+        self.mirror.update(connector.create_controller(19, 127))
+        data = self.mirror.get_panel_as_preset(0)
+        self.assertEqual(preset.get_filter_cutoff(data), 127 << 5)
+
+    def test_set(self):
+        self.mirror.set('arp_mode', 2)
+        self.mirror.set_name('Mirror')
+        data = self.mirror.get_panel_as_preset(0)
+        self.assertEqual(preset.get_arp_mode(data), 2)
+        self.assertEqual(preset.get_name(data).strip(), 'Mirror')
+
+    def test_unknown_controller(self):
+        self.mirror.update(connector.create_controller(21, 64))
+        self.assertFalse(self.mirror.is_valid())
+
+    def test_invalidate(self):
+        self.mirror.update(Message('program_change', program=3))
+        self.assertFalse(self.mirror.is_valid())
+        self.mirror.update(connector.get_panel_controller('arp_mode', 1))
+        self.assertIsNone(self.mirror.get_panel_as_preset(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import mock
+from mock import Mock
+from mido import Message
+from phatty import connector
+from phatty import morph
+from phatty import preset
+from phatty.worker import Worker
+from threading import Event
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Clock(object):
+
+    def __init__(self, cost=0):
+        self.now = 0
+        self.cost = cost
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Overshooting a little like a real sleep avoids rounding issues
+        self.now += seconds + 1e-9
+
+    def send(self, messages):
+        self.now += self.cost
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.a = bytearray(input_file.read())
+        self.b = bytearray(self.a)
+        preset.set_filter_cutoff(self.a, 0)
+        preset.set_filter_cutoff(self.b, 4000)
+        preset.set_arp_mode(self.a, 0)
+        preset.set_arp_mode(self.b, 2)
+
+    def test_get_continuous_controllers(self):
+        messages = connector.get_continuous_controllers('filter_cutoff', 4095)
+        self.assertEqual(messages, [
+            Message('control_change', control=19, value=127),
+            Message('control_change', control=51, value=124)])
+
+    def test_get_parameters(self):
+        parameters = morph.get_parameters(self.a, self.b)
+        self.assertEqual(parameters, [('arp_mode', 0, 2), ('filter_cutoff', 0, 4000)])
+        self.assertEqual(morph.get_parameters(self.a, self.a), [])
+
+    def test_get_frame(self):
+        m = morph.Morph(self.a, self.b)
+        self.assertEqual(m.get_values(0.5), {'arp_mode': 1, 'filter_cutoff': 2000})
+        self.assertEqual(len(m.get_frame(0)), 3)
+        self.assertEqual(m.get_frame(0), [])
+        frame = m.get_frame(1)
+        self.assertIn(connector.get_panel_controller('arp_mode', 2), frame)
+
+    @mock.patch('phatty.morph.SPIN_TIME', 0)
+    def run_morph(self, cost):
+        clock = Clock(cost)
+        send = Mock(side_effect=clock.send)
+        morpher = morph.Morpher(send, 100, clock=clock.time, sleep=clock.sleep)
+        morpher.running = True
+        morpher.run(morph.Morph(self.a, self.b), 1)
+        last = send.call_args_list[-1][0][0]
+        self.assertEqual(last[-2:], connector.get_continuous_controllers(
+            'filter_cutoff', 4000))
+        return morpher.get_stats()
+
+    def test_run(self):
+        stats = self.run_morph(0)
+        self.assertEqual(stats.frames, 101)
+        self.assertEqual(stats.dropped, 0)
+        self.assertTrue(stats.max_jitter < 1e-6)
+
+    def test_run_dropping(self):
+        stats = self.run_morph(0.025)
+        self.assertTrue(stats.dropped > 0)
+        self.assertEqual(stats.frames + stats.dropped, 101)
+        self.assertTrue(stats.max_jitter < 0.01)
+
+    @mock.patch('phatty.morph.SPIN_TIME', 0)
+    def test_run_through_worker(self):
+        clock = Clock()
+        send = Mock()
+        worker = Worker(lambda drain: drain())
+        morpher = morph.Morpher(send, 100, clock=clock.time, sleep=clock.sleep,
+                                submit=worker.submit)
+        event = Event()
+        worker.start()
+        worker.submit(event.wait)
+        morpher.running = True
+        morpher.run(morph.Morph(self.a, self.b), 1)
+        event.set()
+        worker.stop(True)
+        # A busy worker only gets the latest frame
+        send.assert_called_once_with(morph.Morph(self.a, self.b).get_frame(1))
+        self.assertEqual(morpher.get_stats().frames, 1)
+        self.assertEqual(morpher.get_stats().dropped, 100)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+from mock import patch
+from phatty import batch
+from phatty import pack
+from phatty import preset
+
+RESOURCES = os.path.join(os.path.dirname(__file__), 'resources')
+PRESET_FILE_NAME = os.path.join(RESOURCES, 'preset.syx')
+BANK_FILE_NAME = os.path.join(RESOURCES, 'bank.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'presets.pack')
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            p = bytearray(input_file.read())
+        self.presets = []
+        for i in range(10):
+            data = bytearray(p)
+            preset.set_name(data, 'Preset {:d}'.format(i))
+            preset.set_filter_cutoff(data, i * 400)
+            self.presets.append(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_pack_7bit(self):
+        data = bytearray(range(128)) + bytearray([127, 0, 1])
+        packed = pack.pack_7bit(data)
+        self.assertEqual(len(packed), pack.get_packed_length(len(data)))
+        self.assertEqual(len(packed), 115)
+        self.assertEqual(pack.unpack_7bit(packed, len(data)), data)
+        self.assertRaises(ValueError, pack.pack_7bit, [0x80])
+
+    def test_round_trip(self):
+        bank = batch.read_messages(BANK_FILE_NAME)[0]
+        payloads = self.presets + [bank]
+        for compression in [pack.NONE, pack.ZLIB]:
+            self.assertEqual(pack.write(self.filename, payloads, compression, 4), 11)
+            with pack.PackReader(self.filename) as reader:
+                self.assertEqual(len(reader), 11)
+                self.assertEqual(len(reader.blocks), 3)
+                self.assertEqual(reader.get_names()[:2], ['Preset 0     ', 'Preset 1     '])
+                self.assertEqual(reader.get_names()[10], '')
+                self.assertEqual(list(reader), payloads)
+
+    def test_random_access(self):
+        pack.write(self.filename, self.presets, pack.ZLIB, 4)
+        with pack.PackReader(self.filename) as reader:
+            with patch('phatty.pack.decompress', wraps=pack.decompress) as mock:
+                self.assertEqual(reader.get(9), self.presets[9])
+                self.assertEqual(reader.get(8), self.presets[8])
+                self.assertEqual(reader.get(1), self.presets[1])
+                self.assertEqual(mock.call_count, 2)
+
+    def test_size(self):
+        presets = self.presets * 10
+        pack.write(self.filename, presets, pack.NONE)
+        with pack.PackReader(self.filename) as reader:
+            self.assertEqual(sum([b[1] for b in reader.blocks]),
+                             len(presets) * pack.get_packed_length(len(self.presets[0])))
+        pack.write(self.filename, presets, pack.ZLIB)
+        syx_size = len(presets) * (len(self.presets[0]) + 2)
+        self.assertLess(os.path.getsize(self.filename), syx_size / 2)
+
+    def test_invalid(self):
+        with open(self.filename, 'wb') as output_file:
+            output_file.write(b'\xf0\x04\xf7')
+        self.assertRaises(ValueError, pack.PackReader, self.filename)
+        self.assertRaises(ValueError, pack.write, self.filename, self.presets, 9)
+
+    @unittest.skipIf(pack.zstandard == None, 'zstandard not available')
+    def test_zstd(self):
+        pack.write(self.filename, self.presets, pack.ZSTD)
+        with pack.PackReader(self.filename) as reader:
+            self.assertEqual(list(reader), self.presets)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from threading import Event
+from mock import Mock
+from phatty.prefetcher import Prefetcher
+from phatty.worker import Worker
+from phatty.connector import ConnectorError
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = Mock()
+        self.worker = Worker(lambda function: function())
+        self.callback = Mock()
+        self.prefetcher = Prefetcher(
+            self.connector, self.worker, self.callback)
+
+    def tearDown(self):
+        self.worker.stop(True)
+
+    def test_get_targets(self):
+        self.assertEqual(self.prefetcher.get_targets(10), [10, 11, 9, 12, 8])
+        self.assertEqual(self.prefetcher.get_targets(0), [0, 1, 2])
+        self.assertEqual(self.prefetcher.get_targets(99), [99, 98, 97])
+
+    def test_select_skips_fresh(self):
+        self.worker.submit = Mock()
+        self.prefetcher.touch(11)
+        self.prefetcher.select(10)
+        targets = [c[0][1] for c in self.worker.submit.call_args_list]
+        self.assertEqual(targets, [10, 9, 12, 8])
+
+    def test_select_cancels_pending(self):
+        self.prefetcher.select(10)
+        jobs = self.prefetcher.jobs
+        self.prefetcher.select(50)
+        for job in jobs:
+            self.assertTrue(job.cancelled)
+        self.assertEqual(len(self.prefetcher.jobs), 5)
+
+    def test_touch_is_bounded(self):
+        prefetcher = Prefetcher(
+            self.connector, self.worker, self.callback, max_entries=3)
+        for i in range(5):
+            prefetcher.touch(i)
+        self.assertEqual(list(prefetcher.freshness.keys()), [2, 3, 4])
+
+    def test_max_age(self):
+        prefetcher = Prefetcher(
+            self.connector, self.worker, self.callback, max_age=0)
+        prefetcher.touch(1)
+        self.assertFalse(prefetcher.is_fresh(1))
+
+    def test_invalidate(self):
+        self.prefetcher.touch(1)
+        self.prefetcher.touch(2)
+        self.prefetcher.invalidate(1)
+        self.assertFalse(self.prefetcher.is_fresh(1))
+        self.assertTrue(self.prefetcher.is_fresh(2))
+        self.prefetcher.invalidate()
+        self.assertFalse(self.prefetcher.is_fresh(2))
+
+    def test_fetch(self):
+        done = Event()
+
+        def callback(id, data):
+            if id == 8:
+                done.set()
+
+        self.connector.get_preset = Mock(side_effect=lambda id: [id])
+        prefetcher = Prefetcher(self.connector, self.worker, callback)
+        prefetcher.start()
+        self.worker.start()
+        prefetcher.select(10)
+        self.assertTrue(done.wait(1))
+        self.assertEqual(self.connector.get_preset.call_count, 5)
+        for i in [8, 9, 10, 11, 12]:
+            self.assertTrue(prefetcher.is_fresh(i))
+
+    def test_fetch_fresh(self):
+        self.prefetcher.touch(3)
+        self.assertEqual(self.prefetcher.fetch(3), None)
+        self.connector.get_preset.assert_not_called()
+
+    def test_fetch_error(self):
+        self.connector.get_preset = Mock(side_effect=ConnectorError)
+        self.prefetcher.start()
+        self.prefetcher.select(10)
+        self.worker.start()
+        self.worker.stop(True)
+        self.callback.assert_not_called()
+        self.assertEqual(self.connector.get_preset.call_count, 1)
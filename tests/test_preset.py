@@ -215,3 +215,27 @@ class Test(unittest.TestCase):
         self.assertEqual(preset.get_12b_value([0x3, 0x12, 0x4]), 731)
         self.assertEqual(preset.get_12b_value([0x1, 0x3b, 0x2]), 2125)
 
+    def test_set_filter_cutoff(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            p = bytearray(input_file.read())
+            for v in [0, 843, 2125, 4095]:
+                preset.set_filter_cutoff(p, v)
+                self.assertEqual(preset.get_filter_cutoff(p), v)
+            self.assertEqual(preset.get_filter_attack(p), 4095)
+
+    def test_set_filter_attack(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            p = bytearray(input_file.read())
+            preset.set_filter_attack(p, 1797)
+            self.assertEqual(preset.get_filter_attack(p), 1797)
+            self.assertEqual(preset.get_filter_cutoff(p), 52)
+
+    def test_accessors(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            p = bytearray(input_file.read())
+            for accessor in preset.ACCESSORS:
+                getter = accessor[preset.ACCESSOR_GETTER]
+                setter = accessor[preset.ACCESSOR_SETTER]
+                for v in range(0, accessor[preset.ACCESSOR_VALUES], 7):
+                    setter(p, v)
+                    self.assertEqual(getter(p), v)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+from mock import patch
+from phatty import profiler
+
+
+class Target(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def work(self, value):
+        self.calls += 1
+        return value * 2
+
+    def fail(self):
+        raise ValueError()
+
+    def _private(self):
+        pass
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.profiler = profiler.Profiler(top=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_is_enabled(self):
+        with patch.dict(os.environ, {profiler.ENV_VAR: '1'}):
+            self.assertTrue(profiler.is_enabled())
+        with patch.dict(os.environ, {profiler.ENV_VAR: '0'}):
+            self.assertFalse(profiler.is_enabled())
+
+    def test_instrument(self):
+        target = Target()
+        self.profiler.instrument(target, 'target')
+        self.assertEqual(target.work(2), 4)
+        self.assertEqual(target.work(3), 6)
+        self.assertRaises(ValueError, target.fail)
+        self.assertEqual(target.work.__name__, 'work')
+        timings = dict([(t[0], t[1:]) for t in self.profiler.get_timings()])
+        self.assertEqual(sorted(timings), ['target.fail', 'target.work'])
+        self.assertEqual(timings['target.work'][0], 2)
+        self.assertEqual(target.calls, 2)
+
+    def test_stop(self):
+        self.assertIsNone(self.profiler.stop(self.dir))
+        target = Target()
+        self.profiler.instrument(target, 'target', ['work'])
+        self.profiler.start()
+        target.work(1)
+        filename = self.profiler.stop(os.path.join(self.dir, 'out'))
+        self.assertTrue(os.path.exists(os.path.join(
+            self.dir, 'out', profiler.PROFILE_FILE)))
+        with open(filename) as input_file:
+            summary = input_file.read()
+        self.assertIn('target.work', summary)
+        self.assertIn('Memory', summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
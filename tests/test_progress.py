@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from mock import Mock
+from phatty.progress import ProgressTimer
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.timer = ProgressTimer(1000, sleep=self.clock.sleep, clock=self.clock.time)
+
+    def test_send(self):
+        write = Mock()
+        progress = Mock()
+        self.timer.send(bytes(200), write, progress)
+        write.assert_called_once_with(bytes(200))
+        self.assertAlmostEqual(self.clock.now, 0.2)
+        progress.assert_called_with(200, 200)
+        sent = [c[0][0] for c in progress.call_args_list]
+        self.assertEqual(sent, sorted(sent))
+        self.assertTrue(len(sent) > 2)
+
+    def test_send_without_progress(self):
+        write = Mock()
+        self.timer.send(bytes(200), write)
+        write.assert_called_once_with(bytes(200))
+        self.assertEqual(self.clock.now, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+from mock import Mock
+from mido import Message
+from phatty import recorder
+from phatty.connector import Connector
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'session.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_record(self):
+        r = recorder.Recorder(self.filename)
+        r.start()
+        r.record(recorder.TX, [0xF0, 1, 0xF7])
+        r.record(recorder.RX, b'\xc0\x05')
+        r.stop()
+        entries = list(recorder.read_log(self.filename))
+        self.assertEqual([(e[1], e[2]) for e in entries],
+                         [(recorder.TX, b'\xf0\x01\xf7'), (recorder.RX, b'\xc0\x05')])
+        self.assertTrue(entries[0][0] <= entries[1][0])
+        size = len(recorder.MAGIC) + 2 * recorder.HEADER.size + 5
+        self.assertEqual(os.path.getsize(self.filename), size)
+
+    def test_read_invalid_log(self):
+        with open(self.filename, 'wb') as output_file:
+            output_file.write(b'foo')
+        self.assertRaises(ValueError, list, recorder.read_log(self.filename))
+
+    def test_connector(self):
+        c = Connector()
+        c.port = Mock()
+        c.port.iter_pending = Mock(return_value=[
+            Message('program_change', program=3), Message('sysex', data=[4, 5])])
+        c.callback = Mock()
+        c.start_recording(self.filename)
+        c.tx_message([4, 5, 6])
+        self.assertEqual(c.rx_message(), [4, 5])
+        c.stop_recording()
+        entries = [(e[1], e[2]) for e in recorder.read_log(self.filename)]
+        self.assertEqual(entries, [(recorder.TX, b'\xf0\x04\x05\x06\xf7'),
+                                   (recorder.RX, b'\xc0\x03'),
+                                   (recorder.RX, b'\xf0\x04\x05\xf7')])
+
+    def test_replay(self):
+        r = recorder.Recorder(self.filename)
+        r.start()
+        r.record(recorder.TX, b'\xf0\x04\x05\x06\xf7')
+        r.record(recorder.RX, b'\xf0\x04\x05\xf7')
+        r.stop()
+        port = recorder.ReplayPort(self.filename, speed=10)
+        port.start()
+        port.thread.join()
+        c = Connector()
+        c.port = port
+        c.callback = Mock()
+        self.assertEqual(c.rx_message(), [4, 5])
+        self.assertEqual(port.get_sent(), [])
+        c.tx_message([4, 5, 6])
+        self.assertEqual(port.get_sent(), port.get_recorded())
+
+    def test_replay_session(self):
+        def session(c):
+            c.set_preset(3)
+            c.set_panel_filter_poles(2)
+            c.set_panel_name('BASS')
+            c.tx_message([4, 5, 6])
+
+        c = Connector()
+        c.port = Mock()
+        c.start_recording(self.filename)
+        session(c)
+        c.stop_recording()
+        port = recorder.ReplayPort(self.filename)
+        self.assertEqual(port.get_recorded()[0], b'\xc0\x03')
+        c = Connector()
+        c.port = port
+        session(c)
+        self.assertEqual(port.get_sent(), port.get_recorded())
+
+    def test_replay_invalid(self):
+        r = recorder.Recorder(self.filename)
+        r.start()
+        r.record(recorder.RX, b'\xf0\x04\x05')
+        r.record(recorder.RX, b'\xc0\x03')
+        r.stop()
+        port = recorder.ReplayPort(self.filename, speed=10)
+        port.start()
+        port.thread.join()
+        self.assertEqual(port.invalid, 1)
+        self.assertEqual(list(port.iter_pending()), [Message('program_change', program=3)])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+from phatty import preset
+from phatty import search
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+        self.presets = []
+        for i in range(20):
+            p = bytearray(self.preset)
+            preset.set_filter_cutoff(p, i * 200)
+            preset.set_arp_clock_division(p, i)
+            self.presets.append(p)
+        self.index = search.Index()
+        self.index.add(self.presets)
+
+    def test_get_features(self):
+        features = search.get_features(self.preset)
+        self.assertEqual(len(features), len(preset.ACCESSORS))
+        for f in features:
+            self.assertTrue(f >= 0 and f <= 1)
+
+    def test_query(self):
+        result = self.index.query(self.presets[7], 3)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0], (7, 0))
+        self.assertEqual(set([r[0] for r in result[1:]]), set([6, 8]))
+
+    def test_query_keys(self):
+        index = search.Index()
+        index.add(self.presets[0:2], ['a', 'b'])
+        self.assertEqual(index.query(self.presets[1], 1)[0][0], 'b')
+        self.assertEqual(len(index.query(self.presets[1], 10)), 2)
+
+    def test_query_empty(self):
+        self.assertEqual(search.Index().query(self.preset), [])
+
+    def test_tree(self):
+        if not self.index.build_tree():
+            self.skipTest('SciPy not available')
+        result = self.index.query(self.presets[7], 3)
+        self.assertEqual(result[0][0], 7)
+
+    def test_get_duplicates(self):
+        self.index.add([self.presets[3], self.presets[5]], ['x', 'y'])
+        self.assertEqual(self.index.get_duplicates(), [[3, 'x'], [5, 'y']])
+
+    def test_get_near_duplicates(self):
+        index = search.Index()
+        p = bytearray(self.preset)
+        preset.set_filter_cutoff(p, preset.get_filter_cutoff(p) + 1)
+        index.add([self.preset, p, self.presets[19]])
+        self.assertEqual(index.get_duplicates(), [])
+        self.assertEqual(index.get_duplicates(0.01), [[0, 1]])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+from threading import Thread
+from mock import Mock
+from phatty import history
+from phatty import preset
+from phatty.store import PresetStore
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            self.preset = bytearray(input_file.read())
+        self.store = PresetStore()
+        self.listener = Mock()
+        for i in range(3):
+            p = bytearray(self.preset)
+            preset.set_number(p, i)
+            self.store.append(p)
+        self.store.subscribe(self.listener)
+
+    def test_append(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.get_versions(), [0, 0, 0])
+        self.assertIsInstance(self.store[1], bytes)
+        self.assertEqual(preset.get_number(self.store[1]), 1)
+
+    def test_set(self):
+        data = bytearray(self.store[1])
+        preset.set_name(data, 'New')
+        self.assertTrue(self.store.set(1, data))
+        self.assertEqual(self.store.get_version(1), 1)
+        self.listener.assert_called_once_with(1)
+        self.assertTrue(self.store.set(1, data))
+        self.assertEqual(self.store.get_version(1), 1)
+        self.assertFalse(self.store.set(1, self.preset, version=0))
+        self.assertEqual(self.store[1], data)
+        self.assertTrue(self.store.set(1, self.preset, version=1))
+        self.assertEqual(self.store.get_version(1), 2)
+
+    def test_modify(self):
+        snapshot = self.store.snapshot()
+        old, new = self.store.modify(0, preset.set_name, 'Edited')
+        self.assertEqual(old, snapshot[0])
+        self.assertEqual(preset.get_name(new).strip(), 'Edited')
+        self.assertEqual(self.store[0], new)
+        self.assertEqual(snapshot[0], old)
+        self.listener.assert_called_once_with(0)
+        self.store.modify(0, preset.set_name, 'Edited')
+        self.assertEqual(self.store.get_version(0), 1)
+
+    def test_history(self):
+        h = history.History()
+        old, new = self.store.modify(2, preset.set_filter_poles, 0)
+        h.record(history.PARAMETER, 2, old, new)
+        h.record_order([2, 0, 1])
+        history.reorder(self.store, [2, 0, 1])
+        self.assertEqual(self.store[0][5:], new[5:])
+        self.assertEqual(preset.get_number(self.store[0]), 0)
+        self.listener.assert_called_with(None)
+        h.undo(self.store)
+        h.undo(self.store)
+        self.assertEqual(self.store[2], old)
+        # Slot 1 ends up with the same bytes so it keeps its version
+        self.assertEqual(self.store.get_versions(), [2, 0, 4])
+        self.assertRaises(IndexError, self.store.__setitem__, slice(1, 2), [])
+
+    def test_clear(self):
+        self.store.clear()
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.get_versions(), [])
+        self.listener.assert_called_once_with(None)
+
+    def test_concurrent_modify(self):
+        def edit():
+            for i in range(200):
+                self.store.modify(0, lambda p: p.__setitem__(50, (p[50] + 1) & 0x7f))
+
+        threads = [Thread(target=edit) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.store.get_version(0), 800)
+        self.assertEqual(self.store[0][50], (self.preset[50] + 800) & 0x7f)
+
+
+if __name__ == '__main__':
+    unittest.main()
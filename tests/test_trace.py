@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from threading import Event
+from phatty import trace
+from phatty.worker import Worker
+
+
+@trace.traced(trace.IO)
+def read(value):
+    return value + 1
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'trace.json')
+
+    def tearDown(self):
+        trace.stop(self.filename)
+        shutil.rmtree(self.dir)
+
+    def read_trace(self):
+        trace.stop(self.filename)
+        with open(self.filename) as input_file:
+            return json.load(input_file)['traceEvents']
+
+    def test_disabled(self):
+        self.assertIs(trace.span('a', trace.MIDI), trace.NULL_SPAN)
+        self.assertEqual(read(1), 2)
+        trace.instant('a', trace.UI)
+        self.assertEqual(len(trace.events), 0)
+        trace.stop(self.filename)
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_spans(self):
+        trace.start()
+        with trace.span('request', trace.MIDI, num=3):
+            self.assertEqual(read(1), 2)
+        events = [e for e in self.read_trace() if e['ph'] == 'X']
+        self.assertEqual([e['name'] for e in events], ['read', 'request'])
+        self.assertEqual(events[1]['args'], {'num': 3})
+        self.assertEqual(events[0]['cat'], trace.IO)
+        self.assertLessEqual(events[1]['ts'], events[0]['ts'])
+        self.assertGreaterEqual(events[1]['dur'], events[0]['dur'])
+
+    def test_worker(self):
+        done = Event()
+        worker = Worker(lambda drain: drain())
+        trace.start()
+        worker.start()
+        worker.submit(read, 1, callback=lambda result: done.set())
+        self.assertTrue(done.wait(5))
+        worker.stop(wait=True)
+        events = self.read_trace()
+        phases = [e['ph'] for e in events if e.get('cat') == trace.WORKER]
+        self.assertEqual(phases, ['s', 'f', 'X'])
+        spans = [e['name'] for e in events if e['ph'] == 'X']
+        self.assertEqual(spans, ['read', 'read', 'drain'])
+        names = [e['args']['name'] for e in events if e['ph'] == 'M']
+        self.assertIn('MainThread', names)
+        ids = set([e['tid'] for e in events if e['ph'] != 'M'])
+        self.assertEqual(len(ids), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from mock import Mock
+from phatty import transfer
+from phatty.transfer import TransferChannel
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.status_handler = Mock()
+        self.presets_handler = Mock()
+        self.idle_add = Mock()
+        self.timeout_add = Mock(side_effect=[1, 2])
+        self.source_remove = Mock()
+        self.channel = TransferChannel(self.status_handler, self.presets_handler,
+                                       self.idle_add, self.timeout_add,
+                                       self.source_remove)
+
+    def test_start(self):
+        self.channel.start()
+        self.timeout_add.assert_called_once_with(
+            transfer.FLUSH_INTERVAL, self.channel.flush)
+        self.assertTrue(self.channel.flush())
+        self.channel.start()
+        self.source_remove.assert_called_once_with(1)
+        self.assertEqual(self.channel.source, 2)
+
+    def test_progress(self):
+        self.channel.start()
+        self.channel.set_status('a', 0.1)
+        self.channel.set_status('b', 0.2)
+        self.channel.add_preset(0, 'P0')
+        self.channel.flush()
+        self.status_handler.assert_called_once_with('b', 0.2)
+        self.presets_handler.assert_called_once_with([[0, 'P0']])
+        self.channel.flush()
+        self.assertEqual(self.status_handler.call_count, 1)
+        self.assertEqual(self.presets_handler.call_count, 1)
+
+    def test_batch(self):
+        self.channel.start()
+        for i in range(transfer.FLUSH_BATCH_SIZE * 2):
+            self.channel.add_preset(i, 'P')
+        self.idle_add.assert_called_once_with(self.channel.flush_batch)
+        self.assertFalse(self.channel.flush_batch())
+        self.assertEqual(len(self.presets_handler.call_args[0][0]),
+                         transfer.FLUSH_BATCH_SIZE * 2)
+
+    def test_finish(self):
+        self.channel.start()
+        self.channel.set_status('done', 1)
+        self.channel.stop()
+        self.source_remove.assert_called_once_with(1)
+        self.status_handler.assert_called_once_with('done', 1)
+        self.assertFalse(self.channel.flush())
+
+    def test_cancel(self):
+        self.channel.start()
+        self.channel.set_status('a', 0.5)
+        self.channel.add_preset(0, 'P0')
+        self.channel.cancel()
+        self.source_remove.assert_called_once_with(1)
+        self.assertFalse(self.channel.flush())
+        self.status_handler.assert_not_called()
+        self.presets_handler.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
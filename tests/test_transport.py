@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import mock
+from mock import Mock
+from mido import Message
+from phatty import transport
+from phatty import connector
+from phatty.connector import Connector, ConnectorError
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.input = Mock()
+        self.output = Mock()
+        self.transport = transport.RawTransport(self.input, self.output)
+
+    def test_check_data(self):
+        transport.check_data([0, 1, 0x7F])
+        transport.check_data(bytearray(range(0, 128)))
+        for data in [[0x80], [1, 2, 0xF7], [256], [-1]]:
+            self.assertRaises(ValueError, transport.check_data, data)
+
+    def test_frame(self):
+        self.assertEqual(transport.frame([1, 2, 3]), b'\xf0\x01\x02\x03\xf7')
+        self.assertRaises(ValueError, transport.frame, [1, 0xF0])
+
+    def test_unframe(self):
+        self.assertEqual(transport.unframe([0xF0, 1, 2, 0xF7]), [1, 2])
+        self.assertEqual(transport.unframe([0xF0, 1, 2]), None)
+        self.assertRaises(ValueError, transport.unframe, [0xF0, 0x90, 0xF7])
+
+    def test_get_transport(self):
+        port = Mock(spec=['input', 'output'])
+        port.input = Mock(spec=[])
+        self.assertEqual(transport.get_transport(port), None)
+        port = Mock()
+        self.assertTrue(isinstance(transport.get_transport(port),
+                                   transport.RawTransport))
+        port.input._rt.set_callback.assert_called_once()
+
+    def test_send(self):
+        self.transport.send([4, 5, 6])
+        self.output.send_message.assert_called_once_with(b'\xf0\x04\x05\x06\xf7')
+
+    def test_receive(self):
+        self.assertEqual(self.transport.receive(0), None)
+        self.transport.put(([0xF0, 1, 0xF7], 0.1))
+        self.assertEqual(self.transport.receive(0), [0xF0, 1, 0xF7])
+
+    def test_connector(self):
+        connector = Connector()
+        connector.port = Mock()
+        connector.transport = self.transport
+        connector.callback = Mock()
+        connector.tx_message([4, 5, 6])
+        connector.port.send.assert_not_called()
+        self.output.send_message.assert_called_once_with(b'\xf0\x04\x05\x06\xf7')
+        self.transport.put(([0xC0, 3], 0))
+        self.transport.put(([0xF0, 1, 2, 0xF7], 0))
+        self.assertEqual(connector.rx_message(), [1, 2])
+        connector.callback.assert_called_once_with(
+            Message('program_change', channel=0, program=3))
+
+    def test_connector_invalid(self):
+        connector = Connector()
+        connector.port = Mock()
+        connector.transport = self.transport
+        self.transport.put(([0xF0, 0x81, 0xF7], 0))
+        self.assertRaises(ConnectorError, connector.rx_message)
+        self.assertFalse(connector.connected())
+
+    def test_assembler(self):
+        assembler = transport.SysexAssembler()
+        self.assertFalse(assembler.add([0x90, 60, 100]))
+        self.assertTrue(assembler.add([0xF0, 1, 2]))
+        self.assertFalse(assembler.complete)
+        self.assertTrue(assembler.add([3, 4]))
+        self.assertTrue(assembler.add([5, 0xF7]))
+        self.assertTrue(assembler.complete)
+        self.assertEqual(len(assembler), 7)
+        self.assertEqual(assembler.get_data(), bytearray([1, 2, 3, 4, 5]))
+        self.assertFalse(assembler.add([6, 0xF7]))
+
+    def get_stream_connector(self):
+        c = Connector()
+        c.port = Mock()
+        c.transport = self.transport
+        c.callback = Mock()
+        return c
+
+    def test_rx_stream(self):
+        c = self.get_stream_connector()
+        progress = Mock()
+        self.transport.put(([0xF0, 1, 2], 0))
+        self.transport.put(([0xF8], 0))
+        self.transport.put(([3, 0xF7], 0))
+        self.assertEqual(c.rx_stream(10, progress), [1, 2, 3])
+        progress.assert_has_calls([mock.call(3, 10), mock.call(5, 10)])
+        c.callback.assert_called_once_with(Message('clock'))
+
+    @mock.patch('phatty.connector.STALL_TIMEOUT', 0.05)
+    def test_rx_stream_stalled(self):
+        c = self.get_stream_connector()
+        self.transport.put(([0xF0, 1, 2], 0))
+        self.assertRaises(ConnectorError, c.rx_stream, 10)
+        self.assertFalse(c.connected())
+
+    @mock.patch('phatty.connector.STALL_TIMEOUT', 0.2)
+    def test_rx_stream_estimated_progress(self):
+        c = self.get_stream_connector()
+        progress = Mock()
+        self.assertRaises(ConnectorError, c.rx_stream, 100, progress)
+        received, expected = progress.call_args[0]
+        self.assertEqual(expected, 100)
+        self.assertTrue(received > 0 and received <= 95)
+
+    def test_get_bank(self):
+        c = self.get_stream_connector()
+        c.rx_stream = Mock(return_value=[1])
+        progress = Mock()
+        self.assertEqual(c.get_bank(progress), [1])
+        c.rx_stream.assert_called_once_with(connector.BANK_SIZE, progress)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import os
+from mock import Mock
+from phatty import preset
+from phatty import verifier
+
+PRESET_FILE_NAME = os.path.join(
+    os.path.dirname(__file__), 'resources/preset.syx')
+
+
+class Device(object):
+
+    def __init__(self, failures=None):
+        self.presets = {}
+        self.failures = failures if failures else {}
+        self.log = []
+
+    def tx_message(self, data):
+        slot = preset.get_number(data)
+        self.log.append(('tx', slot))
+        data = bytearray(data)
+        if self.failures.get(slot, 0) > 0:
+            self.failures[slot] -= 1
+            preset.set_filter_cutoff(data, 0)
+        self.presets[slot] = data
+
+    def get_preset(self, slot):
+        self.log.append(('rx', slot))
+        return self.presets[slot]
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        with open(PRESET_FILE_NAME, 'rb') as input_file:
+            data = input_file.read()
+        self.presets = []
+        for i in range(5):
+            p = bytearray(data)
+            preset.set_number(p, i)
+            preset.set_filter_cutoff(p, 1000 + i)
+            self.presets.append(p)
+
+    def test_upload_without_verify(self):
+        device = Device()
+        failed = verifier.upload(device, self.presets, range(5))
+        self.assertEqual(failed, [])
+        self.assertEqual(device.log, [('tx', i) for i in range(5)])
+
+    def test_pipelined_verify(self):
+        device = Device()
+        progress = Mock()
+        failed = verifier.upload(device, self.presets, range(5), True,
+                                 depth=2, progress=progress)
+        self.assertEqual(failed, [])
+        self.assertEqual(device.log, [('tx', 0), ('tx', 1), ('tx', 2), ('rx', 0),
+                                      ('tx', 3), ('rx', 1), ('tx', 4), ('rx', 2),
+                                      ('rx', 3), ('rx', 4)])
+        progress.assert_called_with(4, 4, 5)
+
+    def test_retry(self):
+        device = Device({1: 2})
+        failed = verifier.upload(device, self.presets, range(3), True)
+        self.assertEqual(failed, [])
+        self.assertEqual(device.log.count(('tx', 1)), 3)
+        self.assertEqual(preset.get_filter_cutoff(device.presets[1]), 1001)
+
+    def test_failed(self):
+        device = Device({2: 10})
+        failed = verifier.upload(device, self.presets, range(3), True, retries=2)
+        self.assertEqual(failed, [2])
+        self.assertEqual(device.log.count(('tx', 2)), 3)
+
+    def test_written(self):
+        device = Device({2: 10})
+        written = []
+        verifier.upload(device, self.presets, range(4), True, retries=1,
+                        written=written)
+        self.assertEqual(written, [0, 1, 3])
+        written = []
+        verifier.upload(Device(), self.presets, range(3), written=written)
+        self.assertEqual(written, [0, 1, 2])
+
+    def test_written_on_error(self):
+        device = Device()
+        tx_message = device.tx_message
+
+        def fail_on_2(data):
+            if preset.get_number(data) == 2:
+                raise IOError()
+            tx_message(data)
+
+        device.tx_message = fail_on_2
+        written = []
+        self.assertRaises(IOError, verifier.upload, device, self.presets,
+                          range(4), written=written)
+        self.assertEqual(written, [0, 1])
+
+    def test_cancel(self):
+        device = Device()
+        failed = verifier.upload(device, self.presets, range(5), True,
+                                 running=lambda: len(device.log) < 3)
+        self.assertEqual(failed, [])
+        self.assertEqual(device.log, [('tx', 0), ('tx', 1), ('tx', 2), ('rx', 0)])
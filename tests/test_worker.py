@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017 David García Goñi
+#
+# This file is part of Phatty.
+#
+# Phatty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Phatty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Phatty. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from mock import Mock
+from threading import Event
+from phatty.worker import Worker, PRIORITY_LOW
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatch = Mock(side_effect=lambda function: function())
+        self.worker = Worker(self.dispatch)
+
+    def run_worker(self):
+        self.worker.start()
+        self.worker.stop(True)
+
+    def test_submit(self):
+        callback = Mock()
+        self.worker.submit(lambda a, b: a + b, 1, 2, callback=callback)
+        self.run_worker()
+        callback.assert_called_once_with(3)
+
+    def test_error_callback(self):
+        error = ValueError('foo')
+        callback = Mock()
+        error_callback = Mock()
+        self.worker.submit(Mock(side_effect=error), callback=callback,
+                           error_callback=error_callback)
+        self.run_worker()
+        callback.assert_not_called()
+        error_callback.assert_called_once_with(error)
+
+    def test_cancel(self):
+        function = Mock()
+        job = self.worker.submit(function)
+        job.cancel()
+        self.run_worker()
+        function.assert_not_called()
+
+    def test_priority(self):
+        calls = []
+        event = Event()
+        self.worker.start()
+        self.worker.submit(event.wait)
+        self.worker.submit(lambda: calls.append(0), priority=PRIORITY_LOW)
+        self.worker.submit(lambda: calls.append(1))
+        self.worker.submit(lambda: calls.append(2))
+        event.set()
+        self.worker.stop(True)
+        self.assertEqual(calls, [1, 2, 0])
+
+    def test_stop_runs_queued_jobs(self):
+        calls = []
+        event = Event()
+        self.worker.start()
+        self.worker.submit(event.wait)
+        self.worker.submit(lambda: calls.append(0), priority=PRIORITY_LOW)
+        self.worker.stop(function=lambda: calls.append(1))
+        self.worker.submit(lambda: calls.append(2))
+        event.set()
+        self.worker.thread.join()
+        self.assertEqual(calls, [2, 0, 1])
+        self.assertFalse(self.worker.running)
+
+    def test_cancel_all(self):
+        function = Mock()
+        event = Event()
+        self.worker.start()
+        self.worker.submit(event.wait)
+        self.worker.submit(function)
+        self.worker.submit(function, priority=PRIORITY_LOW)
+        self.worker.cancel()
+        event.set()
+        self.worker.stop(True)
+        function.assert_not_called()
+
+    def test_deliver_coalesces(self):
+        dispatch = Mock()
+        worker = Worker(dispatch)
+        callback = Mock()
+        worker.deliver(callback, 1)
+        worker.deliver(callback, 2)
+        dispatch.assert_called_once_with(worker.drain)
+        callback.assert_not_called()
+        self.assertFalse(worker.drain())
+        callback.assert_has_calls([((1,),), ((2,),)])